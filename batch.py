@@ -0,0 +1,166 @@
+"""Non-interactive batch processing of many attendance files (Excel, CSV or Parquet)."""
+
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+from rich.console import Console
+from rich.table import Table
+
+import metrics
+from config import Config
+from core import calculate_all
+from io_excel import load_batch, export_records, SUPPORTED_EXTENSIONS
+
+# Processing stages timed for every file, in pipeline order
+STAGES = ("load", "calculate", "export")
+
+console = Console()
+
+
+def load_config(path: Optional[str]) -> Config:
+    """Read a JSON config file with the keys of Config.to_dict() (defaults when None)."""
+    if path is None:
+        return Config()
+    with open(path, encoding="utf-8") as f:
+        return Config.from_dict(json.load(f))
+
+
+def expand_inputs(patterns: List[str]) -> List[str]:
+    """Resolve directories, files and glob patterns into a sorted list of supported input files."""
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "*"))
+        else:
+            matches = glob.glob(pattern)
+        # Skip Excel lock files ("~$libro.xlsx")
+        files.update(m for m in matches if m.lower().endswith(SUPPORTED_EXTENSIONS)
+                     and not os.path.basename(m).startswith("~$"))
+    return sorted(files)
+
+
+def output_path(input_path: str, output_dir: str, output_format: str = "xlsx") -> str:
+    """Output file name for an input file."""
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(output_dir, f"{stem}_resultado.{output_format}")
+
+
+def process_file(input_path: str, config_data: dict, output_dir: str,
+                 output_format: str = "xlsx", metrics_options: Optional[dict] = None) -> Dict:
+    """Load, calculate and export one file; returns row count and stage timings.
+
+    With ``metrics_options`` (see metrics.options()) the worker collects
+    metrics for this file alone and returns them under ``"metrics"``.
+    """
+    if metrics_options is not None:
+        metrics.enable(**metrics_options)
+        metrics.reset()
+    config = Config.from_dict(config_data)
+    timings = {}
+
+    start = time.perf_counter()
+    # Already in a pool worker: the workbook's sheets are read in this process
+    records = load_batch(input_path, workers=1)
+    timings["load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    records = calculate_all(records, config)
+    timings["calculate"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    export_records(records, output_path(input_path, output_dir, output_format))
+    timings["export"] = time.perf_counter() - start
+
+    result = {"file": input_path, "rows": len(records), "timings": timings}
+    if metrics_options is not None:
+        result["metrics"] = metrics.stats()
+    return result
+
+
+def run_batch(inputs: List[str], config: Config, output_dir: str,
+              workers: Optional[int] = None, output_format: str = "xlsx") -> Dict:
+    """Process every input file across a process pool and return a run summary.
+
+    Inputs that would write the same output file (e.g. ``a/x.xlsx`` and
+    ``b/x.csv``) are not processed and are reported as failed. Metrics the
+    workers collect are merged into this process's metrics.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results, errors = [], []
+    started = time.perf_counter()
+    metrics_options = metrics.options()
+
+    targets: Dict[str, List[str]] = {}
+    for path in inputs:
+        target = os.path.normcase(os.path.abspath(output_path(path, output_dir, output_format)))
+        targets.setdefault(target, []).append(path)
+    inputs = []
+    for paths in targets.values():
+        if len(paths) == 1:
+            inputs.append(paths[0])
+            continue
+        for path in paths:
+            others = ", ".join(p for p in paths if p != path)
+            errors.append({"file": path, "error": f"mismo archivo de salida que {others}"})
+            console.print(f"[red]✘ {path}: mismo archivo de salida que {others}[/red]")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(process_file, path, config.to_dict(), output_dir, output_format,
+                        metrics_options): path
+            for path in inputs
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                result = future.result()
+                metrics.merge(result.pop("metrics", {}))
+                results.append(result)
+                console.print(f"[green]✔ {path}[/green]")
+            except Exception as e:
+                errors.append({"file": path, "error": str(e)})
+                console.print(f"[red]✘ {path}: {e}[/red]")
+
+    elapsed = time.perf_counter() - started
+    rows = sum(r["rows"] for r in results)
+    return {
+        "files": len(results),
+        "failed": errors,
+        "rows": rows,
+        "elapsed": elapsed,
+        "files_per_second": len(results) / elapsed if elapsed else 0.0,
+        "rows_per_second": rows / elapsed if elapsed else 0.0,
+        "stage_seconds": {s: sum(r["timings"][s] for r in results) for s in STAGES},
+    }
+
+
+def print_summary(summary: Dict) -> None:
+    """Print the throughput summary of a batch run."""
+    table = Table(title="Resumen del Procesamiento por Lotes")
+    table.add_column("Métrica", style="bold")
+    table.add_column("Valor", justify="right")
+    table.add_row("Archivos procesados", str(summary["files"]))
+    table.add_row("Archivos con error", str(len(summary["failed"])))
+    table.add_row("Registros", str(summary["rows"]))
+    table.add_row("Tiempo total (s)", f"{summary['elapsed']:.2f}")
+    table.add_row("Archivos/s", f"{summary['files_per_second']:.2f}")
+    table.add_row("Registros/s", f"{summary['rows_per_second']:.0f}")
+    for stage in STAGES:
+        table.add_row(f"Etapa {stage} (s, suma de procesos)", f"{summary['stage_seconds'][stage]:.2f}")
+    console.print(table)
+
+
+def run_batch_command(inputs: List[str], config_path: Optional[str], output_dir: str,
+                      workers: Optional[int], output_format: str = "xlsx") -> int:
+    """Entry point of the ``batch`` subcommand; returns the process exit code."""
+    files = expand_inputs(inputs)
+    if not files:
+        console.print("[yellow]No se encontraron archivos .xlsx, .csv o .parquet.[/yellow]")
+        return 1
+    summary = run_batch(files, load_config(config_path), output_dir, workers, output_format)
+    print_summary(summary)
+    return 1 if summary["failed"] else 0
@@ -0,0 +1,271 @@
+"""Benchmark suite with a synthetic attendance data generator.
+
+Usage::
+
+    python bench.py --sizes 1000 10000 100000 --output bench.json
+    python bench.py --baseline bench.json --tolerance 0.2
+    python bench.py --startup-only --baseline bench.json
+
+Each stage (load, calculate, export and the end-to-end pipeline) is timed at
+every size and its peak traced memory is measured in a separate run, so
+tracemalloc overhead does not distort the timings. The import time of the
+CLI entry modules is measured in fresh interpreters, along with which heavy
+dependencies they load. Results are written as JSON; with ``--baseline`` the
+run fails when a stage's rows/s drops more than ``--tolerance`` below the
+saved baseline, when an entry module imports that much slower, or when it
+starts loading a heavy dependency. A comparison run only writes its results
+when ``--output`` is given, and never over the baseline file. A
+``--startup-only`` run keeps the throughput results already in its output file.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional
+
+from openpyxl import Workbook
+
+from config import Config
+from core import calculate_all
+from io_excel import COLUMN_MAP, load_batch, load_excel, export_excel
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+STAGES = ("load", "calculate", "export", "pipeline")
+DEFAULT_OUTPUT = "bench.json"
+
+# Entry modules timed by the startup benchmark, and the dependencies they
+# should leave for the first load or export
+STARTUP_MODULES = ("main", "cli")
+HEAVY_MODULES = ("numpy", "pandas", "openpyxl", "pyarrow")
+
+
+def _clock(minutes: int) -> str:
+    return f"{minutes // 60 % 24:02d}:{minutes % 60:02d}"
+
+
+def generate_rows(rows: int, employees: int = 200, permit_density: float = 0.1,
+                  missing_rate: float = 0.02, seed: int = 0) -> Iterator[list]:
+    """Yield synthetic input rows in COLUMN_MAP order.
+
+    One row per employee per day. ``permit_density`` is the probability that a
+    day has permits (one or two pairs) and ``missing_rate`` the probability
+    that any single punch is left empty.
+    """
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    for i in range(rows):
+        employee = i % employees
+        day = start + timedelta(days=i // employees)
+
+        entry = rng.randint(6 * 60, 9 * 60)
+        meal_out = entry + rng.randint(3 * 60, 5 * 60)
+        meal_in = meal_out + rng.randint(20, 90)
+        exit_t = entry + rng.randint(8 * 60, 11 * 60)
+        punches = [entry, meal_out, meal_in, None, None, exit_t]
+        if rng.random() < 0.3:
+            dinner_out = meal_in + rng.randint(4 * 60, 5 * 60)
+            punches[3:5] = [dinner_out, dinner_out + rng.randint(20, 60)]
+        cells = ["" if p is None or rng.random() < missing_rate else _clock(p) for p in punches]
+
+        permits = []
+        if rng.random() < permit_density:
+            for _ in range(rng.randint(1, 2)):
+                out = rng.randint(meal_in + 10, max(meal_in + 11, exit_t - 40))
+                permits += [_clock(out), _clock(out + rng.randint(10, 60))]
+
+        yield [str(1000 + employee), day.strftime("%d/%m/%Y"), f"Empleado {1000 + employee}",
+               *cells, ", ".join(permits)]
+
+
+def generate_workbook(path: str, rows: int, sheets: int = 1, **options) -> None:
+    """Write a synthetic workbook shaped like the real input files.
+
+    With several ``sheets`` the rows are split evenly between them, as in a
+    workbook with one sheet per plant.
+    """
+    wb = Workbook(write_only=True)
+    generated = generate_rows(rows, **options)
+    for i in range(sheets):
+        ws = wb.create_sheet(title="Sheet1" if sheets == 1 else f"Planta {i + 1}")
+        ws.append(list(COLUMN_MAP))
+        for row in islice(generated, (i + 1) * rows // sheets - i * rows // sheets):
+            ws.append(row)
+    wb.save(path)
+
+
+def _measure(fn: Callable[[], object], track_memory: bool) -> Dict:
+    """Time ``fn``; with ``track_memory`` run it again under tracemalloc for the peak."""
+    start = time.perf_counter()
+    fn()
+    result = {"seconds": time.perf_counter() - start}
+    if track_memory:
+        tracemalloc.start()
+        try:
+            fn()
+            result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, track_memory: bool = True, sheets: int = 1,
+                   **options) -> List[Dict]:
+    """Benchmark every stage at every size; returns one result dict per (size, stage)."""
+    config = Config()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            source = os.path.join(tmp, f"bench_{size}.xlsx")
+            target = os.path.join(tmp, f"bench_{size}_out.xlsx")
+            generate_workbook(source, size, sheets, **options)
+            records = calculate_all(load_excel(source), config)
+
+            stages = {
+                "load": lambda: load_excel(source),
+                "calculate": lambda: calculate_all(records, config),
+                "export": lambda: export_excel(records, target),
+                "pipeline": lambda: export_excel(calculate_all(load_batch(source), config), target),
+            }
+            for stage in STAGES:
+                measured = _measure(stages[stage], track_memory)
+                measured.update(size=size, stage=stage,
+                                rows_per_second=size / measured["seconds"] if measured["seconds"] else 0.0)
+                results.append(measured)
+    return results
+
+
+def measure_startup(module: str, repeat: int = 5) -> Dict:
+    """Import ``module`` in fresh interpreters: best ``-X importtime`` seconds, heavy modules loaded."""
+    code = f"import sys, {module}; print(*(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    best, heavy = None, []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                              capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+        # Lines read "import time: self [us] | cumulative [us] | module"
+        lines = (line.split("|") for line in proc.stderr.splitlines())
+        micros = next(int(parts[1]) for parts in lines
+                      if len(parts) == 3 and parts[2].strip() == module)
+        best = micros if best is None else min(best, micros)
+        heavy = proc.stdout.split()
+    return {"module": module, "seconds": best / 1e6, "heavy_modules": heavy}
+
+
+def run_startup_benchmarks(modules=STARTUP_MODULES, repeat: int = 5) -> List[Dict]:
+    return [measure_startup(module, repeat) for module in modules]
+
+
+def compare_startup(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """Describe every module importing over ``tolerance`` slower or loading new heavy modules."""
+    reference = {r["module"]: r for r in baseline}
+    regressions = []
+    for r in results:
+        base = reference.get(r["module"])
+        if base is None:
+            continue
+        change = r["seconds"] / base["seconds"] - 1.0 if base["seconds"] else 0.0
+        if change > tolerance:
+            regressions.append(f"import {r['module']}: {r['seconds'] * 1000:.0f} ms "
+                               f"vs {base['seconds'] * 1000:.0f} ms baseline ({change:+.0%})")
+        added = sorted(set(r["heavy_modules"]) - set(base["heavy_modules"]))
+        if added:
+            regressions.append(f"import {r['module']} now loads {', '.join(added)}")
+    return regressions
+
+
+def compare_to_baseline(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """Describe every (size, stage) whose rows/s fell more than ``tolerance`` below the baseline."""
+    reference = {(r["size"], r["stage"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        base = reference.get((r["size"], r["stage"]))
+        if base is None or not base["rows_per_second"]:
+            continue
+        change = r["rows_per_second"] / base["rows_per_second"] - 1.0
+        if change < -tolerance:
+            regressions.append(
+                f"{r['stage']} @ {r['size']} rows: {r['rows_per_second']:.0f} rows/s "
+                f"vs {base['rows_per_second']:.0f} baseline ({change:+.0%})"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de la calculadora de asistencias")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--employees", type=int, default=200)
+    parser.add_argument("--permit-density", type=float, default=0.1)
+    parser.add_argument("--missing-rate", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sheets", type=int, default=1,
+                        help="Hojas entre las que se reparten las filas de cada libro")
+    parser.add_argument("--no-memory", action="store_true", help="No medir memoria pico")
+    parser.add_argument("--output", help=f"Archivo JSON de resultados (por defecto {DEFAULT_OUTPUT}; "
+                                         "con --baseline solo si se indica)")
+    parser.add_argument("--baseline", help="Resultados previos con los que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Caída máxima de registros/s aceptada frente a la línea base")
+    parser.add_argument("--startup-only", action="store_true",
+                        help="Solo medir el tiempo de importación de la CLI")
+    args = parser.parse_args(argv)
+
+    output = args.output if args.output or args.baseline else DEFAULT_OUTPUT
+    saved = None
+    if args.baseline:
+        if output and os.path.abspath(output) == os.path.abspath(args.baseline):
+            parser.error("--output no puede ser el mismo archivo que --baseline")
+        # Read before running, so the run is compared with what was saved
+        with open(args.baseline, encoding="utf-8") as f:
+            saved = json.load(f)
+
+    results = [] if args.startup_only else run_benchmarks(
+        args.sizes, track_memory=not args.no_memory, employees=args.employees,
+        permit_density=args.permit_density, missing_rate=args.missing_rate, seed=args.seed,
+        sheets=args.sheets,
+    )
+    for r in results:
+        memory = f"{r['peak_memory_bytes'] / 2**20:8.1f} MiB" if "peak_memory_bytes" in r else ""
+        print(f"{r['stage']:>9} {r['size']:>9} filas  {r['seconds']:8.3f} s  "
+              f"{r['rows_per_second']:>10.0f} filas/s  {memory}")
+    startup = run_startup_benchmarks()
+    for r in startup:
+        print(f"{'import':>9} {r['module']:>9}  {r['seconds'] * 1000:8.1f} ms  "
+              f"{' '.join(r['heavy_modules']) or '(sin dependencias pesadas)'}")
+
+    if output:
+        kept = results
+        if args.startup_only and os.path.exists(output):
+            # Keep the throughput results of the last full run in the file
+            with open(output, encoding="utf-8") as f:
+                kept = json.load(f).get("results", [])
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": kept,
+                "startup": startup,
+            }, f, indent=2)
+
+    if saved is not None:
+        # A startup-only run measured no throughput, so there is nothing to compare there
+        regressions = ([] if args.startup_only
+                       else compare_to_baseline(results, saved["results"], args.tolerance))
+        regressions += compare_startup(startup, saved.get("startup", []), args.tolerance)
+        for line in regressions:
+            print(f"REGRESIÓN: {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
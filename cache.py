@@ -0,0 +1,120 @@
+"""On-disk cache of parsed workbooks keyed by the SHA-256 of their content."""
+
+import hashlib
+import os
+import tempfile
+from typing import Callable, Optional
+
+from io_excel import load_batch
+from models import RecordBatch
+import metrics
+
+# Default location; override with the URSOMEX_CACHE_DIR environment variable
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ursomex")
+# Total size of cached entries before the least recently used ones are evicted
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+_ENTRY_SUFFIX = ".batch"
+_READ_CHUNK = 1024 * 1024
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 hex digest of a workbook's bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(filepath: str) -> str:
+    """SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(_READ_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """Directory of serialized RecordBatches with a total size cap and LRU eviction.
+
+    Recency is tracked through each entry's modification time, which is
+    refreshed on every hit.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory or os.environ.get("URSOMEX_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _ENTRY_SUFFIX)
+
+    def get(self, key: str) -> Optional[RecordBatch]:
+        """Return the cached batch for ``key``, or None on a miss or unreadable entry."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                batch = RecordBatch.from_bytes(f.read())
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return batch
+
+    def put(self, key: str, batch: RecordBatch) -> None:
+        """Store a batch, then evict old entries beyond ``max_bytes``."""
+        blob = batch.to_bytes()
+        if len(blob) > self.max_bytes:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete least recently used entries until the cache fits in ``max_bytes``."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(_ENTRY_SUFFIX):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+
+    def load(self, key: str, loader: Callable[[], RecordBatch]) -> RecordBatch:
+        """Return the cached batch for ``key``, calling ``loader`` and storing the result on a miss."""
+        with metrics.span("cache") as sp:
+            batch = self.get(key)
+            if batch is not None:
+                sp.add_rows(len(batch))
+        if batch is None:
+            batch = loader()
+            try:
+                self.put(key, batch)
+            except OSError:
+                pass  # an unwritable cache must not break loading
+        return batch
+
+
+def load_cached(filepath: str, cache: Optional[ParseCache] = None) -> RecordBatch:
+    """Load a workbook as a RecordBatch, reusing the parse cache when the content matches."""
+    cache = cache or ParseCache()
+    return cache.load(file_hash(filepath), lambda: load_batch(filepath))
@@ -1,16 +1,22 @@
-"""Interactive CLI interface for the attendance calculator."""
+"""Interactive CLI interface for the attendance calculator.
 
-from typing import List, Optional
+Only rich and the configuration are imported up front, so the menu shows
+without loading NumPy, openpyxl or the engine; each action imports what it
+needs on first use.
+"""
+
+from typing import TYPE_CHECKING, Optional, Sequence
 from rich.console import Console
 from rich.table import Table
-from rich.prompt import Prompt, IntPrompt, Confirm
+from rich.prompt import Prompt, IntPrompt
 from rich.panel import Panel
 
+import metrics
 from config import Config
-from models import AttendanceRecord
-from core import calculate_record, calculate_all
-from io_excel import load_excel, export_excel
-from utils import format_time, minutes_to_hours, parse_time
+
+if TYPE_CHECKING:
+    from models import AttendanceRecord, RecordBatch
+    from recordindex import RecordIndex
 
 console = Console()
 
@@ -22,22 +28,36 @@ def show_menu() -> str:
         "[bold cyan]Calculadora de Asistencias - URSOMEX[/bold cyan]",
         subtitle="Sistema de Control de Asistencia"
     ))
-    console.print("[1] Cargar archivo Excel")
+    console.print("[1] Cargar archivo (Excel, CSV o Parquet)")
     console.print("[2] Ver registros")
     console.print("[3] Editar registro")
     console.print("[4] Recalcular todos")
-    console.print("[5] Exportar a Excel")
+    console.print("[5] Exportar resultados")
     console.print("[6] Configurar parámetros")
     console.print("[7] Salir")
+    console.print("[8] Guardar en el almacén")
+    console.print("[9] Consultar el almacén")
     console.print()
-    return Prompt.ask("Seleccione una opción", choices=["1", "2", "3", "4", "5", "6", "7"])
+    return Prompt.ask("Seleccione una opción", choices=[str(n) for n in range(1, 10)])
+
 
+def display_records(records: Sequence["AttendanceRecord"], start: int = 0, count: int = 20,
+                    positions: Optional[Sequence[int]] = None) -> None:
+    """Display records in a formatted table.
 
-def display_records(records: List[AttendanceRecord], start: int = 0, count: int = 20) -> None:
-    """Display records in a formatted table."""
+    ``positions`` restricts the table to those records (e.g. a RecordIndex
+    query); ``start`` and ``count`` then page through them.
+    """
     if not records:
         console.print("[yellow]No hay registros cargados.[/yellow]")
         return
+    if positions is None:
+        positions = range(len(records))
+    if not len(positions):
+        console.print("[yellow]Ningún registro coincide con la búsqueda.[/yellow]")
+        return
+    from utils import format_time, minutes_to_hours
+    from validation import validate
 
     table = Table(title="Registros de Asistencia", show_lines=True)
     table.add_column("#", style="dim", width=4)
@@ -52,12 +72,15 @@ def display_records(records: List[AttendanceRecord], start: int = 0, count: int
     table.add_column("Salida", width=8)
     table.add_column("Laborado", width=9)
     table.add_column("H. Extra", width=8)
+    table.add_column("Dobles", width=7)
+    table.add_column("Triples", width=7)
     table.add_column("Desc. Com.", width=10)
     table.add_column("Desc. Perm.", width=10)
+    table.add_column("Anom.", width=5)
 
-    end = min(start + count, len(records))
-    for i in range(start, end):
-        rec = records[i]
+    end = min(start + count, len(positions))
+    page = [records[i] for i in positions[start:end]]
+    for i, rec, code in zip(positions[start:end], page, validate(page).tolist()):
         table.add_row(
             str(i),
             rec.employee_id,
@@ -71,16 +94,77 @@ def display_records(records: List[AttendanceRecord], start: int = 0, count: int
             format_time(rec.exit),
             f"{minutes_to_hours(rec.net_worked):.2f}",
             f"{minutes_to_hours(rec.overtime):.2f}",
+            f"{minutes_to_hours(rec.overtime_double):.2f}",
+            f"{minutes_to_hours(rec.overtime_triple):.2f}",
             f"{minutes_to_hours(rec.meal_deduction + rec.dinner_deduction):.2f}",
             f"{minutes_to_hours(rec.permit_deduction):.2f}",
+            str(code) if code else "",
         )
 
-    console.print(table)
-    console.print(f"Mostrando {start + 1}-{end} de {len(records)} registros")
+    with metrics.span("render", rows=end - start):
+        console.print(table)
+    console.print(f"Mostrando {start + 1}-{end} de {len(positions)} registros")
+
+
+def ask_date(prompt: str) -> Optional[str]:
+    """Ask for an optional date; returns "" when left empty and None when it does not parse."""
+    from utils import parse_date
+    value = Prompt.ask(f"{prompt} (dd/mm/aaaa, vacío = sin límite)", default="").strip()
+    if value and parse_date(value) is None:
+        console.print(f"[red]Fecha no válida: {value}[/red]")
+        return None
+    return value
+
+
+def view_records_menu(records: Sequence["AttendanceRecord"],
+                      index: Optional["RecordIndex"]) -> None:
+    """Show records, optionally filtered by employee ID and date range through the index."""
+    if not records:
+        console.print("[yellow]No hay registros cargados.[/yellow]")
+        return
+
+    positions = None
+    if index is not None:
+        employee_id = Prompt.ask("ID de empleado (vacío = todos)", default="").strip()
+        date_from = ask_date("Desde fecha")
+        date_to = ask_date("Hasta fecha") if date_from is not None else None
+        if date_from is None or date_to is None:
+            return
+        if employee_id or date_from or date_to:
+            positions = index.range(employee_id or None, date_from or None, date_to or None).tolist()
+
+    start = IntPrompt.ask("Desde registro", default=0)
+    count = IntPrompt.ask("Cantidad a mostrar", default=20)
+    display_records(records, start, count, positions)
+
+
+def select_record(records: Sequence["AttendanceRecord"],
+                  index: Optional["RecordIndex"]) -> Optional[int]:
+    """Ask for a record by employee ID and date (through the index) or by position."""
+    if index is not None:
+        employee_id = Prompt.ask("ID de empleado (vacío para elegir por índice)", default="").strip()
+        if employee_id:
+            day = Prompt.ask("Fecha (dd/mm/aaaa)")
+            matches = index.find(employee_id, day).tolist()
+            if not matches:
+                console.print("[yellow]No hay registros de ese empleado en esa fecha.[/yellow]")
+                return None
+            if len(matches) == 1:
+                return matches[0]
+            display_records(records, 0, len(matches), matches)
+            return int(Prompt.ask("Índice del registro a editar", choices=[str(m) for m in matches]))
+
+    idx = IntPrompt.ask(f"Índice del registro a editar (0-{len(records) - 1})")
+    if idx < 0 or idx >= len(records):
+        console.print("[red]Índice fuera de rango.[/red]")
+        return None
+    return idx
 
 
-def display_single_record(rec: AttendanceRecord, index: int) -> None:
+def display_single_record(rec: "AttendanceRecord", index: int) -> None:
     """Display a single record in detail."""
+    from utils import format_time, minutes_to_hours
+    from validation import describe, validate
     table = Table(title=f"Registro #{index}", show_lines=True)
     table.add_column("Campo", style="bold")
     table.add_column("Valor")
@@ -96,6 +180,9 @@ def display_single_record(rec: AttendanceRecord, index: int) -> None:
     table.add_row("Salida", format_time(rec.exit))
     permits_str = ", ".join(format_time(p) for p in rec.permits) if rec.permits else "(ninguno)"
     table.add_row("Permisos", permits_str)
+    issues = describe(int(validate([rec])[0]))
+    if issues:
+        table.add_row("Anomalías", f"[yellow]{issues}[/yellow]")
     table.add_row("---", "--- Resultados ---")
     table.add_row("Tiempo total (min)", f"{rec.total_minutes:.1f}")
     table.add_row("Desc. comida (min)", f"{rec.meal_deduction:.1f}")
@@ -103,19 +190,26 @@ def display_single_record(rec: AttendanceRecord, index: int) -> None:
     table.add_row("Desc. permisos (min)", f"{rec.permit_deduction:.1f}")
     table.add_row("Tiempo laborado (hrs)", f"{minutes_to_hours(rec.net_worked):.2f}")
     table.add_row("Horas extra (hrs)", f"{minutes_to_hours(rec.overtime):.2f}")
+    table.add_row("Extra dobles (hrs)", f"{minutes_to_hours(rec.overtime_double):.2f}")
+    table.add_row("Extra triples (hrs)", f"{minutes_to_hours(rec.overtime_triple):.2f}")
 
     console.print(table)
 
 
-def edit_record_menu(records: List[AttendanceRecord], config: Config) -> None:
+def edit_record_menu(records: Sequence["AttendanceRecord"], config: Config,
+                     index: Optional["RecordIndex"] = None) -> None:
     """Handle editing a record."""
+    from core import calculate_record
+    from models import CELL_FIELDS
+    from periods import apply_overtime_tiers
+    from utils import format_time, parse_time
+
     if not records:
         console.print("[yellow]No hay registros cargados.[/yellow]")
         return
 
-    idx = IntPrompt.ask(f"Índice del registro a editar (0-{len(records) - 1})")
-    if idx < 0 or idx >= len(records):
-        console.print("[red]Índice fuera de rango.[/red]")
+    idx = select_record(records, index)
+    if idx is None:
         return
 
     rec = records[idx]
@@ -146,13 +240,15 @@ def edit_record_menu(records: List[AttendanceRecord], config: Config) -> None:
             "4": "dinner_out", "5": "dinner_in", "6": "exit",
         }
         setattr(rec, field_map[field_choice], parsed)
+        # The cell now holds what the user typed, so it no longer counts as unparsed
+        rec.invalid_cells &= ~(1 << CELL_FIELDS.index(field_map[field_choice]))
 
     elif choice == "2":
         new_val = Prompt.ask("Hora del permiso a añadir (HH:MM)")
         parsed = parse_time(new_val)
         if parsed:
-            rec.permits.append(parsed)
-            rec.permits.sort()
+            rec.permits = sorted(rec.permits + [parsed])
+            rec.invalid_cells &= ~(1 << CELL_FIELDS.index("permits"))
             console.print(f"[green]Permiso {new_val} añadido.[/green]")
         else:
             console.print("[red]Hora no válida.[/red]")
@@ -161,11 +257,14 @@ def edit_record_menu(records: List[AttendanceRecord], config: Config) -> None:
         if not rec.permits:
             console.print("[yellow]No hay permisos para eliminar.[/yellow]")
         else:
-            for pi, p in enumerate(rec.permits):
+            permits = rec.permits
+            for pi, p in enumerate(permits):
                 console.print(f"  {pi}: {format_time(p)}")
             pi = IntPrompt.ask("Índice del permiso a eliminar")
-            if 0 <= pi < len(rec.permits):
-                removed = rec.permits.pop(pi)
+            if 0 <= pi < len(permits):
+                removed = permits.pop(pi)
+                rec.permits = permits
+                rec.invalid_cells &= ~(1 << CELL_FIELDS.index("permits"))
                 console.print(f"[green]Permiso {format_time(removed)} eliminado.[/green]")
             else:
                 console.print("[red]Índice fuera de rango.[/red]")
@@ -173,10 +272,15 @@ def edit_record_menu(records: List[AttendanceRecord], config: Config) -> None:
     elif choice == "4":
         return
 
-    # Recalculate after edit
+    # Recalculate after edit and store the record back into the collection;
+    # the edit can move overtime between tiers on other days of the same week
     calculate_record(rec, config)
+    records[idx] = rec
+    apply_overtime_tiers(records, config)
+    if index is not None:
+        index.update(idx, rec.employee_id, rec.date)
     console.print("[green]Registro recalculado:[/green]")
-    display_single_record(rec, idx)
+    display_single_record(records[idx], idx)
 
 
 def configure_menu(config: Config) -> None:
@@ -188,9 +292,11 @@ def configure_menu(config: Config) -> None:
     console.print(f"  3. Jornada base: {config.base_workday} minutos ({config.base_workday / 60:.1f} hrs)")
     console.print(f"  4. Modo redondeo: {config.rounding_mode}")
     console.print(f"  5. Minutos redondeo: {config.rounding_minutes}")
-    console.print(f"  6. Volver")
+    console.print(f"  6. Extra dobles por semana: {config.weekly_double_overtime} minutos "
+                  f"({config.weekly_double_overtime / 60:.1f} hrs)")
+    console.print(f"  7. Volver")
 
-    choice = Prompt.ask("Parámetro a modificar", choices=["1", "2", "3", "4", "5", "6"])
+    choice = Prompt.ask("Parámetro a modificar", choices=["1", "2", "3", "4", "5", "6", "7"])
 
     if choice == "1":
         config.meal_threshold = IntPrompt.ask("Nuevo umbral comida (minutos)", default=config.meal_threshold)
@@ -205,41 +311,123 @@ def configure_menu(config: Config) -> None:
         )
     elif choice == "5":
         config.rounding_minutes = IntPrompt.ask("Minutos de redondeo", default=config.rounding_minutes)
+    elif choice == "6":
+        config.weekly_double_overtime = IntPrompt.ask(
+            "Minutos de horas extra dobles por semana", default=config.weekly_double_overtime
+        )
 
     console.print("[green]Configuración actualizada.[/green]")
 
 
+def save_to_store(records: Sequence["AttendanceRecord"], config: Config) -> None:
+    """Upsert the loaded records into the persistent store."""
+    if not records:
+        console.print("[yellow]No hay registros para guardar.[/yellow]")
+        return
+    from store import AttendanceStore
+    with AttendanceStore() as store:
+        counts = store.append(records, config)
+        total = len(store)
+    console.print(f"[green]Almacén actualizado: {counts['inserted']} nuevos, "
+                  f"{counts['updated']} actualizados, {counts['unchanged']} sin cambios "
+                  f"({total} días guardados).[/green]")
+    if counts["skipped"]:
+        console.print(f"[yellow]{counts['skipped']} registros sin fecha válida no se guardaron."
+                      "[/yellow]")
+
+
+def query_store_menu() -> Optional["RecordBatch"]:
+    """Load records from the persistent store by employee ID and date range (None when cancelled)."""
+    from store import AttendanceStore
+
+    employee_id = Prompt.ask("ID de empleado (vacío = todos)", default="").strip()
+    date_from = ask_date("Desde fecha")
+    date_to = ask_date("Hasta fecha") if date_from is not None else None
+    if date_from is None or date_to is None:
+        return None
+    with AttendanceStore() as store:
+        return store.query(employee_id or None, date_from or None, date_to or None)
+
+
+def show_anomalies(records: Sequence["AttendanceRecord"]) -> None:
+    """Validate the records and display how many show each data-quality issue."""
+    from validation import ISSUES, summarize, validate
+
+    codes = validate(records)
+    counts = summarize(codes)
+    if not counts:
+        return
+    table = Table(show_header=True, box=None)
+    table.add_column("Código", justify="right")
+    table.add_column("Problema")
+    table.add_column("Registros", justify="right")
+    for bit, count in counts.items():
+        table.add_row(str(bit), ISSUES[bit], str(count))
+    console.print(Panel(table, title=f"{int((codes != 0).sum())} registros con anomalías",
+                        border_style="yellow"))
+    console.print("[dim]La columna Anom. suma los códigos de cada registro.[/dim]")
+
+
+def show_metrics() -> None:
+    """Display the per-stage metrics panel (only when instrumentation is enabled)."""
+    if not metrics.is_enabled():
+        return
+    stages = metrics.summary()
+    if not stages:
+        return
+    table = Table(show_header=True, box=None)
+    table.add_column("Etapa")
+    table.add_column("Llamadas", justify="right")
+    table.add_column("Tiempo (s)", justify="right")
+    table.add_column("Registros", justify="right")
+    table.add_column("Registros/s", justify="right")
+    table.add_column("Memoria pico", justify="right")
+    for stage in stages:
+        peak = stage["peak_memory_bytes"]
+        table.add_row(
+            stage["stage"],
+            str(stage["calls"]),
+            f"{stage['seconds']:.3f}",
+            str(stage["rows"]),
+            f"{stage['rows_per_second']:.0f}",
+            f"{peak / 2**20:.1f} MiB" if peak is not None else "-",
+        )
+    console.print(Panel(table, title="Métricas de rendimiento"))
+
+
 def run_cli() -> None:
     """Main CLI loop."""
     config = Config()
-    records: List[AttendanceRecord] = []
+    records: Sequence["AttendanceRecord"] = []
+    index: Optional["RecordIndex"] = None
 
     while True:
         choice = show_menu()
 
         if choice == "1":
-            filepath = Prompt.ask("Ruta del archivo Excel")
+            filepath = Prompt.ask("Ruta del archivo (.xlsx, .csv o .parquet)")
             try:
-                records = load_excel(filepath)
+                from cache import load_cached
+                from core import calculate_all
+                from recordindex import RecordIndex
+                records = load_cached(filepath)
                 records = calculate_all(records, config)
+                index = RecordIndex.from_records(records)
                 console.print(f"[green]Se cargaron {len(records)} registros.[/green]")
+                show_anomalies(records)
             except FileNotFoundError:
                 console.print(f"[red]Archivo no encontrado: {filepath}[/red]")
             except Exception as e:
                 console.print(f"[red]Error al cargar archivo: {e}[/red]")
 
         elif choice == "2":
-            if not records:
-                console.print("[yellow]No hay registros cargados.[/yellow]")
-            else:
-                start = IntPrompt.ask("Desde registro", default=0)
-                count = IntPrompt.ask("Cantidad a mostrar", default=20)
-                display_records(records, start, count)
+            view_records_menu(records, index)
 
         elif choice == "3":
-            edit_record_menu(records, config)
+            edit_record_menu(records, config, index)
 
         elif choice == "4":
+            from core import calculate_all
             records = calculate_all(records, config)
             console.print(f"[green]Se recalcularon {len(records)} registros.[/green]")
 
@@ -247,9 +435,12 @@ def run_cli() -> None:
             if not records:
                 console.print("[yellow]No hay registros para exportar.[/yellow]")
             else:
-                filepath = Prompt.ask("Ruta del archivo de salida", default="resultado.xlsx")
+                filepath = Prompt.ask(
+                    "Ruta del archivo de salida (.xlsx, .csv o .parquet)", default="resultado.xlsx"
+                )
                 try:
-                    export_excel(records, filepath)
+                    from io_excel import export_records
+                    export_records(records, filepath)
                     console.print(f"[green]Archivo exportado: {filepath}[/green]")
                 except Exception as e:
                     console.print(f"[red]Error al exportar: {e}[/red]")
@@ -258,5 +449,30 @@ def run_cli() -> None:
             configure_menu(config)
 
         elif choice == "7":
+            path = metrics.dump_json()
+            if path:
+                console.print(f"Métricas guardadas en {path}")
             console.print("[bold cyan]¡Hasta luego![/bold cyan]")
             break
+
+        elif choice == "8":
+            try:
+                save_to_store(records, config)
+            except Exception as e:
+                console.print(f"[red]Error al guardar en el almacén: {e}[/red]")
+
+        elif choice == "9":
+            try:
+                stored = query_store_menu()
+            except Exception as e:
+                console.print(f"[red]Error al consultar el almacén: {e}[/red]")
+                stored = None
+            if stored is not None:
+                # Results come as stored; use "Recalcular todos" to apply the current config
+                from recordindex import RecordIndex
+                records = stored
+                index = RecordIndex.from_records(records)
+                console.print(f"[green]Se cargaron {len(records)} registros del almacén.[/green]")
+                show_anomalies(records)
+
+        show_metrics()
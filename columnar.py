@@ -0,0 +1,244 @@
+"""Columnar (NumPy) calculation engine for batches of attendance records.
+
+Punches are held as int64 arrays of seconds since ``utils.TIME_EPOCH`` with
+``utils.MISSING_TIME`` marking empty cells, and every rule of ``core`` is
+applied as whole-array operations. The per-record functions in ``core`` remain
+the reference implementation; this engine produces identical results.
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import Config
+from models import AttendanceRecord, RecordBatch, PUNCH_FIELDS
+from utils import to_seconds, MISSING_TIME
+
+# Punch columns in the order they appear in a workday
+TIME_FIELDS = PUNCH_FIELDS
+
+
+class PunchColumns:
+    """Punch times of a batch of records, one int64 array per column.
+
+    Permits are variable-length per record and are stored flattened in
+    ``permit_values`` with ``permit_offsets`` (length ``n + 1``) delimiting
+    each record's slice.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray],
+                 permit_values: np.ndarray, permit_offsets: np.ndarray):
+        self.columns = columns
+        self.permit_values = permit_values
+        self.permit_offsets = permit_offsets
+
+    def __len__(self) -> int:
+        return len(self.permit_offsets) - 1
+
+    @classmethod
+    def from_records(cls, records: List[AttendanceRecord]) -> "PunchColumns":
+        """Build the column arrays from a list of records."""
+        rows = np.array(
+            [(to_seconds(r.entry), to_seconds(r.meal_out), to_seconds(r.meal_in),
+              to_seconds(r.dinner_out), to_seconds(r.dinner_in), to_seconds(r.exit),
+              len(r.permits)) for r in records],
+            dtype=np.int64,
+        ).reshape(len(records), len(TIME_FIELDS) + 1)
+        columns = {name: rows[:, i].copy() for i, name in enumerate(TIME_FIELDS)}
+        offsets = np.zeros(len(records) + 1, dtype=np.int64)
+        np.cumsum(rows[:, -1], out=offsets[1:])
+        values = np.fromiter(
+            (to_seconds(p) for r in records for p in r.permits),
+            dtype=np.int64, count=int(offsets[-1]),
+        )
+        return cls(columns, values, offsets)
+
+    @classmethod
+    def from_batch(cls, batch: RecordBatch) -> "PunchColumns":
+        """Wrap the typed arrays of a RecordBatch without copying them."""
+        def view(buffer):
+            return np.frombuffer(buffer, dtype=np.int64) if len(buffer) else np.zeros(0, dtype=np.int64)
+
+        columns = {name: view(batch.punches[name]) for name in TIME_FIELDS}
+        return cls(columns, view(batch.permit_values), view(batch.permit_offsets))
+
+    def slice(self, start: int, stop: int) -> "PunchColumns":
+        """Columns for records ``start:stop`` (offsets rebased to the slice)."""
+        lo, hi = self.permit_offsets[start], self.permit_offsets[stop]
+        columns = {name: col[start:stop] for name, col in self.columns.items()}
+        return PunchColumns(columns, self.permit_values[lo:hi],
+                            self.permit_offsets[start:stop + 1] - lo)
+
+    def to_bytes(self) -> bytes:
+        """Serialize as one flat int64 buffer: header, punch columns, offsets, permits."""
+        header = np.array([len(self), len(self.permit_values)], dtype=np.int64)
+        parts = [header] + [self.columns[name] for name in TIME_FIELDS]
+        parts += [self.permit_offsets, self.permit_values]
+        return np.concatenate(parts).astype(np.int64, copy=False).tobytes()
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "PunchColumns":
+        """Inverse of to_bytes."""
+        flat = np.frombuffer(payload, dtype=np.int64)
+        n, n_permits = int(flat[0]), int(flat[1])
+        pos = 2
+        columns = {}
+        for name in TIME_FIELDS:
+            columns[name] = flat[pos:pos + n]
+            pos += n
+        offsets = flat[pos:pos + n + 1]
+        values = flat[pos + n + 1:pos + n + 1 + n_permits]
+        return cls(columns, values, offsets)
+
+
+def _elapsed_minutes(start: np.ndarray, end: np.ndarray):
+    """Return (valid mask, minutes from start to end) for two punch columns."""
+    valid = (start != MISSING_TIME) & (end != MISSING_TIME)
+    seconds = np.subtract(end, start, out=np.zeros(len(start), dtype=np.int64), where=valid)
+    return valid, seconds / 60.0
+
+
+def total_time(cols: PunchColumns) -> np.ndarray:
+    """Minutes from entry to exit, falling back to the last available punch."""
+    c = cols.columns
+    # MISSING_TIME is the smallest int64, so it never wins a maximum
+    last = np.maximum.reduce([c["meal_out"], c["meal_in"], c["dinner_out"], c["dinner_in"]])
+    counts = np.diff(cols.permit_offsets)
+    has_permits = counts > 0
+    if has_permits.any():
+        permit_max = np.maximum.reduceat(cols.permit_values, cols.permit_offsets[:-1][has_permits])
+        last[has_permits] = np.maximum(last[has_permits], permit_max)
+    end = np.where(c["exit"] == MISSING_TIME, last, c["exit"])
+    valid, minutes = _elapsed_minutes(c["entry"], end)
+    return np.where(valid, minutes, 0.0)
+
+
+def break_deduction(start: np.ndarray, end: np.ndarray, threshold: int) -> np.ndarray:
+    """Meal/dinner deduction: 30 min up to the threshold, the full break above it."""
+    valid, minutes = _elapsed_minutes(start, end)
+    deduction = np.where(minutes <= threshold, 30.0, minutes)
+    deduction[~valid | (minutes <= 0)] = 0.0
+    return deduction
+
+
+def permit_deduction(cols: PunchColumns) -> np.ndarray:
+    """Sum of positive (start, end) permit pairs per record; a trailing odd permit is ignored."""
+    n = len(cols)
+    offsets = cols.permit_offsets
+    counts = np.diff(offsets)
+    owner = np.repeat(np.arange(n), counts)
+    position = np.arange(len(cols.permit_values)) - offsets[:-1][owner]
+    starts = np.flatnonzero((position % 2 == 0) & (position + 1 < counts[owner]))
+    minutes = (cols.permit_values[starts + 1] - cols.permit_values[starts]) / 60.0
+    minutes[minutes <= 0] = 0.0
+    return np.bincount(owner[starts], weights=minutes, minlength=n).astype(np.float64)
+
+
+def round_overtime(minutes: np.ndarray, mode: str, rounding_minutes: int) -> np.ndarray:
+    """Array counterpart of ``utils.apply_rounding``."""
+    if mode == "none" or rounding_minutes <= 0:
+        return minutes
+    if mode == "ceil":
+        return np.ceil(minutes / rounding_minutes) * rounding_minutes
+    if mode == "floor":
+        return np.floor(minutes / rounding_minutes) * rounding_minutes
+    if mode == "round":
+        return np.round(minutes / rounding_minutes) * rounding_minutes
+    return minutes
+
+
+def net_worked(total: np.ndarray, meal: np.ndarray, dinner: np.ndarray,
+               permits: np.ndarray) -> np.ndarray:
+    """Total time minus all deductions, floored at zero."""
+    net = total - (meal + dinner + permits)
+    net[net < 0] = 0.0
+    return net
+
+
+def overtime(net: np.ndarray, config: Config) -> np.ndarray:
+    """Rounded minutes worked beyond the base workday."""
+    raw_overtime = net - config.base_workday
+    positive = raw_overtime > 0
+    result = np.zeros(len(net), dtype=np.float64)
+    result[positive] = round_overtime(
+        raw_overtime[positive], config.rounding_mode, config.rounding_minutes
+    )
+    return result
+
+
+# Calculation stages in evaluation order: result field -> (Config fields it
+# reads, result fields it is derived from, function computing it)
+STAGES = {
+    "total_minutes": ((), (), lambda cols, config, r: total_time(cols)),
+    "meal_deduction": (("meal_threshold",), (), lambda cols, config, r: break_deduction(
+        cols.columns["meal_out"], cols.columns["meal_in"], config.meal_threshold)),
+    "dinner_deduction": (("dinner_threshold",), (), lambda cols, config, r: break_deduction(
+        cols.columns["dinner_out"], cols.columns["dinner_in"], config.dinner_threshold)),
+    "permit_deduction": ((), (), lambda cols, config, r: permit_deduction(cols)),
+    "net_worked": ((), ("total_minutes", "meal_deduction", "dinner_deduction", "permit_deduction"),
+                   lambda cols, config, r: net_worked(r["total_minutes"], r["meal_deduction"],
+                                                      r["dinner_deduction"], r["permit_deduction"])),
+    "overtime": (("base_workday", "rounding_mode", "rounding_minutes"), ("net_worked",),
+                 lambda cols, config, r: overtime(r["net_worked"], config)),
+}
+
+
+def stale_stages(old: Config, new: Config) -> List[str]:
+    """Stages whose results differ between two configs, in evaluation order."""
+    old_values, new_values = old.to_dict(), new.to_dict()
+    changed = {name for name in new_values if old_values.get(name) != new_values[name]}
+    stale: List[str] = []
+    for name, (fields, inputs, _) in STAGES.items():
+        if changed.intersection(fields) or any(i in stale for i in inputs):
+            stale.append(name)
+    return stale
+
+
+def compute(cols: PunchColumns, config: Config,
+            previous: Optional[Dict[str, np.ndarray]] = None,
+            previous_config: Optional[Config] = None) -> Dict[str, np.ndarray]:
+    """Compute every calculated field for a batch; returns one float64 array per field.
+
+    With the results of an earlier call on the same ``cols`` (``previous``,
+    computed under ``previous_config``), only the stages affected by the
+    config changes are recomputed; the other arrays are reused as they are, so
+    result arrays must be treated as read-only.
+    """
+    if previous is None or previous_config is None:
+        stale = list(STAGES)
+    else:
+        stale = stale_stages(previous_config, config)
+    results: Dict[str, np.ndarray] = {}
+    for name, (_, _, stage) in STAGES.items():
+        results[name] = stage(cols, config, results) if name in stale else previous[name]
+    return results
+
+
+def calculate_batch(records: List[AttendanceRecord], config: Config,
+                    cols: Optional[PunchColumns] = None) -> List[AttendanceRecord]:
+    """Calculate all records with the columnar engine, writing results back in place.
+
+    Pass ``cols`` built once with ``PunchColumns.from_records`` to skip the
+    conversion when recalculating the same records under a new config.
+    """
+    if cols is None:
+        cols = PunchColumns.from_records(records)
+    results = compute(cols, config)
+    for name, values in results.items():
+        for rec, value in zip(records, values.tolist()):
+            setattr(rec, name, value)
+    return list(records)
+
+
+def calculate_record_batch(batch: RecordBatch, config: Config) -> RecordBatch:
+    """Calculate a RecordBatch in place, writing straight into its result arrays."""
+    if len(batch):
+        apply_results(batch, compute(PunchColumns.from_batch(batch), config))
+    return batch
+
+
+def apply_results(batch: RecordBatch, results: Dict[str, np.ndarray]) -> RecordBatch:
+    """Copy result arrays produced by compute() into a batch's result columns."""
+    for name, values in results.items():
+        np.frombuffer(batch.results[name], dtype=np.float64)[:] = values
+    return batch
@@ -10,6 +10,7 @@ class Config:
         self.base_workday: int = 480  # minutes (8 hours)
         self.rounding_mode: str = "none"  # none, ceil, floor, round
         self.rounding_minutes: int = 15  # round to nearest N minutes
+        self.weekly_double_overtime: int = 540  # weekly overtime paid double (minutes); the rest is triple
 
     def to_dict(self) -> dict:
         return {
@@ -18,4 +19,15 @@ class Config:
             "base_workday": self.base_workday,
             "rounding_mode": self.rounding_mode,
             "rounding_minutes": self.rounding_minutes,
+            "weekly_double_overtime": self.weekly_double_overtime,
         }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Config":
+        """Build a Config from a dict like the one returned by to_dict()."""
+        cfg = cls()
+        for key, value in data.items():
+            if key not in cfg.__dict__:
+                raise ValueError(f"Unknown config parameter: {key}")
+            setattr(cfg, key, value)
+        return cfg
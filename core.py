@@ -1,9 +1,11 @@
 """Core calculation engine for attendance records."""
 
-from typing import List
-from models import AttendanceRecord
+from typing import List, Optional, Union
+from models import AttendanceRecord, RecordBatch
 from config import Config
+from periods import apply_overtime_tiers
 from utils import minutes_between, apply_rounding
+import metrics
 
 
 def calculate_meal_deduction(record: AttendanceRecord, threshold: int) -> float:
@@ -66,7 +68,11 @@ def calculate_total_time(record: AttendanceRecord) -> float:
 
 
 def calculate_record(record: AttendanceRecord, config: Config) -> AttendanceRecord:
-    """Perform all calculations on a single attendance record."""
+    """Perform all calculations on a single attendance record.
+
+    The weekly overtime tiers depend on the employee's other days and are left
+    unchanged; see periods.apply_overtime_tiers.
+    """
     record.total_minutes = calculate_total_time(record)
     record.meal_deduction = calculate_meal_deduction(record, config.meal_threshold)
     record.dinner_deduction = calculate_dinner_deduction(record, config.dinner_threshold)
@@ -89,6 +95,34 @@ def calculate_record(record: AttendanceRecord, config: Config) -> AttendanceReco
     return record
 
 
-def calculate_all(records: List[AttendanceRecord], config: Config) -> List[AttendanceRecord]:
-    """Recalculate all records."""
+def calculate_all(records: Union[List[AttendanceRecord], RecordBatch], config: Config,
+                  engine: str = "python",
+                  workers: Optional[int] = None) -> Union[List[AttendanceRecord], RecordBatch]:
+    """Recalculate all records.
+
+    ``engine`` is ``"python"`` (per-record reference path) or ``"numpy"``
+    (columnar engine in ``columnar.py``); both give identical results.
+    A RecordBatch is always calculated in place by the columnar engine.
+    With ``workers`` > 1, inputs of at least ``parallel.PARALLEL_THRESHOLD``
+    records are split across a process pool instead. Weekly overtime tiers
+    are split afterwards over all records at once.
+    """
+    with metrics.span("calculate", rows=len(records)):
+        records = _calculate_all(records, config, engine, workers)
+        return apply_overtime_tiers(records, config)
+
+
+def _calculate_all(records, config: Config, engine: str, workers: Optional[int]):
+    if workers is not None and workers > 1:
+        from parallel import PARALLEL_THRESHOLD, calculate_parallel
+        if len(records) >= PARALLEL_THRESHOLD:
+            return calculate_parallel(records, config, workers)
+    if isinstance(records, RecordBatch):
+        from columnar import calculate_record_batch
+        return calculate_record_batch(records, config)
+    if engine == "numpy":
+        from columnar import calculate_batch
+        return calculate_batch(records, config)
+    if engine != "python":
+        raise ValueError(f"Unknown calculation engine: {engine}")
     return [calculate_record(r, config) for r in records]
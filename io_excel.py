@@ -1,9 +1,29 @@
-"""Excel import/export functions."""
+"""Import/export functions for Excel, CSV and Parquet files.
 
-import pandas as pd
-from typing import List
-from models import AttendanceRecord
-from utils import parse_time, format_time, minutes_to_hours, parse_permit_string
+openpyxl and pyarrow are imported on the first Excel or Parquet read or
+write, so importing this module (e.g. for CSV files) stays cheap.
+"""
+
+import csv
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from models import AttendanceRecord, RecordBatch, CELL_FIELDS, PUNCH_FIELDS
+import metrics
+from periods import SUMMARY_FIELDS, summarize_columns
+from punches import is_punch_log, iter_punch_records, load_punch_batch
+from utils import (
+    detect_time_format, format_time, minutes_to_hours, parse_date_column, parse_permit_cells,
+    parse_time_column, to_seconds,
+)
+from validation import ISSUES, describe, issue_codes, summarize
 
 
 # Column name mappings (Spanish -> internal attribute name)
@@ -18,71 +38,612 @@ COLUMN_MAP = {
     "REGRESO DE CENAR": "dinner_in",
     "SALIDA": "exit",
     "PERMISO": "permits",
+    "HOJA": "sheet",
 }
 
+# Output columns of export_excel, in order; columns added later go at the end
+# so consumers that read by position keep working
+EXPORT_COLUMNS = [name for name in COLUMN_MAP if name != "HOJA"] + [
+    "TIEMPO LABORADO",
+    "HORAS EXTRA",
+    "DESCUENTO COMIDAS",
+    "DESCUENTO PERMISOS",
+    "HORAS EXTRA DOBLES",
+    "HORAS EXTRA TRIPLES",
+    "HOJA",
+]
+
+# Summary sheets export_excel adds after the detail sheet, by period
+SUMMARY_SHEETS = {"week": "Resumen semanal", "quincena": "Resumen quincenal"}
+
+# Sheet listing the records with data-quality issues, and its columns: FILA is
+# the record's row in the detail sheet and CÓDIGO its validation issue code
+ANOMALY_SHEET = "Anomalías"
+ANOMALY_COLUMNS = ["FILA", "ID", "FECHA", "EMPLEADO", "HOJA", "CÓDIGO", "PROBLEMAS"]
+
+# Columns of the summary sheets, in order
+SUMMARY_COLUMNS = [
+    "ID",
+    "EMPLEADO",
+    "INICIO",
+    "FIN",
+    "DÍAS",
+    "TIEMPO LABORADO",
+    "HORAS EXTRA",
+    "HORAS EXTRA DOBLES",
+    "HORAS EXTRA TRIPLES",
+    "DESCUENTO COMIDAS",
+    "DESCUENTO PERMISOS",
+]
+
+# A file path, or an in-memory binary buffer such as io.BytesIO
+FileSource = Union[str, BinaryIO]
+
 # Fields that should be parsed as time values
 _TIME_FIELDS = {"entry", "meal_out", "meal_in", "dinner_out", "dinner_in", "exit"}
 
+# Rows buffered per chunk so time columns can be parsed column-wise
+CHUNK_ROWS = 4096
+
+# Header columns that mark a workbook sheet as attendance records (punch logs
+# are recognized by their own layout)
+REQUIRED_COLUMNS = ("ID", "FECHA")
+
+# Workbook size in bytes from which its attendance sheets are parsed on a
+# process pool (about 5,000 rows); smaller workbooks load faster than the pool starts
+PARALLEL_SHEET_BYTES = 256 * 1024
+
+# File extensions handled by load_records/export_records
+SUPPORTED_EXTENSIONS = (".xlsx", ".csv", ".parquet")
+
+# Result formats offered for download and their MIME types
+EXPORT_MIME_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
 
-def load_excel(filepath: str) -> List[AttendanceRecord]:
-    """Load attendance records from an Excel file."""
-    df = pd.read_excel(filepath, engine="openpyxl")
+def _resolve_columns(header: Iterable) -> List[Tuple[int, str]]:
+    """Map COLUMN_MAP attributes to positions in a header row (missing columns are skipped)."""
+    positions = {}
+    for i, cell in enumerate(header):
+        name = str(cell).strip().upper() if cell is not None else ""
+        positions.setdefault(name, i)
+    return [(positions[col], attr) for col, attr in COLUMN_MAP.items() if col in positions]
 
-    # Normalize column names
-    df.columns = [str(c).strip().upper() for c in df.columns]
 
-    records = []
-    for _, row in df.iterrows():
-        rec = AttendanceRecord()
+def _text(value) -> str:
+    """Convert a cell value to a stripped string ("" for empty cells)."""
+    return "" if value is None else str(value).strip()
 
-        for col_name, attr_name in COLUMN_MAP.items():
-            if col_name not in df.columns:
-                continue
-            val = row.get(col_name, "")
-            if attr_name == "permits":
-                setattr(rec, attr_name, parse_permit_string(val))
-            elif attr_name in _TIME_FIELDS:
-                setattr(rec, attr_name, parse_time(val))
-            elif attr_name == "date":
-                setattr(rec, attr_name, str(val).strip() if pd.notna(val) else "")
-            else:
-                setattr(rec, attr_name, str(val).strip())
 
-        records.append(rec)
+def _is_blank(value) -> bool:
+    """True for cells the parsers read as empty (None, "" or "nan")."""
+    return value is None or str(value).strip().lower() in ("", "nan")
 
+
+def _build_records(chunk: List[tuple], columns: List[Tuple[int, str]],
+                   formats: dict) -> List[AttendanceRecord]:
+    """Build records for a chunk of rows, parsing each time column in one pass.
+
+    ``formats`` carries the detected text format of every time column across chunks.
+    Cells with a value that does not parse set their bit in ``invalid_cells``.
+    """
+    def column(pos):
+        return [row[pos] if pos < len(row) else None for row in chunk]
+
+    records = [AttendanceRecord() for _ in chunk]
+    for pos, attr_name in columns:
+        raw = column(pos)
+        unparsed = None
+        if attr_name in _TIME_FIELDS:
+            if formats.get(attr_name) is None:
+                formats[attr_name] = detect_time_format(raw)
+            values = parse_time_column(raw, formats[attr_name])
+            # Only scan the column when it has more empty results than empty cells
+            if values.count(None) > raw.count(None) + raw.count(""):
+                unparsed = [v is None and not _is_blank(r) for r, v in zip(raw, values)]
+        elif attr_name == "permits":
+            values, unparsed = parse_permit_cells(raw)
+        else:
+            values = [_text(v) for v in raw]
+        for rec, val in zip(records, values):
+            setattr(rec, attr_name, val)
+        if unparsed is not None and any(unparsed):
+            bit = 1 << CELL_FIELDS.index(attr_name)
+            for rec, bad in zip(records, unparsed):
+                if bad:
+                    rec.invalid_cells |= bit
     return records
 
 
-def export_excel(records: List[AttendanceRecord], filepath: str) -> None:
-    """Export attendance records to an Excel file."""
-    rows = []
-    for rec in records:
-        # Format permit pairs
-        permit_str = ""
-        if rec.permits:
-            pairs = []
-            for i in range(0, len(rec.permits) - 1, 2):
-                pairs.append(f"{format_time(rec.permits[i])}-{format_time(rec.permits[i + 1])}")
-            if len(rec.permits) % 2 == 1:
-                pairs.append(format_time(rec.permits[-1]))
-            permit_str = ", ".join(pairs)
-
-        rows.append({
-            "ID": rec.employee_id,
-            "FECHA": rec.date,
-            "EMPLEADO": rec.employee_name,
-            "ENTRADA": format_time(rec.entry),
-            "SALIDA A COMER": format_time(rec.meal_out),
-            "REGRESO DE COMER": format_time(rec.meal_in),
-            "SALIDA A CENAR": format_time(rec.dinner_out),
-            "REGRESO DE CENAR": format_time(rec.dinner_in),
-            "SALIDA": format_time(rec.exit),
-            "PERMISO": permit_str,
-            "TIEMPO LABORADO": minutes_to_hours(rec.net_worked),
-            "HORAS EXTRA": minutes_to_hours(rec.overtime),
-            "DESCUENTO COMIDAS": minutes_to_hours(rec.meal_deduction + rec.dinner_deduction),
-            "DESCUENTO PERMISOS": minutes_to_hours(rec.permit_deduction),
-        })
-
-    df = pd.DataFrame(rows)
-    df.to_excel(filepath, index=False, engine="openpyxl")
+def iter_records(header: Iterable, rows: Iterable[tuple]) -> Iterator[AttendanceRecord]:
+    """Yield one AttendanceRecord per data row, resolving the header mapping once.
+
+    Rows are buffered in chunks of CHUNK_ROWS so time columns are parsed
+    column-wise; rows where every cell is empty are skipped.
+    """
+    columns = _resolve_columns(header)
+    formats: dict = {}
+    chunk = []
+    for row in rows:
+        if all(v is None or v == "" for v in row):
+            continue
+        chunk.append(row)
+        if len(chunk) >= CHUNK_ROWS:
+            yield from _build_records(chunk, columns, formats)
+            chunk = []
+    if chunk:
+        yield from _build_records(chunk, columns, formats)
+
+
+def iter_table(header: Iterable, rows: Iterable[tuple]) -> Iterator[AttendanceRecord]:
+    """Records of a table: one per row, or per employee and day for a raw punch log."""
+    if is_punch_log(header):
+        return iter_punch_records(header, rows)
+    return iter_records(header, rows)
+
+
+def _column_name(cell) -> str:
+    return str(cell).strip().upper() if cell is not None else ""
+
+
+def _header(book, name: str) -> tuple:
+    """First row of a worksheet; only that row's XML is parsed."""
+    return next(book.iter_rows(name, max_row=1), ())
+
+
+def _excel_rows(filepath: FileSource) -> Iterator[tuple]:
+    """Rows of every attendance sheet of an Excel file as one table, header first.
+
+    Sheets are read in workbook order (see _attendance_sheets) with their
+    columns aligned by name under the union of their headers. A HOJA column
+    is added when missing, and empty HOJA cells get the sheet's title, as
+    iter_excel does. Empty rows are skipped. Workbooks that mix punch logs
+    and daily sheets should be read with iter_file or load_batch instead,
+    which handle each sheet on its own.
+    """
+    from xlsxreader import XlsxReader
+
+    with XlsxReader(filepath) as book:
+        sheets = _attendance_sheets(book)
+        headers = [[_column_name(c) for c in _header(book, name)] for name in sheets]
+        columns = list(dict.fromkeys(name for header in headers for name in header if name))
+        if not columns:
+            return
+        if "HOJA" not in columns:
+            columns.append("HOJA")
+        yield tuple(columns)
+        sheet_column = columns.index("HOJA")
+        for name, header in zip(sheets, headers):
+            positions: dict = {}
+            for i, column in enumerate(header):
+                positions.setdefault(column, i)
+            take = [positions.get(column) for column in columns]
+            for row in islice(book.iter_rows(name), 1, None):
+                if all(v is None or v == "" for v in row):
+                    continue
+                values = [row[i] if i is not None and i < len(row) else None for i in take]
+                if values[sheet_column] in (None, ""):
+                    values[sheet_column] = name
+                yield tuple(values)
+
+
+def _is_attendance_header(header: Optional[tuple]) -> bool:
+    if not header:
+        return False
+    names = {str(cell).strip().upper() for cell in header if cell is not None}
+    return all(col in names for col in REQUIRED_COLUMNS) or is_punch_log(header)
+
+
+def _attendance_sheets(book) -> List[str]:
+    """Names of the worksheets whose header has REQUIRED_COLUMNS or a punch log layout.
+
+    Worksheets come in workbook order. A workbook where no sheet qualifies
+    yields its active sheet, as when only the first sheet was read.
+    """
+    sheets = [name for name in book.sheet_names if _is_attendance_header(_header(book, name))]
+    return sheets or [book.active]
+
+
+def _iter_rows_records(rows: Iterator[tuple]) -> Iterator[AttendanceRecord]:
+    header = next(rows, None)
+    if header is not None:
+        yield from iter_table(header, rows)
+
+
+def iter_excel(filepath: FileSource) -> Iterator[AttendanceRecord]:
+    """Stream attendance records from every attendance sheet of an Excel file, in order.
+
+    Records without a HOJA value are tagged with the title of their sheet.
+    """
+    from xlsxreader import XlsxReader
+
+    with XlsxReader(filepath) as book:
+        for name in _attendance_sheets(book):
+            for rec in _iter_rows_records(book.iter_rows(name)):
+                rec.sheet = rec.sheet or name
+                yield rec
+
+
+def _table_batch(rows: Iterator[tuple]) -> RecordBatch:
+    """RecordBatch of a table's rows, header first (see load_batch)."""
+    header = next(rows, None)
+    if header is None:
+        return RecordBatch()
+    if is_punch_log(header):
+        return load_punch_batch(header, rows)
+    return RecordBatch.from_records(iter_records(header, rows))
+
+
+def _sheet_batch(book, name: str) -> RecordBatch:
+    batch = _table_batch(book.iter_rows(name))
+    batch.text["sheet"] = [sheet or name for sheet in batch.text["sheet"]]
+    return batch
+
+
+def _load_sheet(filepath: Union[str, bytes], name: str) -> bytes:
+    """Worker entry point: one sheet of a workbook (path or bytes) in, a serialized batch out."""
+    from xlsxreader import XlsxReader
+
+    with XlsxReader(filepath) as book:
+        return _sheet_batch(book, name).to_bytes()
+
+
+def load_workbook_batch(filepath: FileSource, workers: Optional[int] = None) -> RecordBatch:
+    """Every attendance sheet of an .xlsx file or buffer as one RecordBatch, in sheet order.
+
+    Records keep their row order within each sheet and are tagged with its
+    title (see iter_excel). Workbooks of PARALLEL_SHEET_BYTES or more have
+    their sheets parsed at once on up to ``workers`` processes (one per CPU
+    by default). Opening a workbook only reads its sheet list (see
+    xlsxreader), and each process parses just the sheet it is given, so the
+    workbook loads in about the time of its largest sheet. Callers that
+    already run in a worker process pass ``workers=1``.
+    """
+    from xlsxreader import XlsxReader
+
+    if isinstance(filepath, os.PathLike):
+        filepath = os.fspath(filepath)
+    elif isinstance(filepath, (bytes, bytearray, memoryview)):
+        filepath = bytes(filepath)
+    elif not isinstance(filepath, str):
+        # Every worker reopens the workbook, so a buffer is read into bytes once
+        filepath = filepath.read()
+    size = len(filepath) if isinstance(filepath, bytes) else os.path.getsize(filepath)
+
+    batch = RecordBatch()
+    with XlsxReader(filepath) as book:
+        sheets = _attendance_sheets(book)
+        workers = min(workers or os.cpu_count() or 1, len(sheets))
+        if workers < 2 or size < PARALLEL_SHEET_BYTES:
+            for name in sheets:
+                batch.extend(_sheet_batch(book, name))
+            return batch
+
+    # Spawned rather than forked: callers may be multithreaded (Streamlit, the service)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        # map() yields in sheet order, whatever order the sheets finish in
+        for blob in pool.map(_load_sheet, [filepath] * len(sheets), sheets):
+            batch.extend(RecordBatch.from_bytes(blob))
+    return batch
+
+
+def load_excel(filepath: FileSource, workers: Optional[int] = None) -> List[AttendanceRecord]:
+    """Load attendance records from every attendance sheet of an Excel file."""
+    with metrics.span("load") as sp:
+        records = [rec.to_record() for rec in load_workbook_batch(filepath, workers)]
+        sp.add_rows(len(records))
+    return records
+
+
+def format_permits(permits: list) -> str:
+    """Format permits as "HH:MM-HH:MM" pairs; a trailing unpaired time is listed alone."""
+    if not permits:
+        return ""
+    pairs = []
+    for i in range(0, len(permits) - 1, 2):
+        pairs.append(f"{format_time(permits[i])}-{format_time(permits[i + 1])}")
+    if len(permits) % 2 == 1:
+        pairs.append(format_time(permits[-1]))
+    return ", ".join(pairs)
+
+
+def export_row(rec: AttendanceRecord) -> list:
+    """Values of one output row, in EXPORT_COLUMNS order."""
+    return [
+        rec.employee_id,
+        rec.date,
+        rec.employee_name,
+        format_time(rec.entry),
+        format_time(rec.meal_out),
+        format_time(rec.meal_in),
+        format_time(rec.dinner_out),
+        format_time(rec.dinner_in),
+        format_time(rec.exit),
+        format_permits(rec.permits),
+        minutes_to_hours(rec.net_worked),
+        minutes_to_hours(rec.overtime),
+        minutes_to_hours(rec.meal_deduction + rec.dinner_deduction),
+        minutes_to_hours(rec.permit_deduction),
+        minutes_to_hours(rec.overtime_double),
+        minutes_to_hours(rec.overtime_triple),
+        rec.sheet,
+    ]
+
+
+def summary_rows(summary: dict) -> Iterator[list]:
+    """Rows of a periods.summarize() result, in SUMMARY_COLUMNS order."""
+    meals = summary["meal_deduction"] + summary["dinner_deduction"]
+    columns = zip(
+        summary["employee_id"].tolist(),
+        summary["employee_name"].tolist(),
+        summary["period_start"].astype(object),
+        summary["period_end"].astype(object),
+        summary["days"].tolist(),
+        summary["net_worked"].tolist(),
+        summary["overtime"].tolist(),
+        summary["overtime_double"].tolist(),
+        summary["overtime_triple"].tolist(),
+        meals.tolist(),
+        summary["permit_deduction"].tolist(),
+    )
+    for employee_id, name, start, end, days, *minutes in columns:
+        yield [
+            employee_id,
+            name,
+            start.strftime("%d/%m/%Y"),
+            end.strftime("%d/%m/%Y"),
+            days,
+        ] + [minutes_to_hours(m) for m in minutes]
+
+
+def anomaly_rows(codes, columns: dict) -> Iterator[list]:
+    """Rows of the ANOMALY_SHEET: a count per issue found, then one row per flagged record.
+
+    ``columns`` holds the employee_id, date, employee_name and sheet of every
+    record, aligned with ``codes``.
+    """
+    yield ["PROBLEMA", "CÓDIGO", "REGISTROS"]
+    for bit, count in summarize(codes).items():
+        yield [ISSUES[bit], bit, count]
+    yield []
+    yield ANOMALY_COLUMNS
+    for i in codes.nonzero()[0].tolist():
+        code = int(codes[i])
+        yield [i + 2, columns["employee_id"][i], columns["date"][i],
+               columns["employee_name"][i], columns["sheet"][i], code, describe(code)]
+
+
+def export_excel(records: Iterable[AttendanceRecord], filepath: FileSource,
+                 summaries: bool = True, anomalies: bool = True) -> None:
+    """Export attendance records to an Excel file.
+
+    Uses openpyxl write-only mode and writes each row straight from its record,
+    so memory use grows only by the few columns kept for the summaries. With
+    ``summaries``, one SUMMARY_SHEETS sheet per period follows the detail.
+    With ``anomalies``, records are validated and, when any shows an issue,
+    the ANOMALY_SHEET lists them last.
+    """
+    from openpyxl import Workbook
+
+    with metrics.span("export") as sp:
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title="Sheet1")
+        ws.append(EXPORT_COLUMNS)
+        keys = ("employee_id", "employee_name", "date")
+        if summaries:
+            keys += SUMMARY_FIELDS
+        if anomalies:
+            keys += ("sheet", "invalid_cells")
+        collected = {key: [] for key in keys}
+        punches = {name: [] for name in PUNCH_FIELDS} if anomalies else {}
+        permit_counts = []
+        count = 0
+        for count, rec in enumerate(records, 1):
+            ws.append(export_row(rec))
+            for key in keys:
+                collected[key].append(getattr(rec, key))
+            if anomalies:
+                for name, column in punches.items():
+                    column.append(to_seconds(getattr(rec, name)))
+                permit_counts.append(len(rec.permits))
+        if summaries:
+            dates = parse_date_column(collected["date"])
+            for period, title in SUMMARY_SHEETS.items():
+                summary = summarize_columns(collected["employee_id"], collected["employee_name"],
+                                            dates, collected, period)
+                sheet = wb.create_sheet(title=title)
+                sheet.append(SUMMARY_COLUMNS)
+                for row in summary_rows(summary):
+                    sheet.append(row)
+        if anomalies:
+            columns = {name: np.array(values, dtype=np.int64) for name, values in punches.items()}
+            codes = issue_codes(columns, np.array(permit_counts, dtype=np.int64),
+                                np.array(collected["invalid_cells"], dtype=np.uint8))
+            if codes.any():
+                sheet = wb.create_sheet(title=ANOMALY_SHEET)
+                for row in anomaly_rows(codes, collected):
+                    sheet.append(row)
+        wb.save(filepath)
+        sp.add_rows(count)
+
+
+@contextmanager
+def _text_file(filepath: FileSource, mode: str, encoding: str):
+    """Open a path, or wrap a binary buffer without closing it, as a CSV text stream."""
+    if isinstance(filepath, (str, os.PathLike)):
+        with open(filepath, mode, newline="", encoding=encoding) as f:
+            yield f
+        return
+    f = io.TextIOWrapper(filepath, encoding=encoding, newline="")
+    try:
+        yield f
+    finally:
+        f.detach()  # flushes, and leaves the caller's buffer open
+
+
+def _csv_rows(filepath: FileSource) -> Iterator[list]:
+    with _text_file(filepath, "r", "utf-8-sig") as f:
+        yield from csv.reader(f)
+
+
+def iter_csv(filepath: FileSource) -> Iterator[AttendanceRecord]:
+    """Stream attendance records from a CSV file with the same headers as the Excel input."""
+    yield from _iter_rows_records(_csv_rows(filepath))
+
+
+def export_csv(records: Iterable[AttendanceRecord], filepath: FileSource) -> None:
+    """Export attendance records to a CSV file with the export_excel columns."""
+    with metrics.span("export") as sp, _text_file(filepath, "w", "utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        count = 0
+        for count, rec in enumerate(records, 1):
+            writer.writerow(export_row(rec))
+        sp.add_rows(count)
+
+
+def _import_pyarrow():
+    """Import pyarrow lazily; Parquet support is optional."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet support requires pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def _parquet_rows(filepath: FileSource) -> Iterator[tuple]:
+    """Rows of a Parquet file, header first, one row group batch at a time."""
+    pa = _import_pyarrow()
+    parquet = pa.parquet.ParquetFile(filepath)
+    yield tuple(parquet.schema_arrow.names)
+    for batch in parquet.iter_batches(batch_size=CHUNK_ROWS):
+        yield from zip(*(column.to_pylist() for column in batch.columns))
+
+
+def iter_parquet(filepath: FileSource) -> Iterator[AttendanceRecord]:
+    """Stream attendance records from a Parquet file."""
+    yield from _iter_rows_records(_parquet_rows(filepath))
+
+
+# Output columns holding hours; every other Parquet column is a string
+_HOUR_COLUMNS = [name for name in EXPORT_COLUMNS if name not in COLUMN_MAP]
+
+
+def export_parquet(records: Iterable[AttendanceRecord], filepath: FileSource) -> None:
+    """Export attendance records to Parquet with the export_excel columns, CHUNK_ROWS at a time."""
+    pa = _import_pyarrow()
+    schema = pa.schema(
+        [(name, pa.float64() if name in _HOUR_COLUMNS else pa.string()) for name in EXPORT_COLUMNS]
+    )
+    rows = (export_row(rec) for rec in records)
+    with metrics.span("export") as sp, pa.parquet.ParquetWriter(filepath, schema) as writer:
+        while True:
+            chunk = list(islice(rows, CHUNK_ROWS))
+            sp.add_rows(len(chunk))
+            columns = list(zip(*chunk)) if chunk else [()] * len(EXPORT_COLUMNS)
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            if len(chunk) < CHUNK_ROWS:
+                break
+
+
+def file_format(filepath: FileSource, fmt: Optional[str] = None) -> str:
+    """Lower-case extension of a path, validated against SUPPORTED_EXTENSIONS.
+
+    ``fmt`` (e.g. "csv" or ".csv") overrides the extension; it is required
+    when ``filepath`` is an in-memory buffer.
+    """
+    if fmt is not None:
+        ext = "." + fmt.lower().lstrip(".")
+    elif isinstance(filepath, (str, os.PathLike)):
+        ext = os.path.splitext(filepath)[1].lower()
+    else:
+        raise ValueError("The file format must be given for in-memory buffers")
+    if ext not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"Unsupported file format: {ext or filepath}")
+    return ext
+
+
+def iter_rows(filepath: FileSource, fmt: Optional[str] = None) -> Iterator[tuple]:
+    """Stream the rows of an .xlsx, .csv or .parquet file or buffer, header first.
+
+    The format comes from the extension or ``fmt``. Buffers are read from
+    their current position; bytes and memoryviews are wrapped without
+    touching disk. Excel files yield every attendance sheet under one
+    header (see _excel_rows).
+    """
+    ext = file_format(filepath, fmt)
+    if isinstance(filepath, (bytes, bytearray, memoryview)):
+        filepath = io.BytesIO(filepath)
+    if ext == ".csv":
+        return _csv_rows(filepath)
+    if ext == ".parquet":
+        return _parquet_rows(filepath)
+    return _excel_rows(filepath)
+
+
+def iter_file(filepath: FileSource, fmt: Optional[str] = None) -> Iterator[AttendanceRecord]:
+    """Stream records from any supported file or buffer (see iter_rows).
+
+    Raw punch logs are grouped into one record per employee and day. Excel
+    files are read from every attendance sheet (see iter_excel).
+    """
+    if file_format(filepath, fmt) == ".xlsx":
+        if isinstance(filepath, (bytes, bytearray, memoryview)):
+            filepath = io.BytesIO(filepath)
+        return iter_excel(filepath)
+    return _iter_rows_records(iter_rows(filepath, fmt))
+
+
+def load_records(filepath: FileSource, fmt: Optional[str] = None,
+                 workers: Optional[int] = None) -> List[AttendanceRecord]:
+    """Load attendance records from any supported file format.
+
+    Excel files are loaded from every attendance sheet, on up to ``workers``
+    processes (see load_workbook_batch).
+    """
+    if file_format(filepath, fmt) == ".xlsx":
+        return load_excel(filepath, workers)
+    with metrics.span("load") as sp:
+        records = list(iter_file(filepath, fmt))
+        sp.add_rows(len(records))
+    return records
+
+
+def load_batch(filepath: FileSource, fmt: Optional[str] = None,
+               workers: Optional[int] = None) -> RecordBatch:
+    """Load any supported file straight into a compact, array-backed RecordBatch.
+
+    Punch logs are grouped into the batch columns directly, without building
+    a record object per day. Excel files are loaded from every attendance
+    sheet, on up to ``workers`` processes (see load_workbook_batch).
+    """
+    with metrics.span("load") as sp:
+        if file_format(filepath, fmt) == ".xlsx":
+            batch = load_workbook_batch(filepath, workers)
+        else:
+            batch = _table_batch(iter_rows(filepath, fmt))
+        sp.add_rows(len(batch))
+    return batch
+
+
+def export_records(records: Iterable[AttendanceRecord], filepath: FileSource,
+                   fmt: Optional[str] = None) -> None:
+    """Export attendance records in the format given by the file extension or ``fmt``.
+
+    ``filepath`` may also be a writable binary buffer such as io.BytesIO.
+    """
+    ext = file_format(filepath, fmt)
+    if ext == ".csv":
+        export_csv(records, filepath)
+    elif ext == ".parquet":
+        export_parquet(records, filepath)
+    else:
+        export_excel(records, filepath)
@@ -1,11 +1,89 @@
 """Entry point for the attendance calculator CLI."""
 
-from cli import run_cli
+import argparse
+import os
+import sys
 
 
-def main():
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Calculadora de Asistencias - URSOMEX")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Mide el tiempo de cada etapa (también URSOMEX_METRICS=1)")
+    parser.add_argument("--metrics-memory", action="store_true",
+                        help="Además mide la memoria pico de cada etapa (tracemalloc)")
+    parser.add_argument("--metrics-file", help="Guarda las métricas en este archivo JSON al salir")
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch = subparsers.add_parser("batch", help="Procesa varios archivos sin interacción")
+    batch.add_argument("inputs", nargs="+",
+                       help="Directorios, archivos o patrones glob (.xlsx, .csv o .parquet)")
+    batch.add_argument("-c", "--config", help="Archivo JSON con los parámetros de configuración")
+    batch.add_argument("-o", "--output-dir", default="resultados", help="Directorio de salida")
+    batch.add_argument("-w", "--workers", type=int, default=None,
+                       help="Procesos en paralelo (por defecto, uno por CPU)")
+    batch.add_argument("-f", "--format", choices=["xlsx", "csv", "parquet"], default="xlsx",
+                       help="Formato de los archivos de salida")
+
+    scenarios = subparsers.add_parser("scenarios",
+                                      help="Compara totales con varias configuraciones")
+    scenarios.add_argument("input", help="Archivo de asistencias (.xlsx, .csv o .parquet)")
+    scenarios.add_argument("scenarios",
+                           help="Archivo JSON con nombre de escenario -> parámetros que cambian")
+    scenarios.add_argument("-c", "--config", help="Archivo JSON con la configuración base")
+    scenarios.add_argument("-o", "--output",
+                           help="Guarda la comparación por empleado (.xlsx o .csv)")
+
+    serve = subparsers.add_parser("serve", help="Servicio HTTP local de cálculo")
+    serve.add_argument("--host", default="127.0.0.1", help="Dirección de escucha")
+    serve.add_argument("--port", type=int, default=8080, help="Puerto de escucha")
+    serve.add_argument("-c", "--config", help="Archivo JSON con la configuración por defecto")
+    serve.add_argument("-w", "--workers", type=int, default=None,
+                       help="Procesos de cálculo (por defecto, uno por CPU)")
+    serve.add_argument("--max-pending", type=int, default=64,
+                       help="Solicitudes en espera antes de responder 503")
+    return parser
+
+
+def report_metrics() -> None:
+    """Print the metrics panel of a subcommand run and save it to the metrics file, if any."""
+    import metrics
+    if not metrics.is_enabled():
+        return
+    from cli import console, show_metrics
+    show_metrics()
+    path = metrics.dump_json()
+    if path:
+        console.print(f"Métricas guardadas en {path}")
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    metrics_file = args.metrics_file or os.environ.get("URSOMEX_METRICS_FILE")
+    if args.metrics or args.metrics_memory or metrics_file:
+        import metrics
+        metrics.enable(memory=args.metrics_memory, output_path=args.metrics_file)
+
+    if args.command in ("batch", "scenarios"):
+        try:
+            if args.command == "batch":
+                from batch import run_batch_command
+                return run_batch_command(args.inputs, args.config, args.output_dir,
+                                         args.workers, args.format)
+            from scenarios import run_scenarios_command
+            return run_scenarios_command(args.input, args.scenarios, args.config, args.output)
+        finally:
+            report_metrics()
+
+    if args.command == "serve":
+        from service import run_service_command
+        return run_service_command(args.config, args.host, args.port, args.workers,
+                                   args.max_pending)
+
+    from cli import run_cli
     run_cli()
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""Lightweight per-stage timing and memory instrumentation.
+
+Disabled by default. Enable it with the ``URSOMEX_METRICS`` environment
+variable (``1`` for timings, ``memory`` to also track tracemalloc peaks) or
+by calling ``enable()``. Memory figures are the peak traced allocation
+during a stage above what was already allocated when it started. When
+disabled, ``span()`` returns a shared no-op object, so instrumented code
+pays one function call per span. ``URSOMEX_METRICS_FILE`` names the JSON
+file ``dump_json()`` writes to when no other path is given.
+
+Totals go to the process's Collector, or to the one a thread installs with
+``collecting()``; the web app keeps one per session, so concurrent sessions
+do not see or reset each other's metrics.
+"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+_enabled = False
+_track_memory = False
+_output_path: Optional[str] = None
+# Per-thread stack of open spans, used to carry memory peaks to enclosing spans,
+# and the collector installed by collecting()
+_local = threading.local()
+
+
+class Collector:
+    """Per-stage totals: calls, seconds, rows and the largest memory peak."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict] = {}
+
+    def _entry(self, name: str) -> Dict:
+        return self._stats.setdefault(
+            name, {"calls": 0, "seconds": 0.0, "rows": 0, "peak_memory_bytes": None}
+        )
+
+    def add(self, name: str, seconds: float, rows: int, peak: Optional[int]) -> None:
+        """Record one execution of a stage."""
+        with self._lock:
+            entry = self._entry(name)
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["rows"] += rows
+            if peak is not None:
+                entry["peak_memory_bytes"] = max(entry["peak_memory_bytes"] or 0, peak)
+
+    def reset(self) -> None:
+        """Discard all collected metrics."""
+        with self._lock:
+            self._stats.clear()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Raw per-stage totals, for merge() into another collector."""
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._stats.items()}
+
+    def merge(self, other: Dict[str, Dict]) -> None:
+        """Add per-stage totals from stats() of another collector (peaks keep the maximum)."""
+        with self._lock:
+            for name, values in other.items():
+                entry = self._entry(name)
+                for key in ("calls", "seconds", "rows"):
+                    entry[key] += values[key]
+                if values["peak_memory_bytes"] is not None:
+                    entry["peak_memory_bytes"] = max(entry["peak_memory_bytes"] or 0,
+                                                     values["peak_memory_bytes"])
+
+    def summary(self) -> List[Dict]:
+        """Collected metrics as one dict per stage, in first-seen order, with rows/s."""
+        result = []
+        for name, entry in self.stats().items():
+            entry["stage"] = name
+            entry["rows_per_second"] = (entry["rows"] / entry["seconds"] if entry["seconds"]
+                                        else 0.0)
+            result.append(entry)
+        return result
+
+
+_process_collector = Collector()
+
+
+def collector() -> Collector:
+    """The collector spans of this thread record to."""
+    return getattr(_local, "collector", None) or _process_collector
+
+
+@contextmanager
+def collecting(target: Collector) -> Iterator[Collector]:
+    """Record the spans of this thread into ``target`` while the block runs."""
+    previous = getattr(_local, "collector", None)
+    _local.collector = target
+    try:
+        yield target
+    finally:
+        _local.collector = previous
+
+
+class _NullSpan:
+    """Returned by span() while metrics are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_rows(self, n: int) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """Times one execution of a stage and records it on exit."""
+
+    def __init__(self, name: str, rows: int):
+        self.name = name
+        self.rows = rows
+        self.child_peak = 0
+
+    def add_rows(self, n: int) -> None:
+        self.rows += n
+
+    def __enter__(self):
+        self.collector = collector()
+        self.tracked = _track_memory
+        if self.tracked:
+            stack = getattr(_local, "stack", None)
+            if stack is None:
+                stack = _local.stack = []
+            # reset_peak() would hide the enclosing span's peak, so carry it over
+            self.base, self.outer_peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        peak = None
+        if self.tracked:
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            _local.stack.pop()
+            if _local.stack:
+                parent = _local.stack[-1]
+                parent.child_peak = max(parent.child_peak, peak, self.outer_peak)
+        self.collector.add(self.name, seconds, self.rows,
+                           None if peak is None else peak - self.base)
+        return False
+
+
+def span(name: str, rows: int = 0):
+    """Context manager timing a stage; call ``add_rows`` on it to count processed rows."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, rows)
+
+
+def enable(memory: bool = False, output_path: Optional[str] = None) -> None:
+    """Start collecting metrics.
+
+    ``memory`` also tracks tracemalloc peaks per stage; ``output_path`` is the
+    default destination of dump_json().
+    """
+    global _enabled, _track_memory, _output_path
+    _enabled = True
+    _track_memory = memory
+    if output_path:
+        _output_path = output_path
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable() -> None:
+    """Stop collecting metrics (collected values are kept until reset())."""
+    global _enabled, _track_memory
+    if _track_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _enabled = False
+    _track_memory = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def options() -> Optional[Dict]:
+    """Keyword arguments of enable() that reproduce this process's settings (None when disabled).
+
+    Worker processes use them to collect metrics like their parent.
+    """
+    return {"memory": _track_memory} if _enabled else None
+
+
+def reset() -> None:
+    """Discard the metrics of the current collector."""
+    collector().reset()
+
+
+def stats() -> Dict[str, Dict]:
+    """Raw per-stage totals of the current collector, for merge() in another process."""
+    return collector().stats()
+
+
+def merge(other: Dict[str, Dict]) -> None:
+    """Add per-stage totals from stats() of another process to the current collector."""
+    collector().merge(other)
+
+
+def summary() -> List[Dict]:
+    """Metrics of the current collector as one dict per stage (see Collector.summary)."""
+    return collector().summary()
+
+
+def dump_json(path: Optional[str] = None) -> Optional[str]:
+    """Write summary() as JSON; returns the path used, or None when no destination is set.
+
+    The destination defaults to the ``output_path`` given to enable(), then to
+    URSOMEX_METRICS_FILE.
+    """
+    path = path or _output_path or os.environ.get("URSOMEX_METRICS_FILE")
+    if not path:
+        return None
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "stages": summary()}, f, indent=2)
+    return path
+
+
+_env = os.environ.get("URSOMEX_METRICS", "").strip().lower()
+if _env and _env != "0":
+    enable(memory=_env == "memory")
@@ -1,8 +1,14 @@
 """Data models for attendance records."""
 
+import json
+import struct
+from array import array
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional, List
+from itertools import accumulate, islice
+from typing import Dict, Iterable, Iterator, Optional, List
+
+from utils import MISSING_TIME, from_seconds, to_seconds
 
 
 @dataclass
@@ -19,6 +25,10 @@ class AttendanceRecord:
     dinner_in: Optional[datetime] = None
     exit: Optional[datetime] = None
     permits: List[datetime] = field(default_factory=list)
+    # Workbook sheet the record was read from ("" for CSV and Parquet files)
+    sheet: str = ""
+    # Bit i set when the input cell of CELL_FIELDS[i] had a value that did not parse
+    invalid_cells: int = 0
 
     # Calculated fields
     total_minutes: float = 0.0
@@ -27,3 +37,252 @@ class AttendanceRecord:
     permit_deduction: float = 0.0
     net_worked: float = 0.0
     overtime: float = 0.0
+    overtime_double: float = 0.0
+    overtime_triple: float = 0.0
+
+
+# Column groups shared by CompactRecord and RecordBatch
+TEXT_FIELDS = ("employee_id", "date", "employee_name", "sheet")
+PUNCH_FIELDS = ("entry", "meal_out", "meal_in", "dinner_out", "dinner_in", "exit")
+# Results computed from each record alone, and from the employee's whole week
+DAILY_FIELDS = (
+    "total_minutes", "meal_deduction", "dinner_deduction",
+    "permit_deduction", "net_worked", "overtime",
+)
+WEEKLY_FIELDS = ("overtime_double", "overtime_triple")
+RESULT_FIELDS = DAILY_FIELDS + WEEKLY_FIELDS
+# Input cells tracked by AttendanceRecord.invalid_cells, in bit order
+CELL_FIELDS = PUNCH_FIELDS + ("permits",)
+
+
+# Leading bytes of a serialized RecordBatch (format version 4)
+_BATCH_MAGIC = b"URSB\x04"
+
+
+def _punch_property(name: str) -> property:
+    """Expose an integer-seconds slot as an Optional[datetime] attribute."""
+    slot = "_" + name
+
+    def fget(self) -> Optional[datetime]:
+        return from_seconds(getattr(self, slot))
+
+    def fset(self, value: Optional[datetime]) -> None:
+        setattr(self, slot, to_seconds(value))
+
+    return property(fget, fset)
+
+
+class CompactRecord:
+    """Memory-compact AttendanceRecord.
+
+    Uses ``__slots__`` and stores punches as integer seconds since
+    ``utils.TIME_EPOCH``; accessor properties expose the same datetime
+    attributes as AttendanceRecord, so display/export code works unchanged.
+    ``permits`` returns a new list, so assign it back after modifying it.
+    """
+
+    __slots__ = (TEXT_FIELDS + tuple("_" + f for f in PUNCH_FIELDS) + ("_permits", "invalid_cells")
+                 + RESULT_FIELDS)
+
+    entry = _punch_property("entry")
+    meal_out = _punch_property("meal_out")
+    meal_in = _punch_property("meal_in")
+    dinner_out = _punch_property("dinner_out")
+    dinner_in = _punch_property("dinner_in")
+    exit = _punch_property("exit")
+
+    def __init__(self, employee_id: str = "", date: str = "", employee_name: str = "",
+                 sheet: str = ""):
+        self.employee_id = employee_id
+        self.date = date
+        self.employee_name = employee_name
+        self.sheet = sheet
+        for name in PUNCH_FIELDS:
+            setattr(self, "_" + name, MISSING_TIME)
+        self._permits = ()
+        self.invalid_cells = 0
+        for name in RESULT_FIELDS:
+            setattr(self, name, 0.0)
+
+    @property
+    def permits(self) -> List[datetime]:
+        return [from_seconds(p) for p in self._permits]
+
+    @permits.setter
+    def permits(self, values: List[datetime]) -> None:
+        self._permits = tuple(to_seconds(p) for p in values)
+
+    @classmethod
+    def from_record(cls, record) -> "CompactRecord":
+        """Copy any record-like object into a CompactRecord."""
+        rec = cls(record.employee_id, record.date, record.employee_name, record.sheet)
+        for name in PUNCH_FIELDS:
+            setattr(rec, name, getattr(record, name))
+        rec.permits = record.permits
+        rec.invalid_cells = record.invalid_cells
+        for name in RESULT_FIELDS:
+            setattr(rec, name, getattr(record, name))
+        return rec
+
+    def to_record(self) -> AttendanceRecord:
+        """Expand into a regular AttendanceRecord."""
+        values = {name: getattr(self, name) for name in TEXT_FIELDS + PUNCH_FIELDS + RESULT_FIELDS}
+        return AttendanceRecord(permits=self.permits, invalid_cells=self.invalid_cells, **values)
+
+
+class RecordBatch:
+    """Array-backed collection of records with one typed array per column.
+
+    Punch columns are ``array('q')`` of integer seconds (``MISSING_TIME`` when
+    empty), result columns are ``array('d')`` and permits are flattened into
+    ``permit_values`` with ``permit_offsets`` delimiting each record;
+    ``invalid_cells`` is an ``array('B')`` of unparsed-cell bitmasks. Indexing
+    returns a CompactRecord copy; assign it back with ``batch[i] = rec``.
+    """
+
+    def __init__(self):
+        self.text: Dict[str, List[str]] = {name: [] for name in TEXT_FIELDS}
+        self.punches: Dict[str, array] = {name: array("q") for name in PUNCH_FIELDS}
+        self.permit_values = array("q")
+        self.permit_offsets = array("q", [0])
+        self.invalid_cells = array("B")
+        self.results: Dict[str, array] = {name: array("d") for name in RESULT_FIELDS}
+
+    @classmethod
+    def from_records(cls, records: Iterable) -> "RecordBatch":
+        """Build a batch from any iterable of record-like objects (consumed lazily)."""
+        batch = cls()
+        for rec in records:
+            batch.append(rec)
+        return batch
+
+    def __len__(self) -> int:
+        return len(self.permit_offsets) - 1
+
+    def __iter__(self) -> Iterator[CompactRecord]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def _index(self, i: int) -> int:
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("RecordBatch index out of range")
+        return i
+
+    def append(self, record) -> None:
+        """Append one record-like object."""
+        for name in TEXT_FIELDS:
+            self.text[name].append(getattr(record, name))
+        for name in PUNCH_FIELDS:
+            self.punches[name].append(to_seconds(getattr(record, name)))
+        self.permit_values.extend(to_seconds(p) for p in record.permits)
+        self.permit_offsets.append(len(self.permit_values))
+        self.invalid_cells.append(record.invalid_cells)
+        for name in RESULT_FIELDS:
+            self.results[name].append(getattr(record, name))
+
+    def extend_columns(self, text: Dict[str, List[str]], punches: Dict[str, memoryview],
+                       permit_values: memoryview, permit_counts: Iterable[int]) -> None:
+        """Append records given column-wise, with results and invalid_cells at zero.
+
+        Text columns missing from ``text`` are left empty. ``punches`` and
+        ``permit_values`` are buffers of native int64 values (e.g. NumPy
+        arrays); ``permit_counts`` is the number of permits of each new record.
+        """
+        n = len(text["employee_id"])
+        for name in TEXT_FIELDS:
+            self.text[name].extend(text[name] if name in text else [""] * n)
+        for name in PUNCH_FIELDS:
+            self.punches[name].frombytes(memoryview(punches[name]).cast("B"))
+        self.permit_values.frombytes(memoryview(permit_values).cast("B"))
+        ends = accumulate(permit_counts, initial=self.permit_offsets[-1])
+        self.permit_offsets.extend(islice(ends, 1, None))
+        self.invalid_cells.frombytes(bytes(n))
+        for name in RESULT_FIELDS:
+            self.results[name].frombytes(bytes(8 * n))
+
+    def extend(self, other: "RecordBatch") -> None:
+        """Append every record of another batch, results included."""
+        for name in TEXT_FIELDS:
+            self.text[name].extend(other.text[name])
+        for name in PUNCH_FIELDS:
+            self.punches[name].extend(other.punches[name])
+        base = self.permit_offsets[-1]
+        self.permit_values.extend(other.permit_values)
+        self.permit_offsets.extend(array("q", (base + end for end in other.permit_offsets[1:])))
+        self.invalid_cells.extend(other.invalid_cells)
+        for name in RESULT_FIELDS:
+            self.results[name].extend(other.results[name])
+
+    def __getitem__(self, i: int) -> CompactRecord:
+        i = self._index(i)
+        rec = CompactRecord(*(self.text[name][i] for name in TEXT_FIELDS))
+        for name in PUNCH_FIELDS:
+            setattr(rec, "_" + name, self.punches[name][i])
+        rec._permits = tuple(self.permit_values[self.permit_offsets[i]:self.permit_offsets[i + 1]])
+        rec.invalid_cells = self.invalid_cells[i]
+        for name in RESULT_FIELDS:
+            setattr(rec, name, self.results[name][i])
+        return rec
+
+    def __setitem__(self, i: int, record) -> None:
+        i = self._index(i)
+        for name in TEXT_FIELDS:
+            self.text[name][i] = getattr(record, name)
+        for name in PUNCH_FIELDS:
+            self.punches[name][i] = to_seconds(getattr(record, name))
+        self.invalid_cells[i] = record.invalid_cells
+        for name in RESULT_FIELDS:
+            self.results[name][i] = getattr(record, name)
+
+        start, end = self.permit_offsets[i], self.permit_offsets[i + 1]
+        permits = array("q", (to_seconds(p) for p in record.permits))
+        self.permit_values[start:end] = permits
+        shift = len(permits) - (end - start)
+        if shift:
+            for j in range(i + 1, len(self.permit_offsets)):
+                self.permit_offsets[j] += shift
+
+    def _sections(self) -> List[array]:
+        """Typed arrays in serialization order."""
+        return ([self.punches[name] for name in PUNCH_FIELDS]
+                + [self.permit_values, self.permit_offsets, self.invalid_cells]
+                + [self.results[name] for name in RESULT_FIELDS])
+
+    def to_bytes(self) -> bytes:
+        """Serialize to a binary columnar blob (typed arrays are copied verbatim)."""
+        text = json.dumps([self.text[name] for name in TEXT_FIELDS], ensure_ascii=False).encode("utf-8")
+        parts = [_BATCH_MAGIC, struct.pack("<Q", len(text)), text]
+        for section in self._sections():
+            raw = section.tobytes()
+            parts += [struct.pack("<Q", len(raw)), raw]
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "RecordBatch":
+        """Inverse of to_bytes; raises ValueError on a malformed blob."""
+        if not blob.startswith(_BATCH_MAGIC):
+            raise ValueError("Not a serialized RecordBatch")
+        view = memoryview(blob)
+        pos = len(_BATCH_MAGIC)
+
+        def take() -> memoryview:
+            nonlocal pos
+            if pos + 8 > len(view):
+                raise ValueError("Truncated RecordBatch blob")
+            (size,) = struct.unpack_from("<Q", view, pos)
+            pos += 8 + size
+            if pos > len(view):
+                raise ValueError("Truncated RecordBatch blob")
+            return view[pos - size:pos]
+
+        batch = cls()
+        for name, values in zip(TEXT_FIELDS, json.loads(bytes(take()).decode("utf-8"))):
+            batch.text[name] = values
+        for section in batch._sections():
+            section.frombytes(take())
+        # permit_offsets started as [0]; the serialized copy already includes it
+        del batch.permit_offsets[0]
+        return batch
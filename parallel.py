@@ -0,0 +1,63 @@
+"""Process-pool execution of the columnar engine for large inputs.
+
+Records cross the process boundary as flat int64 buffers
+(``PunchColumns.to_bytes``) and results come back as float64 buffers, so no
+record objects are ever pickled.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import List, Optional, Union
+
+import numpy as np
+
+from columnar import PunchColumns, compute
+from config import Config
+from models import AttendanceRecord, RecordBatch, DAILY_FIELDS
+
+# Minimum number of records before calculate_all(workers=...) starts a process pool;
+# below this the columnar engine finishes faster than the pool starts
+PARALLEL_THRESHOLD = 500_000
+
+# Chunks submitted per worker, so faster workers pick up the slack
+CHUNKS_PER_WORKER = 4
+
+
+def _compute_chunk(payload: bytes, config_data: dict) -> bytes:
+    """Worker entry point: serialized punch columns in, serialized result block out."""
+    results = compute(PunchColumns.from_bytes(payload), Config.from_dict(config_data))
+    return np.stack([results[name] for name in DAILY_FIELDS]).tobytes()
+
+
+def _chunk_bounds(n: int, workers: int, chunk_size: Optional[int]) -> List[tuple]:
+    if chunk_size is None:
+        chunk_size = max(1, -(-n // (workers * CHUNKS_PER_WORKER)))
+    return [(start, min(start + chunk_size, n)) for start in range(0, n, chunk_size)]
+
+
+def calculate_parallel(records: Union[List[AttendanceRecord], RecordBatch], config: Config,
+                       workers: int, chunk_size: Optional[int] = None):
+    """Calculate records across ``workers`` processes; results are written back in order."""
+    if isinstance(records, RecordBatch):
+        cols = PunchColumns.from_batch(records)
+    else:
+        cols = PunchColumns.from_records(records)
+    bounds = _chunk_bounds(len(cols), workers, chunk_size)
+    payloads = (cols.slice(start, stop).to_bytes() for start, stop in bounds)
+
+    # Spawned rather than forked: callers may be multithreaded (Streamlit, the service)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        # map() yields in submission order, whatever order the chunks finish in
+        blocks = pool.map(_compute_chunk, payloads, repeat(config.to_dict()))
+        for (start, stop), block in zip(bounds, blocks):
+            values = np.frombuffer(block, dtype=np.float64).reshape(len(DAILY_FIELDS), stop - start)
+            for name, column in zip(DAILY_FIELDS, values):
+                if isinstance(records, RecordBatch):
+                    np.frombuffer(records.results[name], dtype=np.float64)[start:stop] = column
+                else:
+                    for rec, value in zip(records[start:stop], column.tolist()):
+                        setattr(rec, name, value)
+
+    return records if isinstance(records, RecordBatch) else list(records)
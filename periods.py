@@ -0,0 +1,177 @@
+"""Per-employee weekly and quincena (half-month) totals of calculated records.
+
+Dates are parsed once into a datetime64 column, and every record is mapped
+to the first day of its period. Records are then ordered by (employee,
+period) and each result field is summed per group with one reduceat call.
+
+WeeklyOvertime splits each day's overtime into the hours paid double and
+triple. The order of records by (employee, week, date) is computed once, and
+each split is a single cumulative sum over that order.
+"""
+
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+from models import RecordBatch, WEEKLY_FIELDS
+from utils import parse_date_column
+
+# Supported periods: ISO weeks (Monday to Sunday) and quincenas (1st-15th, 16th-end of month)
+PERIODS = ("week", "quincena")
+
+# Result fields summed per period, in minutes
+SUMMARY_FIELDS = ("net_worked", "overtime", "overtime_double", "overtime_triple",
+                  "meal_deduction", "dinner_deduction", "permit_deduction")
+
+
+def period_start(dates: np.ndarray, period: str) -> np.ndarray:
+    """First day of the period containing each date (NaT stays NaT)."""
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    if period == "week":
+        # 1970-01-01 was a Thursday, so day numbers + 3 count from a Monday
+        days = dates.astype(np.int64)
+        return np.where(np.isnat(dates), dates, dates - ((days + 3) % 7))
+    if period == "quincena":
+        month = dates.astype("datetime64[M]").astype("datetime64[D]")
+        return np.where(dates - month >= 15, month + 15, month)
+    raise ValueError(f"Unknown period: {period}")
+
+
+def period_end(starts: np.ndarray, period: str) -> np.ndarray:
+    """Last day of the periods beginning on ``starts``."""
+    starts = np.asarray(starts, dtype="datetime64[D]")
+    if period == "week":
+        return starts + 6
+    if period == "quincena":
+        month = starts.astype("datetime64[M]")
+        month_end = (month + 1).astype("datetime64[D]") - 1
+        return np.where(starts == month.astype("datetime64[D]"), starts + 14, month_end)
+    raise ValueError(f"Unknown period: {period}")
+
+
+def summarize_columns(employee_ids: Sequence[str], employee_names: Sequence[str],
+                      dates: np.ndarray, values: Dict[str, np.ndarray],
+                      period: str = "week") -> Dict[str, np.ndarray]:
+    """Totals per employee and period from column arrays.
+
+    ``values`` maps each SUMMARY_FIELDS name to a float array aligned with the
+    other columns. Records whose date is NaT are left out. Groups come sorted
+    by employee ID, then period; the result has ``employee_id``,
+    ``employee_name``, ``period_start``, ``period_end``, ``days`` (records
+    per group) and one summed array per field.
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    rows = np.flatnonzero(~np.isnat(dates))
+    ids, id_codes = np.unique(np.asarray(employee_ids, dtype=str)[rows], return_inverse=True)
+    starts = period_start(dates[rows], period)
+
+    order = np.lexsort((starts, id_codes))
+    codes, starts, rows = id_codes[order], starts[order], rows[order]
+    changed = np.ones(len(order), dtype=bool)
+    changed[1:] = (codes[1:] != codes[:-1]) | (starts[1:] != starts[:-1])
+    bounds = np.flatnonzero(changed)
+
+    summary = {
+        "employee_id": ids[codes[bounds]],
+        "employee_name": np.asarray(employee_names, dtype=object)[rows[bounds]],
+        "period_start": starts[bounds],
+        "period_end": period_end(starts[bounds], period),
+        "days": np.diff(np.append(bounds, len(order))),
+    }
+    for name in SUMMARY_FIELDS:
+        column = np.asarray(values[name], dtype=np.float64)[rows]
+        summary[name] = np.add.reduceat(column, bounds) if len(bounds) else np.zeros(0)
+    return summary
+
+
+def summarize(records, period: str = "week") -> Dict[str, np.ndarray]:
+    """summarize_columns over calculated records (a RecordBatch or a list of records)."""
+    if isinstance(records, RecordBatch):
+        text = records.text
+        values = {name: np.frombuffer(records.results[name], dtype=np.float64)
+                  for name in SUMMARY_FIELDS}
+        return summarize_columns(text["employee_id"], text["employee_name"],
+                                 parse_date_column(text["date"]), values, period)
+    values = {name: np.fromiter((getattr(r, name) for r in records), dtype=np.float64,
+                                count=len(records))
+              for name in SUMMARY_FIELDS}
+    return summarize_columns([r.employee_id for r in records], [r.employee_name for r in records],
+                             parse_date_column([r.date for r in records]), values, period)
+
+
+class WeeklyOvertime:
+    """Records ordered by employee, ISO week and date, for splitting overtime into pay tiers.
+
+    The order does not depend on the configuration, so it is built once per
+    set of records. Within each (employee, week) group, the overtime of the
+    earlier days decides how much of a day's overtime still fits under the
+    weekly double-pay limit. Records whose date does not parse each stand alone.
+    """
+
+    def __init__(self, employee_ids: Sequence[str], dates: np.ndarray):
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        _, codes = np.unique(np.asarray(employee_ids, dtype=str), return_inverse=True)
+        weeks = period_start(dates, "week")
+        undated = np.isnat(dates)
+        # lexsort is stable, so records of the same day keep their input order
+        self.order = np.lexsort((dates.view(np.int64), weeks.view(np.int64), codes))
+        codes, weeks = codes[self.order], weeks[self.order]
+        changed = undated[self.order].copy()
+        if len(changed):
+            changed[0] = True
+        changed[1:] |= (codes[1:] != codes[:-1]) | (weeks[1:] != weeks[:-1])
+        self.group_starts = np.flatnonzero(changed)
+        self.group_of = np.cumsum(changed) - 1
+
+    @classmethod
+    def from_records(cls, records) -> "WeeklyOvertime":
+        """Order a RecordBatch or any sequence of records."""
+        if isinstance(records, RecordBatch):
+            employee_ids, dates = records.text["employee_id"], records.text["date"]
+        else:
+            employee_ids = [r.employee_id for r in records]
+            dates = [r.date for r in records]
+        return cls(employee_ids, parse_date_column(dates))
+
+    def tiers(self, overtime: np.ndarray, limit: float) -> Tuple[np.ndarray, np.ndarray]:
+        """(double, triple) minutes per record for daily ``overtime`` minutes.
+
+        The first ``limit`` minutes of each employee's weekly overtime are
+        double, the rest triple. Running totals are kept in whole seconds, so
+        long cumulative sums stay exact.
+        """
+        overtime = np.asarray(overtime, dtype=np.float64)
+        minutes = overtime[self.order]
+        seconds = np.rint(minutes * 60).astype(np.int64)
+        before = np.cumsum(seconds) - seconds
+        before -= before[self.group_starts][self.group_of]
+        room = np.maximum(round(limit * 60) - before, 0) / 60.0
+
+        double = np.empty_like(overtime)
+        double[self.order] = np.minimum(minutes, room)
+        return double, overtime - double
+
+
+def apply_overtime_tiers(records, config: Config, weeks: Optional[WeeklyOvertime] = None):
+    """Fill the WEEKLY_FIELDS of calculated records (a RecordBatch or a list) in place.
+
+    Pass ``weeks`` built once with WeeklyOvertime.from_records to skip
+    ordering the same records again.
+    """
+    if not len(records):
+        return records
+    if weeks is None:
+        weeks = WeeklyOvertime.from_records(records)
+    if isinstance(records, RecordBatch):
+        overtime = np.frombuffer(records.results["overtime"], dtype=np.float64)
+        tiers = weeks.tiers(overtime, config.weekly_double_overtime)
+        for name, values in zip(WEEKLY_FIELDS, tiers):
+            np.frombuffer(records.results[name], dtype=np.float64)[:] = values
+        return records
+    overtime = np.fromiter((r.overtime for r in records), dtype=np.float64, count=len(records))
+    tiers = weeks.tiers(overtime, config.weekly_double_overtime)
+    for name, values in zip(WEEKLY_FIELDS, tiers):
+        for rec, value in zip(records, values.tolist()):
+            setattr(rec, name, value)
+    return records
@@ -0,0 +1,337 @@
+"""Daily attendance records from raw clock-punch logs.
+
+Biometric terminals export one row per punch (employee, timestamp, device).
+Punches are read in chunks with their timestamps parsed column-wise, and
+sorted by (employee, timestamp) in runs of up to ``run_size`` punches. Runs
+that do not fit in memory are spilled to temporary files and merged back a
+block at a time. The sorted stream is then cut into blocks at (employee, day)
+boundaries, and each block is grouped with array operations straight into
+RecordBatch columns.
+
+Within a day the first punch is the entry and the last one the exit. The
+punches in between fill meal_out, meal_in, dinner_out and dinner_in in order,
+and any further ones become permits.
+"""
+
+import os
+import pickle
+import tempfile
+from datetime import datetime
+from itertools import islice
+from operator import itemgetter
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models import CompactRecord, PUNCH_FIELDS, RecordBatch
+from utils import MISSING_TIME, parse_date_column, parse_time_column, to_seconds
+
+# Column name mappings of punch logs (Spanish -> field); a timestamp can also
+# come split into the FECHA and HORA columns
+PUNCH_COLUMN_MAP = {
+    "ID": "employee_id",
+    "EMPLEADO": "employee_name",
+    "FECHA Y HORA": "timestamp",
+    "CHECADA": "timestamp",
+    "FECHA": "date",
+    "HORA": "time",
+    "DISPOSITIVO": "device",
+}
+
+# Accepted text formats for punch timestamps, tried in order after ISO
+TIMESTAMP_FORMATS = (
+    "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M",
+    "%d-%m-%Y %H:%M:%S", "%d-%m-%Y %H:%M", "%d/%m/%y %H:%M",
+)
+
+# Slots filled, in order, by the punches between a day's entry and exit
+MIDDLE_SLOTS = ("meal_out", "meal_in", "dinner_out", "dinner_in")
+
+# Rows parsed per chunk; small chunks keep few rows alive for the garbage collector
+PUNCH_CHUNK_ROWS = 2048
+# Punches per pickled slice of a spilled run
+SPILL_BLOCK_ROWS = 65536
+# Punches sorted in memory before a run is spilled to disk
+DEFAULT_RUN_SIZE = 2_000_000
+# Punches closer than this to the previous one (double taps) are dropped, in seconds
+DUPLICATE_SECONDS = 60
+
+# Punches as parallel arrays: employee IDs (str), seconds since 1970-01-01, names (object)
+PunchBlock = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _header_names(header: Iterable) -> List[str]:
+    return [str(cell).strip().upper() if cell is not None else "" for cell in header]
+
+
+def is_punch_log(header: Iterable) -> bool:
+    """True when a header row is a punch log rather than pivoted daily records."""
+    names = set(_header_names(header))
+    if "ENTRADA" in names or "ID" not in names:
+        return False
+    return bool(names & {"FECHA Y HORA", "CHECADA"}) or {"FECHA", "HORA"} <= names
+
+
+def _resolve_columns(header: Iterable) -> dict:
+    """Map punch fields to positions in a header row (the first matching column wins)."""
+    columns = {}
+    for i, name in enumerate(_header_names(header)):
+        field = PUNCH_COLUMN_MAP.get(name)
+        if field is not None:
+            columns.setdefault(field, i)
+    return columns
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    s = str(value).strip() if value is not None else ""
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(s, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+# Cell types NumPy converts to datetime64 directly
+_NUMPY_TIMESTAMP_TYPES = {str, datetime, type(None)}
+
+
+def parse_timestamp_column(values: Sequence) -> np.ndarray:
+    """Timestamps as int64 seconds since 1970-01-01 (MISSING_TIME when unparseable).
+
+    ISO text ("2024-01-15 08:03:21"), datetimes and blanks are converted by
+    NumPy in one call; otherwise values fall back to TIMESTAMP_FORMATS one by one.
+    """
+    if set(map(type, values)) <= _NUMPY_TIMESTAMP_TYPES:
+        try:
+            # None becomes NaT, whose int64 value is MISSING_TIME
+            return np.array(values, dtype="datetime64[s]").astype(np.int64)
+        except ValueError:
+            pass
+    stamps = np.full(len(values), MISSING_TIME, dtype=np.int64)
+    for i, value in enumerate(values):
+        dt = _parse_timestamp(value)
+        if dt is not None:
+            stamps[i] = np.datetime64(dt, "s").astype(np.int64)
+    return stamps
+
+
+def _text_column(values: Sequence) -> np.ndarray:
+    """Stripped str array of a column; blanks become ""."""
+    if None in values:
+        values = ["" if v is None else v for v in values]
+    return np.char.strip(np.array(values, dtype=str))
+
+
+def _parse_chunk(chunk: List[tuple], columns: dict) -> PunchBlock:
+    """Punches of a chunk of rows; rows without an ID or a valid timestamp are skipped.
+
+    Names are kept as read and only cleaned up for the records built from them.
+    """
+    def column(field):
+        pos = columns.get(field)
+        if pos is None:
+            return [None] * len(chunk)
+        try:
+            return list(map(itemgetter(pos), chunk))
+        except IndexError:  # some rows are shorter than the header
+            return [row[pos] if pos < len(row) else None for row in chunk]
+
+    if "timestamp" in columns:
+        stamps = parse_timestamp_column(column("timestamp"))
+    else:
+        days = parse_date_column(column("date"))
+        times = parse_time_column(column("time"))
+        seconds = np.array([to_seconds(t) for t in times], dtype=np.int64)
+        valid = ~np.isnat(days) & (seconds >= 0) & (seconds < 86400)
+        midnight = days.astype("datetime64[s]").astype(np.int64)
+        stamps = np.where(valid, midnight + seconds, MISSING_TIME)
+    ids = _text_column(column("employee_id"))
+    names = np.array(column("employee_name"), dtype=object)
+    keep = (ids != "") & (stamps != MISSING_TIME)
+    return ids[keep], stamps[keep], names[keep]
+
+
+def _concat(blocks: List[PunchBlock]) -> PunchBlock:
+    return tuple(np.concatenate(parts) for parts in zip(*blocks))
+
+
+def _sort_block(block: PunchBlock) -> PunchBlock:
+    """Order a block by (employee ID, timestamp); ties keep their input order."""
+    ids, stamps, names = block
+    order = np.lexsort((stamps, ids))
+    return ids[order], stamps[order], names[order]
+
+
+def _spill(block: PunchBlock, directory: str) -> str:
+    """Write a sorted run to a temporary file as pickled slices of SPILL_BLOCK_ROWS."""
+    fd, path = tempfile.mkstemp(suffix=".run", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        for start in range(0, len(block[0]), SPILL_BLOCK_ROWS):
+            piece = tuple(a[start:start + SPILL_BLOCK_ROWS] for a in block)
+            pickle.dump(piece, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _read_run(path: str) -> Iterator[PunchBlock]:
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def _merge_runs(paths: List[str]) -> Iterator[PunchBlock]:
+    """Merge spilled runs into blocks ordered by (employee ID, timestamp).
+
+    Every round takes, from each run's buffered slice, the punches up to the
+    smallest last key among the buffers: no unread punch can sort before them,
+    so they are sorted together and yielded. The run with that key empties its
+    buffer and reads the next slice, so every round makes progress.
+    """
+    readers = [_read_run(path) for path in paths]
+    buffers = [next(reader) for reader in readers]
+    while readers:
+        bound_id, bound_stamp = min((ids[-1], stamps[-1]) for ids, stamps, _ in buffers)
+        taken = []
+        for i, (ids, stamps, names) in enumerate(buffers):
+            n = np.count_nonzero((ids < bound_id) | ((ids == bound_id) & (stamps <= bound_stamp)))
+            taken.append((ids[:n], stamps[:n], names[:n]))
+            buffers[i] = (ids[n:], stamps[n:], names[n:])
+        # Ties keep the run order, which is the input order
+        yield _sort_block(_concat(taken))
+        for i in reversed(range(len(readers))):
+            if not len(buffers[i][0]):
+                piece = next(readers[i], None)
+                if piece is None:
+                    del readers[i], buffers[i]
+                else:
+                    buffers[i] = piece
+
+
+def sorted_punches(header: Iterable, rows: Iterable[tuple],
+                   run_size: int = DEFAULT_RUN_SIZE) -> Iterator[PunchBlock]:
+    """Stream the punches of a log as blocks ordered by (employee ID, timestamp).
+
+    Runs of ``run_size`` punches are sorted in memory. When the log has more
+    than one run, each is spilled to a temporary file and the files are
+    merged; they are removed once the stream is exhausted or closed.
+    """
+    columns = _resolve_columns(header)
+    if "employee_id" not in columns or not ("timestamp" in columns or "time" in columns):
+        raise ValueError("A punch log needs an ID column and a timestamp column")
+    rows = iter(rows)
+
+    with tempfile.TemporaryDirectory(prefix="ursomex-punches-") as directory:
+        runs: List[str] = []
+        run: List[PunchBlock] = []
+        size = 0
+        while True:
+            chunk = list(islice(rows, PUNCH_CHUNK_ROWS))
+            if chunk:
+                block = _parse_chunk(chunk, columns)
+                run.append(block)
+                size += len(block[0])
+            if size and (size >= run_size or not chunk):
+                sorted_run = _sort_block(_concat(run))
+                if not chunk and not runs:
+                    yield sorted_run
+                    return
+                runs.append(_spill(sorted_run, directory))
+                run, size = [], 0
+            if not chunk:
+                break
+        yield from _merge_runs(runs)
+
+
+def _day_strings(days: np.ndarray) -> List[str]:
+    """dd/mm/yyyy for day numbers, formatting each distinct day once."""
+    distinct, codes = np.unique(days, return_inverse=True)
+    labels = [d.strftime("%d/%m/%Y") for d in distinct.astype("datetime64[D]").tolist()]
+    return [labels[c] for c in codes.tolist()]
+
+
+def _append_days(batch: RecordBatch, block: PunchBlock, days: np.ndarray) -> None:
+    """Append one record per (employee, day) group of a sorted block to ``batch``."""
+    ids, stamps, names = block
+    new = np.ones(len(ids), dtype=bool)
+    new[1:] = (ids[1:] != ids[:-1]) | (days[1:] != days[:-1])
+    keep = new.copy()
+    keep[1:] |= np.diff(stamps) >= DUPLICATE_SECONDS
+    ids, stamps, names, days, new = ids[keep], stamps[keep], names[keep], days[keep], new[keep]
+
+    starts = np.flatnonzero(new)
+    group = np.cumsum(new) - 1
+    rank = np.arange(len(ids)) - starts[group]
+    last = np.append(starts[1:], len(ids))[group] - 1 - starts[group]
+    # Times are relative to the day's midnight, so a punch after midnight of an
+    # overnight shift stays after the entry
+    seconds = stamps - days * 86400
+
+    columns = {name: np.full(len(starts), MISSING_TIME, dtype=np.int64) for name in PUNCH_FIELDS}
+    columns["entry"][:] = seconds[starts]
+    is_exit = (rank == last) & (rank > 0)
+    columns["exit"][group[is_exit]] = seconds[is_exit]
+    for k, slot in enumerate(MIDDLE_SLOTS, 1):
+        mask = (rank == k) & (rank < last)
+        columns[slot][group[mask]] = seconds[mask]
+    is_permit = (rank > len(MIDDLE_SLOTS)) & (rank < last)
+
+    batch.extend_columns(
+        {"employee_id": ids[starts].tolist(), "date": _day_strings(days[starts]),
+         "employee_name": ["" if n is None else str(n).strip() for n in names[starts].tolist()]},
+        columns,
+        seconds[is_permit],
+        np.bincount(group[is_permit], minlength=len(starts)).tolist(),
+    )
+
+
+def punch_batches(header: Iterable, rows: Iterable[tuple], day_start: int = 0,
+                  run_size: int = DEFAULT_RUN_SIZE) -> Iterator[RecordBatch]:
+    """RecordBatches with one record per employee and day of a punch log.
+
+    Records come ordered by employee ID, then date; the employee name is the
+    one on the day's first punch. ``day_start`` (minutes after midnight) is
+    when a workday begins, so earlier punches count toward the previous day.
+    Punches less than DUPLICATE_SECONDS after the previous one are dropped.
+    """
+    carry: Optional[PunchBlock] = None
+    for block in sorted_punches(header, rows, run_size):
+        if carry is not None:
+            block = _concat([carry, block])
+        days = (block[1] - day_start * 60) // 86400
+        ids = block[0]
+        # The last (employee, day) group may continue in the next block
+        tail = len(ids) - 1
+        while tail > 0 and ids[tail - 1] == ids[-1] and days[tail - 1] == days[-1]:
+            tail -= 1
+        carry = tuple(a[tail:] for a in block)
+        if tail:
+            batch = RecordBatch()
+            _append_days(batch, tuple(a[:tail] for a in block), days[:tail])
+            yield batch
+    if carry is not None and len(carry[0]):
+        batch = RecordBatch()
+        _append_days(batch, carry, (carry[1] - day_start * 60) // 86400)
+        yield batch
+
+
+def load_punch_batch(header: Iterable, rows: Iterable[tuple], day_start: int = 0,
+                     run_size: int = DEFAULT_RUN_SIZE) -> RecordBatch:
+    """One RecordBatch with every daily record of a punch log (see punch_batches)."""
+    result = RecordBatch()
+    for batch in punch_batches(header, rows, day_start, run_size):
+        offsets = batch.permit_offsets
+        result.extend_columns(batch.text, batch.punches, batch.permit_values,
+                              (b - a for a, b in zip(offsets, offsets[1:])))
+    return result
+
+
+def iter_punch_records(header: Iterable, rows: Iterable[tuple], day_start: int = 0,
+                       run_size: int = DEFAULT_RUN_SIZE) -> Iterator[CompactRecord]:
+    """Yield one record per employee and day of a punch log (see punch_batches)."""
+    for batch in punch_batches(header, rows, day_start, run_size):
+        yield from batch
@@ -0,0 +1,130 @@
+"""Index of record positions by employee ID and date.
+
+Each employee ID maps, through a dict, to its record positions sorted by
+date together with the matching sorted day numbers. A lookup is a dict hit
+plus a binary search, and a date range is a slice. A second pair of arrays
+orders every record by date for range queries across all employees.
+"""
+
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from models import RecordBatch
+from utils import parse_date, parse_date_column
+
+# Day number stored for records whose date does not parse (NaT); sorts first
+UNDATED = np.iinfo(np.int64).min
+
+
+def _day(value: Union[date, str]) -> int:
+    """Day number of a date, or of a FECHA string (UNDATED when it does not parse)."""
+    if not isinstance(value, date):
+        value = parse_date(value)
+    if value is None:
+        return UNDATED
+    return int(np.datetime64(value, "D").astype(np.int64))
+
+
+class RecordIndex:
+    """Positions of records by employee ID and date, kept current through update()."""
+
+    def __init__(self, employee_ids: Sequence[str], dates: np.ndarray):
+        days = np.asarray(dates, dtype="datetime64[D]").view(np.int64)
+        self._keys: List[Tuple[str, int]] = list(zip(employee_ids, days.tolist()))
+
+        distinct: Dict[str, int] = {}
+        codes = np.fromiter((distinct.setdefault(e, len(distinct)) for e in employee_ids),
+                            dtype=np.int64, count=len(employee_ids))
+        order = np.lexsort((days, codes))
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        self._groups: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for group in np.split(order, bounds) if len(order) else []:
+            employee_id = employee_ids[int(group[0])]
+            self._groups[employee_id] = (days[group], group)
+
+        self._by_date = np.argsort(days, kind="stable")
+        self._sorted_days = days[self._by_date]
+
+    @classmethod
+    def from_records(cls, records) -> "RecordIndex":
+        """Index a RecordBatch or any sequence of records."""
+        if isinstance(records, RecordBatch):
+            employee_ids, dates = records.text["employee_id"], records.text["date"]
+        else:
+            employee_ids = [r.employee_id for r in records]
+            dates = [r.date for r in records]
+        return cls(list(employee_ids), parse_date_column(dates))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def employee_ids(self) -> List[str]:
+        """Every indexed employee ID, sorted."""
+        return sorted(self._groups)
+
+    def date_range(self) -> Optional[Tuple[date, date]]:
+        """(first, last) parsed date, or None when no record has one."""
+        start = np.searchsorted(self._sorted_days, UNDATED, side="right")
+        if start == len(self._sorted_days):
+            return None
+        first, last = self._sorted_days[start], self._sorted_days[-1]
+        return (np.datetime64(int(first), "D").astype(date),
+                np.datetime64(int(last), "D").astype(date))
+
+    def find(self, employee_id: str, day: Union[date, str]) -> np.ndarray:
+        """Positions of an employee's records on one day, in input order."""
+        return self.range(employee_id, day, day)
+
+    def range(self, employee_id: Optional[str] = None, start: Union[date, str, None] = None,
+              end: Union[date, str, None] = None) -> np.ndarray:
+        """Positions of the records in an inclusive date range, ordered by date.
+
+        With ``employee_id`` only that employee is searched. Without bounds every
+        record of the employee is returned, undated ones first; once a bound is
+        given, records whose date does not parse are left out.
+        """
+        if employee_id is None:
+            days, positions = self._sorted_days, self._by_date
+        elif employee_id in self._groups:
+            days, positions = self._groups[employee_id]
+        else:
+            return np.zeros(0, dtype=np.int64)
+        if start is None and end is None:
+            return positions.copy()
+        lo = UNDATED + 1 if start is None else _day(start)
+        hi = None if end is None else _day(end)
+        if lo == UNDATED or hi == UNDATED:
+            return np.zeros(0, dtype=np.int64)
+        first = np.searchsorted(days, lo, side="left")
+        last = len(days) if hi is None else np.searchsorted(days, hi, side="right")
+        return positions[first:last].copy()
+
+    def update(self, position: int, employee_id: str, day: Union[date, str]) -> None:
+        """Re-key the record at ``position`` after its employee ID or date was edited."""
+        new_key = (employee_id, _day(day))
+        old_key = self._keys[position]
+        if new_key == old_key:
+            return
+        self._keys[position] = new_key
+
+        days, positions = self._groups[old_key[0]]
+        keep = positions != position
+        if keep.any():
+            self._groups[old_key[0]] = (days[keep], positions[keep])
+        else:
+            del self._groups[old_key[0]]
+        days, positions = self._groups.get(new_key[0], (np.zeros(0, np.int64), np.zeros(0, np.int64)))
+        self._groups[new_key[0]] = self._insert(days, positions, new_key[1], position)
+
+        keep = self._by_date != position
+        self._sorted_days, self._by_date = self._insert(
+            self._sorted_days[keep], self._by_date[keep], new_key[1], position)
+
+    @staticmethod
+    def _insert(days: np.ndarray, positions: np.ndarray, day: int, position: int):
+        """Insert (day, position) keeping days sorted and equal days in position order."""
+        at = np.searchsorted(days, day, side="left")
+        at += np.searchsorted(positions[at:np.searchsorted(days, day, side="right")], position)
+        return np.insert(days, at, day), np.insert(positions, at, position)
@@ -0,0 +1,156 @@
+"""What-if evaluation of several Config variants over the same records.
+
+The punch columns, the weekly overtime order and the employee grouping do not
+depend on the configuration, so they are built once. Each scenario then runs
+columnar.compute() incrementally from the baseline results, so only the
+stages its changed parameters affect are recomputed. Per-employee totals are
+one bincount per field.
+"""
+
+import json
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from rich.console import Console
+from rich.table import Table
+
+from columnar import PunchColumns, compute
+from config import Config
+from io_excel import load_batch
+from models import RecordBatch, WEEKLY_FIELDS
+from periods import WeeklyOvertime
+from utils import parse_date_column
+
+# Name of the baseline scenario in results and comparison tables
+BASELINE = "Base"
+
+# Compared columns and the result fields summed into each, in minutes
+COMPARE_COLUMNS = {
+    "TIEMPO LABORADO": ("net_worked",),
+    "HORAS EXTRA": ("overtime",),
+    "HORAS EXTRA DOBLES": ("overtime_double",),
+    "HORAS EXTRA TRIPLES": ("overtime_triple",),
+    "DESCUENTO COMIDAS": ("meal_deduction", "dinner_deduction"),
+    "DESCUENTO PERMISOS": ("permit_deduction",),
+}
+
+# ID of the row holding each scenario's totals over all employees
+TOTAL_ID = "TOTAL"
+
+
+def load_scenarios(path: str, baseline: Config) -> Dict[str, Config]:
+    """Read a JSON object mapping scenario names to Config overrides of ``baseline``."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError("The scenarios file must map names to parameter overrides")
+    return {name: Config.from_dict({**baseline.to_dict(), **overrides})
+            for name, overrides in data.items()}
+
+
+def evaluate_scenarios(records, baseline: Config,
+                       scenarios: Dict[str, Config]) -> Dict[str, Dict[str, np.ndarray]]:
+    """Result arrays of every scenario, baseline first under the BASELINE name.
+
+    ``records`` is a RecordBatch or a list of records; they are not modified.
+    Unaffected stages share their arrays between scenarios, so the returned
+    arrays must be treated as read-only.
+    """
+    if BASELINE in scenarios:
+        raise ValueError(f"'{BASELINE}' is reserved for the baseline scenario")
+    if isinstance(records, RecordBatch):
+        cols = PunchColumns.from_batch(records)
+        employee_ids, dates = records.text["employee_id"], records.text["date"]
+    else:
+        cols = PunchColumns.from_records(records)
+        employee_ids = [r.employee_id for r in records]
+        dates = [r.date for r in records]
+    weeks = WeeklyOvertime(employee_ids, parse_date_column(dates))
+
+    def run(config, previous=None, previous_config=None):
+        results = compute(cols, config, previous, previous_config)
+        tiers = weeks.tiers(results["overtime"], config.weekly_double_overtime)
+        results.update(zip(WEEKLY_FIELDS, tiers))
+        return results
+
+    base = run(baseline)
+    evaluated = {BASELINE: base}
+    for name, config in scenarios.items():
+        evaluated[name] = run(config, base, baseline)
+    return evaluated
+
+
+def compare_scenarios(records, baseline: Config, scenarios: Dict[str, Config],
+                      evaluated: Optional[Dict[str, Dict[str, np.ndarray]]] = None) -> pd.DataFrame:
+    """Per-employee and total hours of every scenario, with deltas against the baseline.
+
+    Rows are indexed by (scenario, employee ID); each scenario ends with a
+    TOTAL_ID row. For every COMPARE_COLUMNS entry there is a column in hours
+    and a "Δ" column with the difference from the baseline. Pass the output
+    of evaluate_scenarios as ``evaluated`` to reuse it.
+    """
+    if evaluated is None:
+        evaluated = evaluate_scenarios(records, baseline, scenarios)
+    if isinstance(records, RecordBatch):
+        employee_ids, names = records.text["employee_id"], records.text["employee_name"]
+    else:
+        employee_ids = [r.employee_id for r in records]
+        names = [r.employee_name for r in records]
+    ids, first, codes = np.unique(np.asarray(employee_ids, dtype=str),
+                                  return_index=True, return_inverse=True)
+    names = np.asarray(names, dtype=object)[first].tolist()
+
+    def totals(results):
+        per_employee = {}
+        for column, fields in COMPARE_COLUMNS.items():
+            minutes = sum(results[f] for f in fields)
+            sums = np.bincount(codes, weights=minutes, minlength=len(ids))
+            per_employee[column] = np.append(sums, minutes.sum()) / 60.0
+        return per_employee
+
+    base = totals(evaluated[BASELINE])
+    index = ids.tolist() + [TOTAL_ID]
+    frames = []
+    for name, results in evaluated.items():
+        hours = totals(results)
+        data = {"EMPLEADO": names + [""]}
+        for column in COMPARE_COLUMNS:
+            data[column] = np.round(hours[column], 2)
+            data["Δ " + column] = np.round(hours[column] - base[column], 2)
+        frames.append(pd.DataFrame(data, index=pd.Index(index, name="ID")))
+    return pd.concat(frames, keys=list(evaluated), names=["ESCENARIO", "ID"])
+
+
+console = Console()
+
+
+def print_totals(comparison: pd.DataFrame) -> None:
+    """Print the TOTAL_ID row of every scenario with its deltas."""
+    totals = comparison.xs(TOTAL_ID, level="ID")
+    table = Table(title="Comparación de Escenarios (horas)")
+    table.add_column("Escenario", style="bold")
+    for column in COMPARE_COLUMNS:
+        table.add_column(column.title(), justify="right")
+    for name, row in totals.iterrows():
+        table.add_row(name, *(f"{row[c]:.2f} ({row['Δ ' + c]:+.2f})" for c in COMPARE_COLUMNS))
+    console.print(table)
+
+
+def run_scenarios_command(input_path: str, scenarios_path: str, config_path: Optional[str],
+                          output_path: Optional[str]) -> int:
+    """Entry point of the ``scenarios`` subcommand; returns the process exit code."""
+    from batch import load_config
+    baseline = load_config(config_path)
+    scenarios = load_scenarios(scenarios_path, baseline)
+    records = load_batch(input_path)
+    comparison = compare_scenarios(records, baseline, scenarios)
+    print_totals(comparison)
+    if output_path:
+        if os.path.splitext(output_path)[1].lower() == ".csv":
+            comparison.to_csv(output_path, encoding="utf-8")
+        else:
+            comparison.to_excel(output_path, engine="openpyxl")
+        console.print(f"[green]Comparación por empleado guardada en {output_path}[/green]")
+    return 0
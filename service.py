@@ -0,0 +1,436 @@
+"""Local HTTP calculation service (asyncio, standard library only).
+
+Endpoints:
+
+- ``POST /calculate`` – JSON ``{"config": {...}, "records": [{"ID": ..., "ENTRADA": ...}]}``
+  with the input file column names; answers ``{"records": [...]}`` with the
+  export columns. ``config`` overrides the service configuration.
+- ``POST /export?input=xlsx&format=xlsx`` – a workbook (or CSV/Parquet) as the
+  body; answers the exported results file. Config parameters can be given as
+  query parameters (``?meal_threshold=45``).
+- ``GET /health`` – status, queue depth and per-endpoint latency and rows/s.
+
+Calculations run on a process pool with one slot per worker. /calculate
+requests that arrive within BATCH_WINDOW seconds of each other with the same
+configuration are calculated as one batch (weekly overtime tiers are still
+split per request). Once ``max_pending`` requests are waiting or running,
+new ones are refused with 503 and a Retry-After header.
+"""
+
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+from rich.console import Console
+
+from columnar import calculate_record_batch
+from config import Config
+from core import calculate_all
+from io_excel import (
+    EXPORT_COLUMNS, EXPORT_MIME_TYPES, export_records, export_row, iter_table, load_batch,
+)
+from models import RecordBatch, WEEKLY_FIELDS
+from periods import WeeklyOvertime
+from utils import parse_date_column
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+# Requests accepted (waiting or running) before new ones get 503
+DEFAULT_MAX_PENDING = 64
+# Seconds the batcher waits for more /calculate requests to join a batch
+BATCH_WINDOW = 0.005
+# Records per batch sent to a worker; one larger request is still sent alone
+BATCH_MAX_ROWS = 100_000
+# Largest accepted request body
+MAX_BODY_BYTES = 64 * 1024 * 1024
+# Latencies kept per endpoint for the percentiles of /health
+LATENCY_SAMPLES = 1024
+
+console = Console()
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+            503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    """An error answered to the client with ``status`` and a JSON message."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _calculate_tables(tables: List[Tuple[list, list]], config_data: dict) -> List[List[list]]:
+    """Worker entry point: (header, rows) tables in, export rows per table out.
+
+    All tables are calculated as one RecordBatch; the weekly overtime tiers
+    are split per table, so employees of different requests never share a week.
+    """
+    config = Config.from_dict(config_data)
+    batch = RecordBatch()
+    bounds = []
+    for header, rows in tables:
+        start = len(batch)
+        for rec in iter_table(header, rows):
+            batch.append(rec)
+        bounds.append((start, len(batch)))
+    calculate_record_batch(batch, config)
+
+    dates = parse_date_column(batch.text["date"])
+    overtime = np.frombuffer(batch.results["overtime"], dtype=np.float64)
+    for start, stop in bounds:
+        if start == stop:
+            continue
+        weeks = WeeklyOvertime(batch.text["employee_id"][start:stop], dates[start:stop])
+        tiers = weeks.tiers(overtime[start:stop], config.weekly_double_overtime)
+        for name, values in zip(WEEKLY_FIELDS, tiers):
+            np.frombuffer(batch.results[name], dtype=np.float64)[start:stop] = values
+    return [[export_row(batch[i]) for i in range(start, stop)] for start, stop in bounds]
+
+
+def _export_file(data: bytes, input_format: str, output_format: str,
+                 config_data: dict) -> Tuple[bytes, int]:
+    """Worker entry point: a file's bytes in, (exported results, record count) out."""
+    # Already in a pool worker: the workbook's sheets are read in this process
+    records = load_batch(data, input_format, workers=1)
+    records = calculate_all(records, Config.from_dict(config_data))
+    buffer = io.BytesIO()
+    export_records(records, buffer, output_format)
+    return buffer.getvalue(), len(records)
+
+
+def _ignore_interrupts() -> None:
+    """Worker initializer: Ctrl+C stops the service, which then shuts the pool down."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+class EndpointStats:
+    """Request count, errors, rows and recent latencies of one endpoint."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, seconds: float, rows: int, ok: bool) -> None:
+        self.requests += 1
+        self.errors += not ok
+        self.rows += rows
+        self.seconds += seconds
+        self.latencies.append(seconds)
+
+    def to_dict(self) -> dict:
+        latencies = list(self.latencies)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "rows": self.rows,
+            "rows_per_second": self.rows / self.seconds if self.seconds else 0.0,
+            "latency_ms": {
+                "mean": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+                "p50": 1000 * _percentile(latencies, 50),
+                "p95": 1000 * _percentile(latencies, 95),
+                "max": 1000 * max(latencies, default=0.0),
+            },
+        }
+
+
+class CalculationService:
+    """HTTP front end to the calculation engine over a bounded worker pool.
+
+    ``workers`` is the pool size (one per CPU by default) and the number of
+    jobs run at once. ``executor`` replaces the process pool (e.g. a thread
+    pool in tests); it is not shut down by close().
+    """
+
+    def __init__(self, config: Optional[Config] = None, workers: Optional[int] = None,
+                 max_pending: int = DEFAULT_MAX_PENDING, executor: Optional[Executor] = None):
+        self.config = config or Config()
+        self.max_pending = max_pending
+        self._own_executor = executor is None
+        # Workers are spawned rather than forked: forking the running event
+        # loop's process (and its threads) can leave a worker deadlocked
+        self.executor = executor or ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_ignore_interrupts)
+        self.workers = workers or os.cpu_count() or 1
+        self.pending = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.started = time.monotonic()
+        self.stats: Dict[str, EndpointStats] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: List[asyncio.Task] = []
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        """Start listening; ``port`` 0 picks a free port (see ``port``)."""
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._tasks.append(asyncio.create_task(self._batcher()))
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._own_executor:
+            self.executor.shutdown(cancel_futures=True)
+
+    def _config(self, overrides: dict) -> Config:
+        """The service config with ``overrides``, cast to the type of each default."""
+        data = self.config.to_dict()
+        for key, value in overrides.items():
+            if key not in data:
+                raise HTTPError(400, f"Unknown config parameter: {key}")
+            try:
+                data[key] = type(data[key])(value)
+            except (TypeError, ValueError):
+                raise HTTPError(400, f"Invalid value for {key}: {value!r}")
+        return Config.from_dict(data)
+
+    # -- Work scheduling ------------------------------------------------------
+
+    def _admit(self) -> None:
+        if self.pending >= self.max_pending:
+            raise HTTPError(503, "Too many pending requests, retry later")
+        self.pending += 1
+
+    async def _run(self, function, *args):
+        """Run ``function`` on the pool once a worker slot is free."""
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def calculate(self, header: list, rows: list, config: Config) -> List[list]:
+        """Export rows of one table, calculated in a batch with other queued requests."""
+        self._admit()
+        try:
+            future = asyncio.get_running_loop().create_future()
+            self._queue.put_nowait((config.to_dict(), header, rows, future))
+            return await future
+        finally:
+            self.pending -= 1
+
+    async def export(self, data: bytes, input_format: str, output_format: str,
+                     config: Config) -> Tuple[bytes, int]:
+        """Exported results file and record count of an uploaded file."""
+        self._admit()
+        try:
+            return await self._run(_export_file, data, input_format, output_format,
+                                   config.to_dict())
+        finally:
+            self.pending -= 1
+
+    async def _batcher(self) -> None:
+        """Collect queued /calculate requests into batches, one pool job per config."""
+        while True:
+            jobs = [await self._queue.get()]
+            await asyncio.sleep(BATCH_WINDOW)
+            while not self._queue.empty():
+                jobs.append(self._queue.get_nowait())
+            groups: Dict[str, list] = {}
+            for job in jobs:
+                groups.setdefault(json.dumps(job[0], sort_keys=True), []).append(job)
+            for group in groups.values():
+                batch, rows = [], 0
+                for job in group:
+                    if batch and rows + len(job[2]) > BATCH_MAX_ROWS:
+                        self._tasks.append(asyncio.create_task(self._run_batch(batch)))
+                        batch, rows = [], 0
+                    batch.append(job)
+                    rows += len(job[2])
+                self._tasks.append(asyncio.create_task(self._run_batch(batch)))
+            self._tasks = [task for task in self._tasks if not task.done()]
+
+    async def _run_batch(self, jobs: list) -> None:
+        self.batches += 1
+        self.batched_requests += len(jobs)
+        try:
+            tables = [(header, rows) for _, header, rows, _ in jobs]
+            results = await self._run(_calculate_tables, tables, jobs[0][0])
+        except Exception as e:
+            for *_, future in jobs:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (*_, future), rows in zip(jobs, results):
+            if not future.done():
+                future.set_result(rows)
+
+    # -- HTTP -----------------------------------------------------------------
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except HTTPError as e:
+                    writer.write(_response(e.status, _json_error(e), keep_alive=False))
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+                response = await self._respond(method, target, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(_response(*response, keep_alive=keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, method: str, target: str, body: bytes) -> tuple:
+        """(status, payload, content type, extra headers) for one request."""
+        url = urlsplit(target)
+        routes = {"/health": ("GET", self._health), "/calculate": ("POST", self._calculate),
+                  "/export": ("POST", self._export)}
+        started = time.perf_counter()
+        rows, status = 0, 500
+        try:
+            if url.path not in routes:
+                raise HTTPError(404, f"Unknown path: {url.path}")
+            allowed, handler = routes[url.path]
+            if method != allowed:
+                raise HTTPError(405, f"{url.path} only accepts {allowed}")
+            status, payload, content_type, rows = await handler(dict(parse_qsl(url.query)), body)
+            return status, payload, content_type, {}
+        except HTTPError as e:
+            status = e.status
+            extra = {"Retry-After": "1"} if e.status == 503 else {}
+            return (e.status, _json_error(e), "application/json", extra)
+        except Exception as e:
+            return (500, _json_error(e), "application/json", {})
+        finally:
+            if url.path in routes:
+                stats = self.stats.setdefault(url.path, EndpointStats())
+                stats.record(time.perf_counter() - started, rows, status < 400)
+
+    async def _health(self, query: dict, body: bytes) -> tuple:
+        health = {
+            "status": "ok",
+            "uptime_seconds": time.monotonic() - self.started,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "batches": self.batches,
+            "requests_per_batch": self.batched_requests / self.batches if self.batches else 0.0,
+            "endpoints": {path: stats.to_dict() for path, stats in sorted(self.stats.items())},
+        }
+        return 200, json.dumps(health).encode("utf-8"), "application/json", 0
+
+    async def _calculate(self, query: dict, body: bytes) -> tuple:
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            raise HTTPError(400, f"Invalid JSON: {e}")
+        if not isinstance(data, dict) or not isinstance(data.get("records"), list) \
+                or not all(isinstance(r, dict) for r in data["records"]):
+            raise HTTPError(400, 'Expected {"records": [{column: value, ...}, ...]}')
+        config = self._config(data.get("config") or {})
+        header = list(dict.fromkeys(key for record in data["records"] for key in record))
+        rows = [[record.get(key) for key in header] for record in data["records"]]
+        results = await self.calculate(header, rows, config)
+        payload = json.dumps({"records": [dict(zip(EXPORT_COLUMNS, row)) for row in results]},
+                             ensure_ascii=False).encode("utf-8")
+        return 200, payload, "application/json", len(results)
+
+    async def _export(self, query: dict, body: bytes) -> tuple:
+        input_format = query.pop("input", "xlsx")
+        output_format = query.pop("format", "xlsx")
+        if input_format not in EXPORT_MIME_TYPES or output_format not in EXPORT_MIME_TYPES:
+            raise HTTPError(400, f"Formats must be one of {', '.join(EXPORT_MIME_TYPES)}")
+        config = self._config(query)
+        payload, rows = await self.export(body, input_format, output_format, config)
+        return 200, payload, EXPORT_MIME_TYPES[output_format], rows
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[tuple]:
+    """(method, target, headers, body) of the next request, or None at end of stream."""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(411, "Send the body with a Content-Length")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, f"The body exceeds {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+def _json_error(error: Exception) -> bytes:
+    return json.dumps({"error": str(error)}, ensure_ascii=False).encode("utf-8")
+
+
+def _response(status: int, payload: bytes, content_type: str = "application/json",
+              extra: Optional[dict] = None, keep_alive: bool = True) -> bytes:
+    headers = {"Content-Type": content_type, "Content-Length": str(len(payload)),
+               "Connection": "keep-alive" if keep_alive else "close", **(extra or {})}
+    head = f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+    head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+    return head.encode("latin-1") + b"\r\n" + payload
+
+
+async def serve(config: Config, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                workers: Optional[int] = None, max_pending: int = DEFAULT_MAX_PENDING) -> None:
+    """Run the service until cancelled."""
+    service = CalculationService(config, workers, max_pending)
+    await service.start(host, port)
+    console.print(f"[green]Servicio de cálculo en http://{host}:{service.port}[/green] "
+                  f"({service.workers} procesos)")
+    try:
+        await service.server.serve_forever()
+    finally:
+        await service.close()
+
+
+def run_service_command(config_path: Optional[str], host: str, port: int,
+                        workers: Optional[int], max_pending: int) -> int:
+    """Entry point of the ``serve`` subcommand; returns the process exit code."""
+    from batch import load_config
+    try:
+        asyncio.run(serve(load_config(config_path), host, port, workers, max_pending))
+    except KeyboardInterrupt:
+        pass
+    return 0
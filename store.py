@@ -0,0 +1,258 @@
+"""Persistent SQLite store of calculated attendance records.
+
+Records are kept one row per (employee ID, day), so importing a workbook
+that repeats days already stored updates them in place. On every append only
+the days whose punches, name or configuration changed are recalculated;
+their ISO weeks are then split into overtime tiers again from the stored
+overtime of the whole week. Queries by employee and date range run on the
+primary key and on an index by day.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from array import array
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from columnar import PunchColumns, compute
+from config import Config
+from models import (
+    DAILY_FIELDS, PUNCH_FIELDS, RESULT_FIELDS, TEXT_FIELDS, WEEKLY_FIELDS, RecordBatch,
+)
+from periods import WeeklyOvertime, period_end, period_start
+from utils import MISSING_TIME, parse_date, parse_date_column
+import metrics
+
+# Default location; override with the URSOMEX_STORE environment variable
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser("~"), ".local", "share", "ursomex",
+                                  "asistencias.sqlite3")
+
+# Columns describing a day as imported; a stored day is unchanged when all match
+_INPUT_COLUMNS = ("date", "employee_name") + PUNCH_FIELDS + ("permits",)
+_COLUMNS = ("employee_id", "day") + _INPUT_COLUMNS + ("config",) + RESULT_FIELDS
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS records (
+    employee_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    date TEXT NOT NULL,
+    employee_name TEXT NOT NULL,
+    {", ".join(f"{name} INTEGER" for name in PUNCH_FIELDS)},
+    permits BLOB NOT NULL,
+    config TEXT NOT NULL,
+    {", ".join(f"{name} REAL NOT NULL" for name in RESULT_FIELDS)},
+    PRIMARY KEY (employee_id, day)
+);
+CREATE INDEX IF NOT EXISTS records_by_day ON records (day, employee_id);
+"""
+
+_UPSERT = (
+    f"INSERT INTO records ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))}) "
+    "ON CONFLICT (employee_id, day) DO UPDATE SET "
+    + ", ".join(f"{name} = excluded.{name}" for name in _COLUMNS[2:])
+)
+
+DateBound = Union[date, str, None]
+
+
+def config_fingerprint(config: Config) -> str:
+    """Short digest of a Config, stored with each row's results."""
+    text = json.dumps(config.to_dict(), sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _iso_day(value: DateBound) -> Optional[str]:
+    """YYYY-MM-DD of a date or FECHA string; raises ValueError when it does not parse."""
+    if value is None:
+        return None
+    day = value if isinstance(value, date) else parse_date(value)
+    if day is None:
+        raise ValueError(f"Invalid date: {value}")
+    return day.isoformat()
+
+
+def _batch_from_rows(rows: List[tuple]) -> RecordBatch:
+    """RecordBatch of rows selected with _COLUMNS, results included."""
+    batch = RecordBatch()
+    if not rows:
+        return batch
+    columns = dict(zip(_COLUMNS, zip(*rows)))
+    punches = {name: array("q", (MISSING_TIME if v is None else v for v in columns[name]))
+               for name in PUNCH_FIELDS}
+    # The source sheet is not stored; queried records have none
+    batch.extend_columns({name: list(columns[name]) for name in TEXT_FIELDS if name in columns},
+                         punches, b"".join(columns["permits"]),
+                         (len(blob) // 8 for blob in columns["permits"]))
+    for name in RESULT_FIELDS:
+        batch.results[name] = array("d", columns[name])
+    return batch
+
+
+class AttendanceStore:
+    """SQLite file of calculated records, keyed by employee ID and day.
+
+    Use as a context manager, or call close() when done. Records whose FECHA
+    does not parse have no day to be keyed on and are not stored.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.environ.get("URSOMEX_STORE", DEFAULT_STORE_PATH)
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "AttendanceStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def append(self, records, config: Config) -> Dict[str, int]:
+        """Upsert records (a RecordBatch or a list), recalculating only new or changed days.
+
+        When the same employee and day appear more than once, the last one
+        wins. Returns how many days were ``inserted``, ``updated``,
+        ``unchanged`` and ``skipped`` (no valid date).
+        """
+        batch = records if isinstance(records, RecordBatch) else RecordBatch.from_records(records)
+        with metrics.span("store", rows=len(batch)):
+            dates = parse_date_column(batch.text["date"])
+            dated = np.flatnonzero(~np.isnat(dates))
+            days = np.datetime_as_string(dates[dated], unit="D").tolist()
+            employee_ids = batch.text["employee_id"]
+            latest = {(employee_ids[i], day): i for i, day in zip(dated.tolist(), days)}
+
+            fingerprint = config_fingerprint(config)
+            stored = self._stored_inputs(list(latest))
+            changed = []
+            for key, i in latest.items():
+                row = self._input_row(batch, i) + (fingerprint,)
+                if stored.get(key) != row:
+                    changed.append((key, row))
+            with self.conn:
+                self._save(changed, config)
+        inserted = sum(1 for key, _ in changed if key not in stored)
+        return {
+            "inserted": inserted,
+            "updated": len(changed) - inserted,
+            "unchanged": len(latest) - len(changed),
+            "skipped": len(batch) - len(dated),
+        }
+
+    def recalculate(self, config: Config) -> int:
+        """Recalculate the stored days last calculated under another config; returns how many."""
+        fingerprint = config_fingerprint(config)
+        rows = self.conn.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM records WHERE config != ?", (fingerprint,)
+        ).fetchall()
+        with metrics.span("store", rows=len(rows)), self.conn:
+            self._save([((row[0], row[1]), row[2:2 + len(_INPUT_COLUMNS)] + (fingerprint,))
+                        for row in rows], config)
+        return len(rows)
+
+    def query(self, employee_id: Union[str, Sequence[str], None] = None, start: DateBound = None,
+              end: DateBound = None) -> RecordBatch:
+        """Stored records in an inclusive date range, ordered by employee ID and day.
+
+        Bounds are dates or FECHA strings; ``employee_id`` (one ID or a list)
+        restricts the employees returned. Results are the ones stored by the
+        last append or recalculate.
+        """
+        where, params = [], []
+        if isinstance(employee_id, str):
+            employee_id = [employee_id]
+        if employee_id is not None:
+            where.append(f"employee_id IN ({', '.join('?' * len(employee_id))})")
+            params.extend(employee_id)
+        for op, bound in ((">=", start), ("<=", end)):
+            if bound is not None:
+                where.append(f"day {op} ?")
+                params.append(_iso_day(bound))
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM records"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with metrics.span("store") as sp:
+            rows = self.conn.execute(sql + " ORDER BY employee_id, day", params).fetchall()
+            sp.add_rows(len(rows))
+        return _batch_from_rows(rows)
+
+    def employee_ids(self) -> List[str]:
+        """Every stored employee ID, sorted."""
+        return [row[0] for row in self.conn.execute(
+            "SELECT DISTINCT employee_id FROM records ORDER BY employee_id")]
+
+    def date_range(self) -> Optional[Tuple[date, date]]:
+        """(first, last) stored day, or None when the store is empty."""
+        first, last = self.conn.execute("SELECT MIN(day), MAX(day) FROM records").fetchone()
+        if first is None:
+            return None
+        return date.fromisoformat(first), date.fromisoformat(last)
+
+    @staticmethod
+    def _input_row(batch: RecordBatch, i: int) -> tuple:
+        """Values of _INPUT_COLUMNS for record ``i`` of a batch."""
+        punches = tuple(None if batch.punches[name][i] == MISSING_TIME else batch.punches[name][i]
+                        for name in PUNCH_FIELDS)
+        offsets = batch.permit_offsets
+        permits = batch.permit_values[offsets[i]:offsets[i + 1]].tobytes()
+        return (batch.text["date"][i], batch.text["employee_name"][i]) + punches + (permits,)
+
+    def _stored_inputs(self, keys: Sequence[Tuple[str, str]]) -> Dict[Tuple[str, str], tuple]:
+        """_INPUT_COLUMNS and config of the stored rows among ``keys``."""
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted "
+                          "(employee_id TEXT, day TEXT, PRIMARY KEY (employee_id, day))")
+        try:
+            self.conn.executemany("INSERT OR IGNORE INTO wanted VALUES (?, ?)", keys)
+            rows = self.conn.execute(
+                f"SELECT r.employee_id, r.day, {', '.join('r.' + c for c in _INPUT_COLUMNS)}, "
+                "r.config FROM records r JOIN wanted w USING (employee_id, day)"
+            ).fetchall()
+        finally:
+            self.conn.execute("DELETE FROM wanted")
+        return {(row[0], row[1]): row[2:] for row in rows}
+
+    def _save(self, changed: List[Tuple[Tuple[str, str], tuple]], config: Config) -> None:
+        """Calculate and upsert ``changed`` (key, input row with config) days, then re-split their weeks."""
+        if not changed:
+            return
+        batch = _batch_from_rows([key + row + (0.0,) * len(RESULT_FIELDS) for key, row in changed])
+        results = compute(PunchColumns.from_batch(batch), config)
+        daily = list(zip(*(results[name].tolist() for name in DAILY_FIELDS)))
+        weekly = (0.0,) * len(WEEKLY_FIELDS)
+        self.conn.executemany(_UPSERT, (key + row + values + weekly
+                                        for (key, row), values in zip(changed, daily)))
+        self._split_weeks([key for key, _ in changed], config)
+
+    def _split_weeks(self, keys: Sequence[Tuple[str, str]], config: Config) -> None:
+        """Recompute the overtime tiers of every stored day in the weeks of ``keys``."""
+        weeks = period_start(np.array([day for _, day in keys], dtype="datetime64[D]"), "week")
+        bounds: Dict[str, Tuple[str, str]] = {}
+        for (employee_id, _), first, last in zip(keys, weeks.astype(str).tolist(),
+                                                 period_end(weeks, "week").astype(str).tolist()):
+            lo, hi = bounds.get(employee_id, (first, last))
+            bounds[employee_id] = (min(lo, first), max(hi, last))
+        rows = []
+        for employee_id, (first, last) in bounds.items():
+            rows += self.conn.execute(
+                "SELECT employee_id, day, overtime FROM records "
+                "WHERE employee_id = ? AND day BETWEEN ? AND ?", (employee_id, first, last)
+            ).fetchall()
+        employee_ids, days, overtime = zip(*rows)
+        split = WeeklyOvertime(employee_ids, np.array(days, dtype="datetime64[D]"))
+        double, triple = split.tiers(np.array(overtime), config.weekly_double_overtime)
+        self.conn.executemany(
+            f"UPDATE records SET {WEEKLY_FIELDS[0]} = ?, {WEEKLY_FIELDS[1]} = ? "
+            "WHERE employee_id = ? AND day = ?",
+            zip(double.tolist(), triple.tolist(), employee_ids, days))
+
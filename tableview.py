@@ -0,0 +1,143 @@
+"""Filterable, sortable and paged view of calculated records for the web table.
+
+The view keeps one array per display column over a RecordBatch. Filters and
+sorting work on those arrays and return row positions, and only the rows of
+the requested page are turned into a DataFrame. The issue code of every
+record (validation.validate) is computed once with the other columns.
+"""
+
+from datetime import date
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from models import RecordBatch
+from periods import WeeklyOvertime
+from recordindex import RecordIndex
+from utils import format_time_column, parse_date_column
+from validation import describe, validate
+
+# Columns of the web table, in display order
+COLUMNS = ("ID", "Fecha", "Empleado", "Hoja", "Entrada", "Salida", "Horas Laboradas",
+           "Horas Extra", "Extra Dobles", "Extra Triples", "Anomalías")
+
+# Result field behind each calculated column
+_HOUR_COLUMNS = {"Horas Laboradas": "net_worked", "Horas Extra": "overtime",
+                 "Extra Dobles": "overtime_double", "Extra Triples": "overtime_triple"}
+
+# Calculated columns summed per employee for the chart
+_TOTAL_COLUMNS = ("Horas Laboradas", "Horas Extra")
+
+
+class TableView:
+    """Column arrays of a RecordBatch for filtering, sorting and paging.
+
+    Text columns are stored as codes into their sorted distinct values, so
+    filtering is a code lookup and sorting by them is an integer sort. ID and
+    date filters go through a RecordIndex, and ``weeks`` orders the records
+    for the weekly overtime tiers. The
+    view does not depend on the configuration; calculated columns come from
+    the ``results`` of columnar.compute() passed to each call.
+    """
+
+    def __init__(self, batch: RecordBatch):
+        self.batch = batch
+        self.ids, self.id_codes = np.unique(
+            np.asarray(batch.text["employee_id"], dtype=str), return_inverse=True)
+        self.employees, self.employee_codes = np.unique(
+            np.asarray(batch.text["employee_name"], dtype=str), return_inverse=True)
+        self.sheets, self.sheet_codes = np.unique(
+            np.asarray(batch.text["sheet"], dtype=str), return_inverse=True)
+        self.dates = parse_date_column(batch.text["date"])
+        self.index = RecordIndex(batch.text["employee_id"], self.dates)
+        self.weeks = WeeklyOvertime(batch.text["employee_id"], self.dates)
+        self.entry = np.frombuffer(batch.punches["entry"], dtype=np.int64)
+        self.exit = np.frombuffer(batch.punches["exit"], dtype=np.int64)
+        self.issues = validate(batch)
+
+    def __len__(self) -> int:
+        return len(self.batch)
+
+    def date_range(self):
+        """(first, last) valid date in the batch, or None when no date parses."""
+        return self.index.date_range()
+
+    def filter(self, employees: Optional[Iterable[str]] = None, ids: Optional[Iterable[str]] = None,
+               start: Optional[date] = None, end: Optional[date] = None,
+               issues_only: bool = False) -> np.ndarray:
+        """Positions of the rows matching every given filter (empty/None filters match all).
+
+        The date range is inclusive; rows whose date does not parse are left out
+        once a bound is given. ``issues_only`` keeps the rows with an issue code.
+        """
+        if ids:
+            rows = np.sort(np.concatenate(
+                [self.index.range(i, start, end) for i in ids] + [np.zeros(0, dtype=np.int64)]))
+        elif start is not None or end is not None:
+            rows = np.sort(self.index.range(None, start, end))
+        else:
+            rows = np.arange(len(self))
+        if employees:
+            rows = rows[np.isin(self.employees, list(employees))[self.employee_codes[rows]]]
+        if issues_only:
+            rows = rows[self.issues[rows] != 0]
+        return rows
+
+    def _sort_key(self, column: str, results: Dict[str, np.ndarray]) -> np.ndarray:
+        if column == "ID":
+            return self.id_codes
+        if column == "Empleado":
+            return self.employee_codes
+        if column == "Hoja":
+            return self.sheet_codes
+        if column == "Fecha":
+            return self.dates.view(np.int64)
+        if column == "Entrada":
+            return self.entry
+        if column == "Salida":
+            return self.exit
+        if column in _HOUR_COLUMNS:
+            return results[_HOUR_COLUMNS[column]]
+        if column == "Anomalías":
+            return self.issues
+        raise ValueError(f"Unknown column: {column}")
+
+    def sort(self, rows: np.ndarray, column: str, results: Dict[str, np.ndarray],
+             descending: bool = False) -> np.ndarray:
+        """Reorder row positions by a column; ties keep their original order."""
+        key = self._sort_key(column, results)[rows]
+        if descending:
+            # Sort the reversed keys and flip back, so ties stay in input order
+            order = len(rows) - 1 - np.argsort(key[::-1], kind="stable")[::-1]
+        else:
+            order = np.argsort(key, kind="stable")
+        return rows[order]
+
+    def page(self, rows: np.ndarray, results: Dict[str, np.ndarray],
+             page: int = 0, page_size: int = 100) -> pd.DataFrame:
+        """DataFrame of one page of ``rows``, indexed by row position."""
+        selected = rows[page * page_size:(page + 1) * page_size]
+        positions = selected.tolist()
+        text = self.batch.text
+        data = {
+            "ID": [text["employee_id"][i] for i in positions],
+            "Fecha": [text["date"][i] for i in positions],
+            "Empleado": [text["employee_name"][i] for i in positions],
+            "Hoja": [text["sheet"][i] for i in positions],
+            "Entrada": format_time_column(self.entry[selected]),
+            "Salida": format_time_column(self.exit[selected]),
+        }
+        for column, field in _HOUR_COLUMNS.items():
+            data[column] = np.round(results[field][selected] / 60.0, 2)
+        data["Anomalías"] = [describe(code) for code in self.issues[selected].tolist()]
+        return pd.DataFrame(data, index=selected)
+
+    def employee_totals(self, results: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """Hours worked and overtime summed per employee, indexed by name."""
+        data = {
+            column: np.bincount(self.employee_codes, minlength=len(self.employees),
+                                weights=np.round(results[_HOUR_COLUMNS[column]] / 60.0, 2))
+            for column in _TOTAL_COLUMNS
+        }
+        return pd.DataFrame(data, index=pd.Index(self.employees, name="Empleado"))
@@ -4,7 +4,7 @@ import unittest
 from datetime import datetime
 
 from config import Config
-from models import AttendanceRecord
+from models import AttendanceRecord, CompactRecord, RecordBatch, PUNCH_FIELDS, WEEKLY_FIELDS
 from core import (
     calculate_meal_deduction,
     calculate_dinner_deduction,
@@ -13,7 +13,11 @@ from core import (
     calculate_record,
     calculate_all,
 )
-from utils import parse_time, format_time, minutes_between, minutes_to_hours, apply_rounding, parse_permit_string
+from utils import (
+    parse_time, format_time, minutes_between, minutes_to_hours, apply_rounding, parse_permit_string,
+    detect_time_format, parse_time_column, parse_permit_column, format_time_column, to_seconds,
+    MISSING_TIME,
+)
 
 
 class TestUtils(unittest.TestCase):
@@ -79,6 +83,56 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(parse_permit_string(None), [])
         self.assertEqual(parse_permit_string("nan"), [])
 
+    def test_parse_time_native_time(self):
+        from datetime import time
+        self.assertEqual(parse_time(time(7, 30)), datetime(1900, 1, 1, 7, 30))
+
+    def test_detect_time_format(self):
+        self.assertEqual(detect_time_format([None, "", "08:00"]), "%H:%M")
+        self.assertEqual(detect_time_format(["08:00:15"]), "%H:%M:%S")
+        self.assertEqual(detect_time_format(["07:15 PM"]), "%I:%M %p")
+        self.assertIsNone(detect_time_format(["x", None]))
+
+    def test_parse_time_column_matches_parse_time(self):
+        from datetime import time, timedelta
+        values = ["08:00", "8:05", " 9:5", "25:00", "08:00:00", "", "nan", None,
+                  time(6, 45), datetime(2024, 1, 1, 9), timedelta(hours=3),
+                  "07:15 PM", "ab:cd", "23:59", "00:00"]
+        self.assertEqual(parse_time_column(values), [parse_time(v) for v in values])
+        self.assertEqual(parse_time_column(values, "%H:%M:%S"), [parse_time(v) for v in values])
+
+    def test_parse_time_rounds_native_values_to_seconds(self):
+        from datetime import time, timedelta
+        self.assertEqual(parse_time(time(7, 59, 59, 600000)), datetime(1900, 1, 1, 8, 0))
+        self.assertEqual(parse_time(datetime(2024, 1, 5, 8, 0, 0, 400000)),
+                         datetime(2024, 1, 5, 8, 0))
+        self.assertEqual(parse_time(timedelta(hours=8, microseconds=500000)),
+                         datetime(1900, 1, 1, 8, 0, 1))
+        self.assertEqual(minutes_between(datetime(1900, 1, 1, 7, 59, 59, 600000),
+                                         datetime(1900, 1, 1, 8, 1, 0, 400000)), 1.0)
+
+    def test_parse_permit_string_exported_pairs(self):
+        result = parse_permit_string("14:30-15:00, 18:30")
+        self.assertEqual([t.hour for t in result], [14, 15, 18])
+
+    def test_parse_permit_column_matches_parse_permit_string(self):
+        values = ["14:30, 15:00, 18:30, 19:00", "", None, "nan", "8:00,x, 9:00 PM"]
+        self.assertEqual(parse_permit_column(values), [parse_permit_string(v) for v in values])
+
+    def test_parse_date_column(self):
+        from datetime import date
+        from utils import parse_date, parse_date_column
+        values = ["05/03/2024", "2024-03-06 00:00:00", "2024-03-07", "", None, "mañana"]
+        self.assertEqual(parse_date(date(2024, 3, 5)), date(2024, 3, 5))
+        self.assertEqual(parse_date_column(values).astype(object).tolist(),
+                         [date(2024, 3, 5), date(2024, 3, 6), date(2024, 3, 7), None, None, None])
+
+    def test_format_time_column_matches_format_time(self):
+        times = [parse_time(v) for v in ("08:05", "23:59:59", "00:00", "12:30:30")]
+        seconds = [to_seconds(t) for t in times] + [MISSING_TIME]
+        self.assertEqual(format_time_column(seconds).tolist(),
+                         [format_time(t) for t in times] + [""])
+
 
 class TestCore(unittest.TestCase):
 
@@ -205,6 +259,1154 @@ class TestCore(unittest.TestCase):
         self.assertEqual(results[1].net_worked, 600.0)
 
 
+class TestColumnarEngine(unittest.TestCase):
+
+    FIELDS = ("total_minutes", "meal_deduction", "dinner_deduction",
+              "permit_deduction", "net_worked", "overtime")
+
+    def _make_records(self):
+        specs = [
+            ("08:00", "17:00", "12:00", "12:45", None, None, []),
+            ("08:00", None, "12:00", "13:00", None, None, []),
+            (None, "17:00", None, None, None, None, []),
+            ("07:00", None, None, None, None, None, ["09:00", "09:30", "15:10"]),
+            ("08:00", "18:00", "12:00", "13:30", "19:00", "19:20", ["15:00", "15:30"]),
+            ("08:00", "16:37", "13:00", "12:00", None, None, ["16:00", "15:00"]),
+            ("06:15:30", "19:02:45", "11:00:10", "11:59:59", "17:00", "18:05", []),
+            ("08:00", "08:30", "12:00", "14:00", None, None, []),
+            (None, None, None, None, None, None, []),
+        ]
+        records = []
+        for entry, exit_t, mo, mi, do, di, permits in specs:
+            rec = AttendanceRecord()
+            rec.entry, rec.exit = parse_time(entry), parse_time(exit_t)
+            rec.meal_out, rec.meal_in = parse_time(mo), parse_time(mi)
+            rec.dinner_out, rec.dinner_in = parse_time(do), parse_time(di)
+            rec.permits = [parse_time(p) for p in permits]
+            records.append(rec)
+        return records
+
+    def _assert_engines_match(self, config):
+        reference = calculate_all(self._make_records(), config, engine="python")
+        vectorized = calculate_all(self._make_records(), config, engine="numpy")
+        for ref, vec in zip(reference, vectorized):
+            for name in self.FIELDS:
+                self.assertEqual(getattr(ref, name), getattr(vec, name), name)
+
+    def test_engines_match_default_config(self):
+        self._assert_engines_match(Config())
+
+    def test_engines_match_all_rounding_modes(self):
+        for mode in ("none", "ceil", "floor", "round"):
+            config = Config()
+            config.rounding_mode = mode
+            config.rounding_minutes = 15
+            config.base_workday = 420
+            self._assert_engines_match(config)
+
+    def test_engines_match_thresholds(self):
+        config = Config()
+        config.meal_threshold = 45
+        config.dinner_threshold = 90
+        self._assert_engines_match(config)
+
+    def test_engines_match_sub_second_punches(self):
+        """Punches are taken to the nearest second by every engine."""
+        from datetime import timedelta
+        records = []
+        for rec in self._make_records():
+            for name in PUNCH_FIELDS:
+                if getattr(rec, name) is not None:
+                    setattr(rec, name, getattr(rec, name) + timedelta(microseconds=700000))
+            rec.permits = [p - timedelta(microseconds=499999) for p in rec.permits]
+            records.append(rec)
+        reference = calculate_all(records, Config(), engine="python")
+        vectorized = calculate_all([CompactRecord.from_record(r) for r in records], Config(),
+                                   engine="numpy")
+        batch = calculate_all(RecordBatch.from_records(records), Config())
+        for ref, vec, rec in zip(reference, vectorized, batch):
+            for name in self.FIELDS:
+                self.assertEqual(getattr(ref, name), getattr(vec, name), name)
+                self.assertEqual(getattr(ref, name), getattr(rec, name), name)
+
+    def test_empty_input(self):
+        self.assertEqual(calculate_all([], Config(), engine="numpy"), [])
+
+    def test_config_from_dict(self):
+        config = Config()
+        config.rounding_mode = "floor"
+        self.assertEqual(Config.from_dict(config.to_dict()).to_dict(), config.to_dict())
+        with self.assertRaises(ValueError):
+            Config.from_dict({"unknown": 1})
+
+    def test_stale_stages(self):
+        from columnar import stale_stages
+        base = Config()
+        changed = Config()
+        self.assertEqual(stale_stages(base, changed), [])
+        changed.rounding_minutes = 30
+        self.assertEqual(stale_stages(base, changed), ["overtime"])
+        changed.meal_threshold = 45
+        self.assertEqual(stale_stages(base, changed), ["meal_deduction", "net_worked", "overtime"])
+
+    def test_incremental_compute_matches_full(self):
+        from columnar import PunchColumns, compute
+        cols = PunchColumns.from_records(self._make_records())
+        previous_config = Config()
+        previous = compute(cols, previous_config)
+        for field, value in (("base_workday", 420), ("rounding_mode", "floor"),
+                             ("dinner_threshold", 90), ("meal_threshold", 45)):
+            config = Config.from_dict(previous_config.to_dict())
+            setattr(config, field, value)
+            incremental = compute(cols, config, previous, previous_config)
+            full = compute(cols, config)
+            for name in self.FIELDS:
+                self.assertEqual(incremental[name].tolist(), full[name].tolist(), (field, name))
+        # Unaffected stages are reused, not recomputed
+        self.assertIs(incremental["total_minutes"], previous["total_minutes"])
+
+    def test_apply_results_matches_record_batch(self):
+        from columnar import PunchColumns, apply_results, compute
+        batch = RecordBatch.from_records(self._make_records())
+        apply_results(batch, compute(PunchColumns.from_batch(batch), Config()))
+        reference = calculate_all(self._make_records(), Config())
+        for ref, rec in zip(reference, batch):
+            for name in self.FIELDS:
+                self.assertEqual(getattr(ref, name), getattr(rec, name), name)
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            calculate_all([], Config(), engine="gpu")
+
+
+class TestParallel(unittest.TestCase):
+
+    def test_punch_columns_round_trip(self):
+        from columnar import PunchColumns
+        records = TestColumnarEngine()._make_records()
+        cols = PunchColumns.from_records(records)
+        restored = PunchColumns.from_bytes(cols.slice(2, 6).to_bytes())
+        self.assertEqual(len(restored), 4)
+        self.assertEqual(restored.permit_offsets.tolist(), [0, 0, 3, 5, 7])
+        self.assertEqual(restored.columns["entry"].tolist(), cols.columns["entry"][2:6].tolist())
+
+    def test_parallel_matches_serial_in_order(self):
+        from concurrent.futures import ProcessPoolExecutor
+        from unittest import mock
+        import parallel
+        config = Config()
+        config.rounding_mode = "ceil"
+        reference = calculate_all(TestColumnarEngine()._make_records() * 5, config)
+        for records in (TestColumnarEngine()._make_records() * 5,
+                        RecordBatch.from_records(TestColumnarEngine()._make_records() * 5)):
+            with mock.patch.object(parallel, "ProcessPoolExecutor",
+                                   wraps=ProcessPoolExecutor) as pool:
+                results = parallel.calculate_parallel(records, config, workers=2, chunk_size=4)
+            # Workers are spawned, never forked from a possibly multithreaded caller
+            self.assertEqual(pool.call_args.kwargs["mp_context"].get_start_method(), "spawn")
+            for ref, rec in zip(reference, results):
+                self.assertEqual(ref.net_worked, rec.net_worked)
+                self.assertEqual(ref.overtime, rec.overtime)
+
+    def test_small_inputs_stay_serial(self):
+        records = calculate_all(TestColumnarEngine()._make_records(), Config(), workers=8)
+        self.assertEqual(records[0].net_worked, 510.0)
+
+
+class TestCompactRecords(unittest.TestCase):
+
+    def _record(self, emp="001", entry="08:00", exit_t="17:00", permits=()):
+        rec = AttendanceRecord(employee_id=emp, date="01/01/2024", employee_name="Ana")
+        rec.entry, rec.exit = parse_time(entry), parse_time(exit_t)
+        rec.meal_out, rec.meal_in = parse_time("12:00"), parse_time("13:30")
+        rec.permits = [parse_time(p) for p in permits]
+        return rec
+
+    def test_compact_record_accessors(self):
+        rec = CompactRecord.from_record(self._record(permits=["15:00", "15:20"]))
+        self.assertFalse(hasattr(rec, "__dict__"))
+        self.assertEqual(rec.entry, parse_time("08:00"))
+        self.assertIsNone(rec.dinner_out)
+        self.assertEqual(rec.permits, [parse_time("15:00"), parse_time("15:20")])
+        rec.exit = None
+        self.assertIsNone(rec.exit)
+        self.assertEqual(rec.to_record().meal_in, parse_time("13:30"))
+
+    def test_batch_calculation_matches_list(self):
+        records = [self._record(), self._record("002", "07:00", None, ["14:00", "14:45", "16:00"])]
+        batch = calculate_all(RecordBatch.from_records(records), Config())
+        calculate_all(records, Config())
+        self.assertEqual(len(batch), 2)
+        for rec, compact in zip(records, batch):
+            self.assertEqual(rec.net_worked, compact.net_worked)
+            self.assertEqual(rec.overtime, compact.overtime)
+            self.assertEqual(rec.permit_deduction, compact.permit_deduction)
+
+    def test_batch_setitem_resizes_permits(self):
+        batch = RecordBatch.from_records(
+            [self._record("001", permits=["15:00", "15:20"]), self._record("002", permits=["10:00"])]
+        )
+        rec = batch[0]
+        rec.permits = rec.permits + [parse_time("16:00"), parse_time("16:30")]
+        calculate_record(rec, Config())
+        batch[0] = rec
+        self.assertEqual(len(batch[0].permits), 4)
+        self.assertEqual(batch[0].permit_deduction, 50.0)
+        self.assertEqual(batch[1].permits, [parse_time("10:00")])
+        self.assertEqual(batch[-1].employee_id, "002")
+        with self.assertRaises(IndexError):
+            batch[2]
+
+
+def _write_sample_workbook(path):
+    """Write a small input workbook in the expected column layout."""
+    import pandas as pd
+    pd.DataFrame({
+        "ID": ["001", "002"],
+        "FECHA": ["01/01/2024", "02/01/2024"],
+        "EMPLEADO": ["Juan", "Maria"],
+        "ENTRADA": ["08:00", "07:30"],
+        "SALIDA A COMER": ["12:00", "12:30"],
+        "REGRESO DE COMER": ["12:45", "13:00"],
+        "SALIDA": ["17:00", "16:30"],
+        "PERMISO": ["", "14:30, 15:00"],
+    }).to_excel(path, index=False, engine="openpyxl")
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_batch_processes_directory(self):
+        import os
+        import tempfile
+        from batch import expand_inputs, run_batch, output_path
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("a.xlsx", "b.xlsx"):
+                _write_sample_workbook(os.path.join(tmp, name))
+            open(os.path.join(tmp, "~$a.xlsx"), "w").close()
+            open(os.path.join(tmp, "notas.txt"), "w").close()
+
+            files = expand_inputs([tmp])
+            self.assertEqual([os.path.basename(f) for f in files], ["a.xlsx", "b.xlsx"])
+
+            out_dir = os.path.join(tmp, "out")
+            summary = run_batch(files, Config(), out_dir, workers=2)
+            self.assertEqual(summary["files"], 2)
+            self.assertEqual(summary["rows"], 4)
+            self.assertEqual(summary["failed"], [])
+            self.assertTrue(os.path.exists(output_path(files[0], out_dir)))
+            self.assertEqual(set(summary["stage_seconds"]), {"load", "calculate", "export"})
+
+    def test_inputs_with_the_same_output_fail(self):
+        import os
+        import tempfile
+        from batch import output_path, run_batch
+
+        with tempfile.TemporaryDirectory() as tmp:
+            files = []
+            for name in ("a/libro.xlsx", "b/libro.xlsx", "c/otro.xlsx"):
+                os.makedirs(os.path.join(tmp, os.path.dirname(name)))
+                files.append(os.path.join(tmp, name))
+                _write_sample_workbook(files[-1])
+            out_dir = os.path.join(tmp, "out")
+            summary = run_batch(files, Config(), out_dir, workers=1)
+            self.assertEqual(summary["files"], 1)
+            self.assertEqual(sorted(e["file"] for e in summary["failed"]), files[:2])
+            self.assertFalse(os.path.exists(output_path(files[0], out_dir)))
+            self.assertTrue(os.path.exists(output_path(files[2], out_dir)))
+
+    def test_workers_load_workbooks_in_process(self):
+        """A batch worker must not start a pool of its own for a large workbook."""
+        import os
+        import tempfile
+        from unittest import mock
+        import batch
+        import io_excel
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "a.xlsx")
+            _write_sample_workbook(path)
+            from openpyxl import load_workbook
+            wb = load_workbook(path)
+            wb.copy_worksheet(wb.active)
+            wb.save(path)
+            with mock.patch.object(io_excel, "PARALLEL_SHEET_BYTES", 0), \
+                    mock.patch.object(io_excel.os, "cpu_count", return_value=4), \
+                    mock.patch.object(io_excel, "ProcessPoolExecutor") as pool:
+                result = batch.process_file(path, Config().to_dict(), tmp)
+            pool.assert_not_called()
+            self.assertEqual(result["rows"], 4)
+
+
+class TestParseCache(unittest.TestCase):
+
+    def _batch(self, n=3):
+        return RecordBatch.from_records(
+            AttendanceRecord(employee_id=str(i), employee_name="Añá", entry=parse_time("08:00"),
+                             permits=[parse_time("10:00")] * i)
+            for i in range(n)
+        )
+
+    def test_batch_serialization_round_trip(self):
+        batch = self._batch()
+        restored = RecordBatch.from_bytes(batch.to_bytes())
+        self.assertEqual(len(restored), 3)
+        self.assertEqual(list(restored.permit_offsets), [0, 0, 1, 3])
+        self.assertEqual(restored[2].employee_name, "Añá")
+        self.assertEqual(restored[1].entry, parse_time("08:00"))
+        with self.assertRaises(ValueError):
+            RecordBatch.from_bytes(b"not a batch")
+
+    def test_load_hits_cache(self):
+        import tempfile
+        from cache import ParseCache
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ParseCache(tmp)
+            calls = []
+
+            def loader():
+                calls.append(1)
+                return self._batch()
+
+            first = cache.load("abc", loader)
+            second = cache.load("abc", loader)
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(second[2].permits, first[2].permits)
+
+    def test_truncated_entry_is_a_miss(self):
+        import tempfile
+        from cache import ParseCache
+
+        blob = self._batch().to_bytes()
+        for cut in range(len(blob)):
+            with self.assertRaises(ValueError):
+                RecordBatch.from_bytes(blob[:cut])
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ParseCache(tmp)
+            with open(cache._path("abc"), "wb") as f:
+                f.write(blob[:8])
+            self.assertIsNone(cache.get("abc"))
+            self.assertEqual(len(cache.load("abc", self._batch)), 3)
+
+    def test_lru_eviction(self):
+        import os
+        import tempfile
+        from cache import ParseCache
+
+        with tempfile.TemporaryDirectory() as tmp:
+            size = len(self._batch().to_bytes())
+            cache = ParseCache(tmp, max_bytes=2 * size)
+            cache.put("a", self._batch())
+            cache.put("b", self._batch())
+            os.utime(os.path.join(tmp, "a.batch"), (1, 1))
+            os.utime(os.path.join(tmp, "b.batch"), (2, 2))
+            self.assertIsNotNone(cache.get("a"))  # refreshes "a"
+            cache.put("c", self._batch())
+            self.assertIsNone(cache.get("b"))
+            self.assertIsNotNone(cache.get("a"))
+            self.assertIsNotNone(cache.get("c"))
+
+    def test_load_cached_keys_by_content(self):
+        import os
+        import tempfile
+        from cache import ParseCache, load_cached
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ParseCache(os.path.join(tmp, "cache"))
+            path = os.path.join(tmp, "in.xlsx")
+            _write_sample_workbook(path)
+            self.assertEqual(len(load_cached(path, cache)), 2)
+            self.assertEqual(len(os.listdir(cache.directory)), 1)
+            self.assertEqual(load_cached(path, cache)[1].employee_name, "Maria")
+
+
+class TestBench(unittest.TestCase):
+
+    def test_generated_workbook_loads(self):
+        import os
+        import tempfile
+        from bench import generate_workbook
+        from io_excel import load_batch, load_excel
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "synthetic.xlsx")
+            generate_workbook(path, 60, employees=7, permit_density=1.0, missing_rate=0.0)
+            records = calculate_all(load_excel(path), Config())
+            self.assertEqual(len(records), 60)
+            self.assertEqual(len({r.employee_id for r in records}), 7)
+            self.assertTrue(all(r.entry is not None and r.exit is not None for r in records))
+            self.assertTrue(all(len(r.permits) in (2, 4) for r in records))
+            self.assertTrue(all(r.net_worked > 0 for r in records))
+
+            generate_workbook(path, 61, sheets=3, employees=7)
+            batch = load_batch(path)
+            self.assertEqual(len(batch), 61)
+            self.assertEqual(sorted(set(batch.text["sheet"])), ["Planta 1", "Planta 2", "Planta 3"])
+
+    def test_compare_to_baseline(self):
+        from bench import compare_to_baseline
+        baseline = [{"size": 10, "stage": "load", "rows_per_second": 100.0},
+                    {"size": 10, "stage": "export", "rows_per_second": 100.0}]
+        results = [{"size": 10, "stage": "load", "rows_per_second": 70.0},
+                   {"size": 10, "stage": "export", "rows_per_second": 90.0},
+                   {"size": 99, "stage": "load", "rows_per_second": 1.0}]
+        regressions = compare_to_baseline(results, baseline, tolerance=0.2)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("load @ 10 rows", regressions[0])
+
+    def test_baseline_is_read_before_results_are_written(self):
+        import json
+        import os
+        import tempfile
+        from unittest import mock
+        import bench
+
+        startup = [{"module": "cli", "seconds": 0.05, "heavy_modules": []}]
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(bench, "run_startup_benchmarks", return_value=startup):
+            baseline = os.path.join(tmp, "bench.json")
+            saved = {"results": [], "startup": [dict(startup[0], seconds=0.0005)]}
+            with open(baseline, "w", encoding="utf-8") as f:
+                json.dump(saved, f)
+            self.assertEqual(bench.main(["--startup-only", "--baseline", baseline]), 1)
+            with open(baseline, encoding="utf-8") as f:
+                self.assertEqual(json.load(f), saved)
+
+            out = os.path.join(tmp, "run.json")
+            self.assertEqual(bench.main(["--startup-only", "--baseline", baseline,
+                                         "--output", out, "--tolerance", "1000"]), 0)
+            self.assertTrue(os.path.exists(out))
+            with self.assertRaises(SystemExit), mock.patch("sys.stderr"):
+                bench.main(["--startup-only", "--baseline", baseline, "--output", baseline])
+
+            throughput = [{"size": 10, "stage": "load", "rows_per_second": 100.0}]
+            with open(out, "w", encoding="utf-8") as f:
+                json.dump({"results": throughput, "startup": []}, f)
+            self.assertEqual(bench.main(["--startup-only", "--output", out]), 0)
+            with open(out, encoding="utf-8") as f:
+                written = json.load(f)
+            self.assertEqual(written["results"], throughput)
+            self.assertEqual(written["startup"], startup)
+
+            # Throughput kept from the output file is not compared with the baseline
+            with open(baseline, "w", encoding="utf-8") as f:
+                json.dump({"results": [dict(throughput[0], rows_per_second=10000.0)],
+                           "startup": startup}, f)
+            self.assertEqual(bench.main(["--startup-only", "--baseline", baseline,
+                                         "--output", out]), 0)
+            with open(out, encoding="utf-8") as f:
+                self.assertEqual(json.load(f)["results"], throughput)
+
+    def test_cli_starts_without_heavy_modules(self):
+        from bench import STARTUP_MODULES, compare_startup, run_startup_benchmarks
+        startup = run_startup_benchmarks(repeat=1)
+        self.assertEqual([r["module"] for r in startup], list(STARTUP_MODULES))
+        self.assertEqual([r["heavy_modules"] for r in startup], [[]] * len(STARTUP_MODULES))
+
+        baseline = [{"module": "cli", "seconds": 0.05, "heavy_modules": []}]
+        self.assertEqual(compare_startup(baseline, baseline, 0.2), [])
+        regressions = compare_startup(
+            [{"module": "cli", "seconds": 0.2, "heavy_modules": ["numpy"]}], baseline, 0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn("now loads numpy", regressions[1])
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        import metrics
+        metrics.reset()
+
+    def tearDown(self):
+        import metrics
+        metrics.disable()
+        metrics.reset()
+
+    def test_disabled_is_noop(self):
+        import metrics
+        metrics.disable()
+        with metrics.span("calculate", rows=10) as sp:
+            sp.add_rows(5)
+        self.assertEqual(metrics.summary(), [])
+
+    def test_spans_accumulate(self):
+        import metrics
+        metrics.enable()
+        calculate_all([TestCore()._make_record()] * 3, Config())
+        calculate_all([TestCore()._make_record()] * 2, Config())
+        (stage,) = metrics.summary()
+        self.assertEqual(stage["stage"], "calculate")
+        self.assertEqual(stage["calls"], 2)
+        self.assertEqual(stage["rows"], 5)
+        self.assertIsNone(stage["peak_memory_bytes"])
+
+    def test_memory_peak_and_json_dump(self):
+        import json
+        import os
+        import tempfile
+        import metrics
+
+        metrics.enable(memory=True)
+        with metrics.span("outer"):
+            with metrics.span("inner"):
+                block = bytearray(2 * 1024 * 1024)
+                del block
+        stages = {s["stage"]: s for s in metrics.summary()}
+        self.assertGreaterEqual(stages["inner"]["peak_memory_bytes"], 2 * 1024 * 1024)
+        self.assertGreaterEqual(stages["outer"]["peak_memory_bytes"], 2 * 1024 * 1024)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = metrics.dump_json(os.path.join(tmp, "metrics.json"))
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(len(json.load(f)["stages"]), 2)
+
+    def test_collectors_keep_sessions_apart(self):
+        """Spans go to the collector their thread installed; resetting one spares the rest."""
+        import threading
+        import metrics
+
+        metrics.enable()
+        sessions = [metrics.Collector(), metrics.Collector()]
+
+        def run(collector, rows):
+            with metrics.collecting(collector):
+                with metrics.span("calculate", rows=rows):
+                    pass
+
+        threads = [threading.Thread(target=run, args=(c, n)) for c, n in zip(sessions, (3, 5))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([c.summary()[0]["rows"] for c in sessions], [3, 5])
+        self.assertEqual(metrics.summary(), [])
+        with metrics.collecting(sessions[0]):
+            metrics.reset()
+        self.assertEqual([len(c.summary()) for c in sessions], [0, 1])
+
+    def test_batch_command_saves_worker_metrics(self):
+        import json
+        import os
+        import tempfile
+        import main
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("a.xlsx", "b.xlsx"):
+                _write_sample_workbook(os.path.join(tmp, name))
+            path = os.path.join(tmp, "metrics.json")
+            code = main.main(["--metrics", "--metrics-file", path, "batch", tmp,
+                              "-o", os.path.join(tmp, "out"), "-w", "2"])
+            self.assertEqual(code, 0)
+            with open(path, encoding="utf-8") as f:
+                stages = {s["stage"]: s for s in json.load(f)["stages"]}
+        for stage in ("load", "calculate", "export"):
+            self.assertEqual(stages[stage]["calls"], 2)
+            self.assertEqual(stages[stage]["rows"], 4)
+
+
+class TestRecordIndex(unittest.TestCase):
+
+    def _make_index(self):
+        from recordindex import RecordIndex
+        records = [AttendanceRecord(employee_id=e, date=d) for e, d in [
+            ("7", "03/01/2024"), ("5", "01/01/2024"), ("7", "01/01/2024"),
+            ("7", "03/01/2024"), ("5", "sin fecha"), ("7", "02/01/2024"),
+        ]]
+        return RecordIndex.from_records(RecordBatch.from_records(records))
+
+    def test_find_and_range(self):
+        from datetime import date
+        index = self._make_index()
+        self.assertEqual(index.find("7", "03/01/2024").tolist(), [0, 3])
+        self.assertEqual(index.find("7", date(2024, 1, 2)).tolist(), [5])
+        self.assertEqual(index.find("9", "03/01/2024").tolist(), [])
+        self.assertEqual(index.range("7", "02/01/2024").tolist(), [5, 0, 3])
+        self.assertEqual(index.range("5").tolist(), [4, 1])
+        self.assertEqual(index.range(end=date(2024, 1, 2)).tolist(), [1, 2, 5])
+        self.assertEqual(index.range(start="fecha mala").tolist(), [])
+        self.assertEqual(index.employee_ids(), ["5", "7"])
+        self.assertEqual(index.date_range(), (date(2024, 1, 1), date(2024, 1, 3)))
+
+    def test_update_rekeys_record(self):
+        from datetime import date
+        index = self._make_index()
+        index.update(3, "7", "03/01/2024")  # unchanged key
+        index.update(1, "8", "02/01/2024")
+        self.assertEqual(index.range("5").tolist(), [4])
+        self.assertEqual(index.find("8", "02/01/2024").tolist(), [1])
+        self.assertEqual(index.range(start=date(2024, 1, 2), end=date(2024, 1, 2)).tolist(), [1, 5])
+        index.update(4, "5", "05/01/2024")
+        self.assertEqual(index.date_range(), (date(2024, 1, 1), date(2024, 1, 5)))
+        index.update(4, "8", "05/01/2024")
+        self.assertNotIn("5", index.employee_ids())
+        self.assertEqual(index.range("8").tolist(), [1, 4])
+
+
+class TestTableView(unittest.TestCase):
+
+    def _make_view(self):
+        from columnar import PunchColumns, compute
+        from tableview import TableView
+        rows = [("3", "02/01/2024", "Luis", "08:00", "18:00"),
+                ("1", "01/01/2024", "Ana", "08:00", "17:00"),
+                ("2", "03/01/2024", "Beto", "07:00", "18:30"),
+                ("1", "03/01/2024", "Ana", "09:00", "17:00"),
+                ("2", "xx", "Beto", None, None)]
+        records = []
+        for employee_id, day, name, entry, exit_t in rows:
+            rec = AttendanceRecord(employee_id=employee_id, date=day, employee_name=name)
+            rec.entry, rec.exit = parse_time(entry), parse_time(exit_t)
+            records.append(rec)
+        batch = RecordBatch.from_records(records)
+        view = TableView(batch)
+        results = compute(PunchColumns.from_batch(batch), Config())
+        results.update(zip(WEEKLY_FIELDS, view.weeks.tiers(results["overtime"], 60)))
+        return view, results
+
+    def test_filter(self):
+        from datetime import date
+        view, _ = self._make_view()
+        self.assertEqual(view.filter().tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(view.filter(employees=["Ana"]).tolist(), [1, 3])
+        self.assertEqual(view.filter(ids=["2", "9"]).tolist(), [2, 4])
+        self.assertEqual(view.filter(start=date(2024, 1, 2), end=date(2024, 1, 3)).tolist(), [0, 2, 3])
+        self.assertEqual(view.date_range(), (date(2024, 1, 1), date(2024, 1, 3)))
+        self.assertEqual(view.filter(ids=["2"], issues_only=True).tolist(), [])
+
+    def test_sort_is_stable_both_ways(self):
+        view, results = self._make_view()
+        rows = view.filter()
+        self.assertEqual(view.sort(rows, "Empleado", results).tolist(), [1, 3, 2, 4, 0])
+        self.assertEqual(view.sort(rows, "Empleado", results, descending=True).tolist(), [0, 2, 4, 1, 3])
+        self.assertEqual(view.sort(rows, "Horas Laboradas", results, descending=True).tolist(),
+                         [2, 0, 1, 3, 4])
+        with self.assertRaises(ValueError):
+            view.sort(rows, "Otra", results)
+
+    def test_page_materializes_only_requested_rows(self):
+        view, results = self._make_view()
+        rows = view.sort(view.filter(), "Entrada", results)
+        page = view.page(rows, results, page=1, page_size=2)
+        # Missing entries sort first; equal entries keep their input order
+        self.assertEqual(page.index.tolist(), [0, 1])
+        self.assertEqual(page["Empleado"].tolist(), ["Luis", "Ana"])
+        self.assertEqual(page["Entrada"].tolist(), ["08:00", "08:00"])
+        self.assertEqual(page["Horas Laboradas"].tolist(), [10.0, 9.0])
+        self.assertEqual(page["Extra Dobles"].tolist(), [1.0, 1.0])
+        self.assertEqual(page["Extra Triples"].tolist(), [1.0, 0.0])
+        totals = view.employee_totals(results)
+        self.assertEqual(totals.loc["Ana", "Horas Laboradas"], 17.0)
+
+
+class TestPeriods(unittest.TestCase):
+
+    def _make_records(self):
+        rows = [("2", "Beto", "16/01/2024", "08:00", "18:00"),
+                ("1", "Ana", "01/01/2024", "08:00", "17:00"),
+                ("1", "Ana", "07/01/2024", "08:00", "16:00"),
+                ("1", "Ana", "08/01/2024", "08:00", "17:30"),
+                ("2", "Beto", "15/01/2024", "09:00", "17:00"),
+                ("1", "Ana", "sin fecha", "08:00", "17:00")]
+        records = []
+        for employee_id, name, day, entry, exit_t in rows:
+            rec = AttendanceRecord(employee_id=employee_id, employee_name=name, date=day)
+            rec.entry, rec.exit = parse_time(entry), parse_time(exit_t)
+            records.append(rec)
+        return calculate_all(records, Config())
+
+    def test_period_bounds(self):
+        import numpy as np
+        from periods import period_start, period_end
+        dates = np.array(["2024-01-07", "2024-01-08", "2024-01-15", "2024-01-16", "2024-02-29"],
+                         dtype="datetime64[D]")
+        self.assertEqual(period_start(dates, "week").astype(str).tolist(),
+                         ["2024-01-01", "2024-01-08", "2024-01-15", "2024-01-15", "2024-02-26"])
+        starts = period_start(dates, "quincena")
+        self.assertEqual(starts.astype(str).tolist(),
+                         ["2024-01-01", "2024-01-01", "2024-01-01", "2024-01-16", "2024-02-16"])
+        self.assertEqual(period_end(starts, "quincena").astype(str).tolist(),
+                         ["2024-01-15", "2024-01-15", "2024-01-15", "2024-01-31", "2024-02-29"])
+        with self.assertRaises(ValueError):
+            period_start(dates, "mes")
+
+    def test_summarize_groups_by_employee_and_period(self):
+        from periods import summarize
+        records = self._make_records()
+        week = summarize(records, "week")
+        self.assertEqual(week["employee_id"].tolist(), ["1", "1", "2"])
+        self.assertEqual(week["period_start"].astype(str).tolist(),
+                         ["2024-01-01", "2024-01-08", "2024-01-15"])
+        self.assertEqual(week["days"].tolist(), [2, 1, 2])
+        self.assertEqual(week["net_worked"].tolist(), [17 * 60, 9.5 * 60, 18 * 60])
+        self.assertEqual(week["overtime"].tolist(), [60, 90, 120])
+
+        quincena = summarize(RecordBatch.from_records(records), "quincena")
+        self.assertEqual(quincena["employee_name"].tolist(), ["Ana", "Beto", "Beto"])
+        self.assertEqual(quincena["period_end"].astype(str).tolist(),
+                         ["2024-01-15", "2024-01-15", "2024-01-31"])
+        self.assertEqual(quincena["net_worked"].tolist(), [26.5 * 60, 8 * 60, 10 * 60])
+        self.assertEqual(len(summarize([], "week")["days"]), 0)
+
+
+    def test_weekly_overtime_tiers(self):
+        import numpy as np
+        from periods import WeeklyOvertime
+        ids = ["1", "1", "2", "1", "1", "1", "1"]
+        dates = np.array(["2024-01-03", "2024-01-01", "2024-01-01", "2024-01-02", "2024-01-08",
+                          "NaT", "2024-01-03"], dtype="datetime64[D]")
+        overtime = np.array([240.0, 200.0, 600.0, 150.0, 90.0, 700.0, 30.0])
+        double, triple = WeeklyOvertime(ids, dates).tiers(overtime, 540)
+        # Employee 1, first week: Monday 200, Tuesday 150, then Wednesday 240 and 30 in input order
+        self.assertEqual(double.tolist(), [190.0, 200.0, 540.0, 150.0, 90.0, 540.0, 0.0])
+        self.assertEqual(triple.tolist(), [50.0, 0.0, 60.0, 0.0, 0.0, 160.0, 30.0])
+
+    def test_calculate_all_splits_weekly_overtime(self):
+        from periods import summarize
+        config = Config()
+        config.weekly_double_overtime = 60
+        for engine in ("python", "numpy"):
+            results = calculate_all(self._make_records(), config, engine=engine)
+            self.assertEqual([r.overtime_double for r in results], [60, 60, 0, 60, 0, 60])
+            self.assertEqual([r.overtime_triple for r in results], [60, 0, 0, 30, 0, 0])
+        batch = calculate_all(RecordBatch.from_records(self._make_records()), config)
+        self.assertEqual([r.overtime_triple for r in batch], [60, 0, 0, 30, 0, 0])
+        week = summarize(batch, "week")
+        self.assertEqual(week["overtime_double"].tolist(), [60, 60, 60])
+        self.assertEqual(week["overtime_triple"].tolist(), [0, 30, 60])
+
+
+class TestScenarios(unittest.TestCase):
+
+    def _variants(self):
+        meal = Config()
+        meal.meal_threshold = 45
+        ceil = Config()
+        ceil.rounding_mode, ceil.rounding_minutes = "ceil", 30
+        return {"Comida 45": meal, "Techo 30": ceil}
+
+    def test_scenarios_match_separate_runs(self):
+        from scenarios import BASELINE, evaluate_scenarios
+        records = TestPeriods()._make_records()
+        scenarios = self._variants()
+        evaluated = evaluate_scenarios(RecordBatch.from_records(records), Config(), scenarios)
+        self.assertEqual(list(evaluated), [BASELINE, "Comida 45", "Techo 30"])
+        for name, config in [(BASELINE, Config())] + list(scenarios.items()):
+            expected = calculate_all(TestPeriods()._make_records(), config)
+            for field in ("net_worked", "overtime", "overtime_double", "overtime_triple"):
+                self.assertEqual(evaluated[name][field].tolist(),
+                                 [getattr(r, field) for r in expected], (name, field))
+        # Stages no scenario parameter touches are computed once
+        self.assertIs(evaluated["Techo 30"]["net_worked"], evaluated[BASELINE]["net_worked"])
+        with self.assertRaises(ValueError):
+            evaluate_scenarios(records, Config(), {BASELINE: Config()})
+
+    def test_comparison_table(self):
+        import json
+        import os
+        import tempfile
+        from scenarios import TOTAL_ID, compare_scenarios, load_scenarios
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "escenarios.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"Techo 45": {"rounding_mode": "ceil", "rounding_minutes": 45}}, f)
+            scenarios = load_scenarios(path, Config())
+        self.assertEqual(scenarios["Techo 45"].rounding_minutes, 45)
+
+        table = compare_scenarios(TestPeriods()._make_records(), Config(), scenarios)
+        self.assertEqual(table.loc[("Base", "1"), "HORAS EXTRA"], 3.5)
+        self.assertEqual(table.loc[("Techo 45", "1"), "HORAS EXTRA"], 4.5)
+        self.assertEqual(table.loc[("Techo 45", "1"), "Δ HORAS EXTRA"], 1.0)
+        self.assertEqual(table.loc[("Techo 45", TOTAL_ID), "Δ HORAS EXTRA"], 1.25)
+        self.assertEqual(table.loc[("Techo 45", "2"), "EMPLEADO"], "Beto")
+        self.assertEqual(table.loc[("Base", TOTAL_ID), "Δ TIEMPO LABORADO"], 0.0)
+
+
+class TestStore(unittest.TestCase):
+
+    def test_menu_exit_stays_on_option_7(self):
+        """Typing 7 still exits the menu and never writes to the store."""
+        from unittest import mock
+        import cli
+        import store
+
+        with mock.patch.object(cli.Prompt, "ask", side_effect=["7"]), \
+                mock.patch.object(store, "AttendanceStore") as opened, \
+                mock.patch.object(cli.metrics, "dump_json", return_value=None), \
+                mock.patch.object(cli, "console"):
+            cli.run_cli()
+        opened.assert_not_called()
+
+    def _results(self, records):
+        return {(r.employee_id, r.date): (r.net_worked, r.overtime, r.overtime_double,
+                                          r.overtime_triple) for r in records}
+
+    def test_append_query_and_reopen(self):
+        import os
+        import tempfile
+        from store import AttendanceStore
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "asistencias.sqlite3")
+            with AttendanceStore(path) as store:
+                counts = store.append(TestPeriods()._make_records(), Config())
+                self.assertEqual(counts, {"inserted": 5, "updated": 0, "unchanged": 0, "skipped": 1})
+            with AttendanceStore(path) as store:
+                self.assertEqual(len(store), 5)
+                counts = store.append(RecordBatch.from_records(TestPeriods()._make_records()),
+                                      Config())
+                self.assertEqual(counts["unchanged"], 5)
+                stored = store.query()
+                expected = calculate_all(TestPeriods()._make_records()[:5], Config())
+                self.assertEqual(self._results(stored), self._results(expected))
+                self.assertEqual([r.date for r in store.query("1", "02/01/2024")],
+                                 ["07/01/2024", "08/01/2024"])
+                self.assertEqual(len(store.query(["1", "2"], end=datetime(2024, 1, 7).date())), 2)
+                self.assertEqual(store.employee_ids(), ["1", "2"])
+                self.assertEqual(store.date_range()[1].day, 16)
+                with self.assertRaises(ValueError):
+                    store.query(start="mañana")
+
+    def test_changed_day_updates_its_week(self):
+        from store import AttendanceStore
+        config = Config()
+        config.weekly_double_overtime = 60
+        store = AttendanceStore(":memory:")
+        store.append(TestPeriods()._make_records(), config)
+        tuesday = self._results(store.query("2", "16/01/2024"))[("2", "16/01/2024")]
+        self.assertEqual(tuesday[2:], (60.0, 60.0))
+
+        monday = TestPeriods()._make_records()[4]
+        monday.exit = parse_time("18:00")
+        self.assertEqual(store.append([monday], config),
+                         {"inserted": 0, "updated": 1, "unchanged": 0, "skipped": 0})
+        week = self._results(store.query("2"))
+        # Monday's new overtime now fills the double tier first
+        self.assertEqual(week[("2", "15/01/2024")], (540.0, 60.0, 60.0, 0.0))
+        self.assertEqual(week[("2", "16/01/2024")], (600.0, 120.0, 0.0, 120.0))
+
+    def test_recalculate_only_other_configs(self):
+        from store import AttendanceStore
+        store = AttendanceStore(":memory:")
+        store.append(TestPeriods()._make_records(), Config())
+        ceil = Config()
+        ceil.rounding_mode, ceil.rounding_minutes = "ceil", 60
+        self.assertEqual(store.recalculate(ceil), 5)
+        self.assertEqual(store.recalculate(ceil), 0)
+        expected = calculate_all(TestPeriods()._make_records()[:5], ceil)
+        self.assertEqual(self._results(store.query()), self._results(expected))
+
+
+class TestPunches(unittest.TestCase):
+
+    HEADER = ["ID", "EMPLEADO", "FECHA Y HORA", "DISPOSITIVO"]
+
+    def _rows(self):
+        # Shuffled on purpose: logs interleave employees and terminals
+        return [
+            ["1", "Ana", "2024-01-15 13:00:00", "T1"],
+            ["2", "Beto", "2024-01-15 22:00:00", "T2"],
+            ["1", "Ana", "2024-01-15 08:00:00", "T1"],
+            ["1", "Ana", "2024-01-15 08:00:30", "T1"],  # double tap, dropped
+            ["1", "Ana", "2024-01-15 17:00:00", "T1"],
+            ["1", "Ana", "2024-01-15 14:00:00", "T1"],
+            ["2", "Beto", "2024-01-16 04:00:00", "T2"],
+            ["1", "Ana", "16/01/2024 09:00", "T1"],
+            ["", "Nadie", "2024-01-15 09:00:00", "T1"],  # no ID, skipped
+            ["3", "Caro", "sin hora", "T1"],  # unparseable, skipped
+        ]
+
+    def test_detects_punch_logs(self):
+        from punches import is_punch_log
+        self.assertTrue(is_punch_log(self.HEADER))
+        self.assertTrue(is_punch_log(["id", "Fecha", "Hora"]))
+        self.assertFalse(is_punch_log(["ID", "EMPLEADO", "FECHA", "ENTRADA", "SALIDA"]))
+
+    def test_daily_slots(self):
+        from punches import load_punch_batch
+        batch = load_punch_batch(self.HEADER, self._rows())
+        records = list(batch)
+        self.assertEqual([(r.employee_id, r.date) for r in records],
+                         [("1", "15/01/2024"), ("1", "16/01/2024"),
+                          ("2", "15/01/2024"), ("2", "16/01/2024")])
+        ana = records[0]
+        self.assertEqual((ana.entry.hour, ana.meal_out.hour, ana.meal_in.hour, ana.exit.hour),
+                         (8, 13, 14, 17))
+        self.assertIsNone(ana.dinner_out)
+        # A single punch is only an entry
+        self.assertEqual(records[1].entry.hour, 9)
+        self.assertIsNone(records[1].exit)
+        # Without day_start the overnight shift is split across two days
+        self.assertIsNone(records[2].exit)
+
+    def test_overnight_shift_and_permits(self):
+        from punches import load_punch_batch
+        rows = self._rows() + [["1", "Ana", f"2024-01-15 {t}:00", "T1"]
+                               for t in ("15:00", "16:00", "16:30")]
+        batch = load_punch_batch(self.HEADER, rows, day_start=5 * 60)
+        records = list(batch)
+        self.assertEqual(len(records), 3)
+        beto = records[2]
+        self.assertEqual((beto.date, beto.entry.hour, beto.exit.hour), ("15/01/2024", 22, 4))
+        self.assertGreater(beto.exit, beto.entry)
+        ana = records[0]
+        self.assertEqual((ana.dinner_out.hour, ana.dinner_in.hour), (15, 16))
+        self.assertEqual([(p.hour, p.minute) for p in ana.permits], [(16, 30)])
+        self.assertEqual(ana.exit.hour, 17)
+
+    def test_split_date_and_time_columns(self):
+        from punches import load_punch_batch
+        rows = [["7", "Eva", "15/01/2024", "08:00"], ["7", "Eva", "15/01/2024", "16:30"]]
+        (record,) = load_punch_batch(["ID", "EMPLEADO", "FECHA", "HORA"], rows)
+        self.assertEqual((record.entry.hour, record.exit.hour, record.exit.minute), (8, 16, 30))
+
+    def test_spilled_runs_match_in_memory_sort(self):
+        import random
+        from punches import load_punch_batch
+        rng = random.Random(3)
+        rows = [[str(rng.randrange(40)), "E", f"2024-01-{rng.randrange(1, 8):02d} "
+                 f"{rng.randrange(24):02d}:{rng.randrange(60):02d}:00", "T1"] for _ in range(3000)]
+        in_memory = load_punch_batch(self.HEADER, rows)
+        spilled = load_punch_batch(self.HEADER, rows, run_size=500)
+        self.assertEqual(spilled.text, in_memory.text)
+        for name in in_memory.punches:
+            self.assertEqual(spilled.punches[name], in_memory.punches[name])
+        self.assertEqual(spilled.permit_values, in_memory.permit_values)
+        self.assertEqual(spilled.permit_offsets, in_memory.permit_offsets)
+
+    def test_load_batch_reads_punch_csv(self):
+        import csv
+        import os
+        import tempfile
+        from io_excel import load_batch
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "checadas.csv")
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerows([self.HEADER] + self._rows())
+            batch = load_batch(path)
+        self.assertEqual(len(batch), 4)
+        records = calculate_all(list(batch), Config())
+        # 08:00-17:00; a meal within the threshold deducts 30 minutes
+        self.assertEqual(records[0].net_worked, 510)
+
+
+class TestService(unittest.TestCase):
+
+    RECORDS = [{"ID": "1", "EMPLEADO": "Ana", "FECHA": "15/01/2024", "ENTRADA": "08:00",
+                "SALIDA": "19:00"},
+               {"ID": "1", "EMPLEADO": "Ana", "FECHA": "16/01/2024", "ENTRADA": "08:00",
+                "SALIDA A COMER": "13:00", "REGRESO DE COMER": "13:30", "SALIDA": "18:00",
+                "PERMISO": "10:00, 10:30"}]
+
+    def _serve(self, test, **kwargs):
+        """Run ``test(service, request)`` against a service on a free port."""
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        from service import CalculationService
+
+        async def request(method, path, body=b""):
+            reader, writer = await asyncio.open_connection("127.0.0.1", service.port)
+            writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+                         "Connection: close\r\n\r\n".encode() + body)
+            head, _, payload = (await reader.read()).partition(b"\r\n\r\n")
+            writer.close()
+            lines = head.decode("latin-1").split("\r\n")
+            headers = dict(line.split(": ", 1) for line in lines[1:])
+            return int(lines[0].split()[1]), headers, payload
+
+        async def main():
+            await service.start("127.0.0.1", 0)
+            try:
+                await test(service, request)
+            finally:
+                await service.close()
+
+        with ThreadPoolExecutor(2) as executor:
+            service = CalculationService(executor=executor, **kwargs)
+            asyncio.run(main())
+
+    def test_calculate_matches_engine_and_batches(self):
+        import asyncio
+        import json
+        from io_excel import EXPORT_COLUMNS, export_row, iter_table
+
+        header = list(self.RECORDS[1])
+        records = calculate_all(
+            list(iter_table(header, [[r.get(k) for k in header] for r in self.RECORDS])), Config())
+        expected = [dict(zip(EXPORT_COLUMNS, export_row(r))) for r in records]
+        limit = Config()
+        limit.weekly_double_overtime = 60
+        limited_expected = dict(zip(EXPORT_COLUMNS, export_row(
+            calculate_all(list(iter_table(list(self.RECORDS[0]), [list(self.RECORDS[0].values())])),
+                          limit)[0])))
+
+        async def test(service, request):
+            body = json.dumps({"records": self.RECORDS}).encode()
+            answers = await asyncio.gather(*(request("POST", "/calculate", body)
+                                             for _ in range(8)))
+            for status, _, payload in answers:
+                self.assertEqual(status, 200)
+                self.assertEqual(json.loads(payload)["records"], expected)
+            self.assertLess(service.batches, 8)
+
+            # Weekly tiers are split per request, not across the batch
+            limited = json.dumps({"config": {"weekly_double_overtime": 60},
+                                  "records": self.RECORDS[:1]}).encode()
+            answers = await asyncio.gather(*(request("POST", "/calculate", limited)
+                                             for _ in range(2)))
+            for status, _, payload in answers:
+                self.assertEqual(json.loads(payload)["records"], [limited_expected])
+
+            status, _, payload = await request("GET", "/health")
+            health = json.loads(payload)
+            self.assertEqual(health["endpoints"]["/calculate"]["requests"], 10)
+            self.assertEqual(health["endpoints"]["/calculate"]["rows"], 18)
+            self.assertIn("p95", health["endpoints"]["/calculate"]["latency_ms"])
+
+        self._serve(test)
+
+    def test_export_csv_and_errors(self):
+        import csv
+        import io
+        import json
+
+        async def test(service, request):
+            source = io.StringIO()
+            writer = csv.DictWriter(source, fieldnames=list(self.RECORDS[1]))
+            writer.writeheader()
+            writer.writerows(self.RECORDS)
+            status, headers, payload = await request(
+                "POST", "/export?input=csv&format=csv&meal_threshold=45",
+                source.getvalue().encode())
+            self.assertEqual((status, headers["Content-Type"]), (200, "text/csv"))
+            rows = list(csv.DictReader(io.StringIO(payload.decode("utf-8-sig"))))
+            self.assertEqual([r["FECHA"] for r in rows], ["15/01/2024", "16/01/2024"])
+
+            self.assertEqual((await request("GET", "/nada"))[0], 404)
+            self.assertEqual((await request("GET", "/calculate"))[0], 405)
+            self.assertEqual((await request("POST", "/calculate", b"{"))[0], 400)
+            bad = json.dumps({"config": {"nada": 1}, "records": []}).encode()
+            self.assertEqual((await request("POST", "/calculate", bad))[0], 400)
+
+            service.pending = service.max_pending
+            status, headers, _ = await request("POST", "/export?input=csv&format=csv", b"")
+            self.assertEqual((status, headers["Retry-After"]), (503, "1"))
+
+        self._serve(test, max_pending=4)
+
+
+class TestValidation(unittest.TestCase):
+
+    CSV = ("ID,FECHA,EMPLEADO,ENTRADA,SALIDA,PERMISO\n"
+           "1,01/01/2024,Ana,8:61x,17:00,\n"
+           "2,01/01/2024,Beto,08:00,17:00,\"10:00-1O:30, \"\n"
+           "3,02/01/2024,Ana,,17:00,\n"
+           "4,02/01/2024,Luis,08:00,17:00,10:00-10:30\n")
+
+    def _record(self, *punches, permits=()):
+        rec = AttendanceRecord(employee_id="1", date="01/01/2024")
+        for name, value in zip(PUNCH_FIELDS, punches):
+            setattr(rec, name, parse_time(value))
+        rec.permits = [parse_time(p) for p in permits]
+        return rec
+
+    def test_issue_codes(self):
+        import validation as v
+        records = [
+            self._record("08:00", "13:00", "14:00", None, None, "17:00",
+                         permits=("10:00", "10:30")),
+            self._record("08:00", "14:00", "13:00", None, None, "17:00"),
+            self._record("08:00", "07:00", "13:00", None, None, "17:00"),
+            self._record("08:00", "13:00", "14:00", None, None, "13:30"),
+            self._record("08:00", "13:00", "14:00", "20:00", "19:00", "22:00"),
+            self._record("08:00", "13:00", None, None, None, "17:00"),
+            self._record("08:00", None, None, None, None, "17:00", permits=("10:00",)),
+            self._record(None, None, None, None, None, "17:00"),
+            self._record(),
+            self._record("08:00", None, None, None, None, "17:00"),
+        ]
+        records[-1].invalid_cells = 1
+        expected = [0, v.MEAL_REVERSED, v.OUT_OF_ORDER, v.OUT_OF_ORDER, v.DINNER_REVERSED,
+                    v.INCOMPLETE_BREAK, v.ODD_PERMITS, v.MISSING_ENTRY_EXIT, 0, v.UNPARSED_CELL]
+        self.assertEqual(v.validate(records).tolist(), expected)
+        self.assertEqual(v.validate(RecordBatch.from_records(records)).tolist(), expected)
+        self.assertEqual(v.validate(RecordBatch()).tolist(), [])
+        self.assertEqual(v.summarize(v.validate(records[:3])),
+                         {v.OUT_OF_ORDER: 1, v.MEAL_REVERSED: 1})
+        self.assertEqual(v.describe(v.UNPARSED_CELL | v.ODD_PERMITS),
+                         "Celda con hora no reconocida; Número impar de permisos")
+
+    def test_unparsed_cells_are_kept_from_load(self):
+        import io
+        from io_excel import load_batch
+        from validation import MISSING_ENTRY_EXIT, ODD_PERMITS, UNPARSED_CELL, validate
+        batch = load_batch(io.BytesIO(self.CSV.encode()), ".csv")
+        # Bit 0 is the entry cell and bit 6 the permits; blank cells are not flagged
+        self.assertEqual(batch.invalid_cells.tolist(), [1, 64, 0, 0])
+        self.assertEqual(validate(batch).tolist(), [UNPARSED_CELL | MISSING_ENTRY_EXIT,
+                                                    UNPARSED_CELL | ODD_PERMITS,
+                                                    MISSING_ENTRY_EXIT, 0])
+        restored = RecordBatch.from_bytes(batch.to_bytes())
+        self.assertEqual(restored.invalid_cells.tolist(), [1, 64, 0, 0])
+        self.assertEqual(restored[1].to_record().invalid_cells, 64)
+
+    def test_export_anomaly_sheet(self):
+        import io
+        from openpyxl import load_workbook
+        from io_excel import ANOMALY_COLUMNS, ANOMALY_SHEET, export_excel, load_batch
+        batch = calculate_all(load_batch(io.BytesIO(self.CSV.encode()), ".csv"), Config())
+        buffer = io.BytesIO()
+        export_excel(batch, buffer, summaries=False)
+        workbook = load_workbook(buffer, read_only=True)
+        self.assertEqual(workbook.sheetnames, ["Sheet1", ANOMALY_SHEET])
+        rows = list(workbook[ANOMALY_SHEET].iter_rows(values_only=True))
+        self.assertEqual(rows[1], ("Celda con hora no reconocida", 1, 2))
+        self.assertEqual(rows[5], tuple(ANOMALY_COLUMNS))
+        self.assertEqual(rows[6][:6], (2, "1", "01/01/2024", "Ana", None, 65))
+        self.assertEqual([row[0] for row in rows[6:]], [2, 3, 4])
+
+        buffer = io.BytesIO()
+        export_excel(batch, buffer, summaries=False, anomalies=False)
+        self.assertEqual(load_workbook(buffer, read_only=True).sheetnames, ["Sheet1"])
+
+
+class TestXlsxReader(unittest.TestCase):
+
+    def test_rows_match_openpyxl(self):
+        """Values, gaps and sheet order match openpyxl's read-only values."""
+        import io
+        from datetime import time, timedelta
+        from openpyxl import Workbook, load_workbook
+        from xlsxreader import XlsxReader
+
+        wb = Workbook()
+        first = wb.active
+        first.title = "Norte"
+        first.append(["ID", "FECHA", "ENTRADA", "HORAS", "ACTIVO", "NOTA"])
+        first.append(["1", datetime(2024, 1, 5), time(8, 0, 30), 1.5, True, "=1+1"])
+        first.append([2, "06/01/2024", "08:15", 3, False, None])
+        first["C3"].number_format = "[h]:mm"
+        first["C3"].value = timedelta(hours=30)
+        first["H7"] = "lejos"
+        second = wb.create_sheet("Sur")
+        second["B3"] = "sola"
+        wb.active = 1
+        buffer = io.BytesIO()
+        wb.save(buffer)
+        data = buffer.getvalue()
+
+        expected = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+        with XlsxReader(data) as book:
+            self.assertEqual(book.sheet_names, expected.sheetnames)
+            self.assertEqual(book.active, "Sur")
+            for name in book.sheet_names:
+                sheet = expected[name]
+                sheet.reset_dimensions()
+                rows = [tuple(row) for row in sheet.iter_rows(values_only=True)]
+                self.assertEqual(list(book.iter_rows(name)), rows)
+                self.assertEqual(list(book.iter_rows(name, max_row=1)), rows[:1])
+            self.assertEqual(list(book.iter_rows("Norte"))[2][2], timedelta(hours=30))
+
+
 class TestIOExcel(unittest.TestCase):
 
     def test_round_trip(self):
@@ -260,6 +1462,227 @@ class TestIOExcel(unittest.TestCase):
                 if os.path.exists(f):
                     os.remove(f)
 
+    def test_export_layout_only_grows_at_the_end(self):
+        """Consumers read exports by position: the original columns keep their place."""
+        from io_excel import EXPORT_COLUMNS, export_row
+        original = ["ID", "FECHA", "EMPLEADO", "ENTRADA", "SALIDA A COMER", "REGRESO DE COMER",
+                    "SALIDA A CENAR", "REGRESO DE CENAR", "SALIDA", "PERMISO",
+                    "TIEMPO LABORADO", "HORAS EXTRA", "DESCUENTO COMIDAS", "DESCUENTO PERMISOS"]
+        self.assertEqual(EXPORT_COLUMNS[:len(original)], original)
+        self.assertEqual(EXPORT_COLUMNS[len(original):],
+                         ["HORAS EXTRA DOBLES", "HORAS EXTRA TRIPLES", "HOJA"])
+        rec = calculate_record(TestCore()._make_record("08:00", "17:37"), Config())
+        rec.sheet = "Norte"
+        row = dict(zip(EXPORT_COLUMNS, export_row(rec)))
+        self.assertEqual((row["TIEMPO LABORADO"], row["HOJA"]), (9.62, "Norte"))
+
+    def test_export_streams_from_generator(self):
+        """export_excel accepts any iterable and keeps the column layout."""
+        import os
+        import tempfile
+        from openpyxl import load_workbook
+        from io_excel import export_excel, EXPORT_COLUMNS, SUMMARY_COLUMNS, SUMMARY_SHEETS
+
+        def dated(rec):
+            rec.date = "03/01/2024"
+            return rec
+
+        records = (calculate_record(dated(TestCore()._make_record("08:00", "17:37")), Config())
+                   for _ in range(3))
+        tmp_out = os.path.join(tempfile.gettempdir(), "test_stream_out.xlsx")
+        try:
+            export_excel(records, tmp_out)
+            rows = list(load_workbook(tmp_out, read_only=True).active.iter_rows(values_only=True))
+            self.assertEqual(list(rows[0]), EXPORT_COLUMNS)
+            self.assertEqual(len(rows), 4)
+            self.assertEqual(rows[1][EXPORT_COLUMNS.index("TIEMPO LABORADO")], 9.62)
+            self.assertEqual(rows[1][EXPORT_COLUMNS.index("HORAS EXTRA")], 1.62)
+
+            workbook = load_workbook(tmp_out, read_only=True)
+            self.assertEqual(workbook.sheetnames, ["Sheet1"] + list(SUMMARY_SHEETS.values()))
+            weekly = list(workbook[SUMMARY_SHEETS["week"]].iter_rows(values_only=True))
+            self.assertEqual(list(weekly[0]), SUMMARY_COLUMNS)
+            self.assertEqual(weekly[1][SUMMARY_COLUMNS.index("DÍAS")], 3)
+            self.assertEqual(weekly[1][SUMMARY_COLUMNS.index("TIEMPO LABORADO")], 28.85)
+            workbook.close()
+            export_excel([], tmp_out, summaries=False)
+            self.assertEqual(load_workbook(tmp_out, read_only=True).sheetnames, ["Sheet1"])
+        finally:
+            if os.path.exists(tmp_out):
+                os.remove(tmp_out)
+
+    def test_csv_and_parquet_round_trip(self):
+        """Every format loads with COLUMN_MAP semantics and exports EXPORT_COLUMNS."""
+        import os
+        import tempfile
+        from io_excel import load_records, export_records, load_batch, EXPORT_COLUMNS
+
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "in.xlsx")
+            _write_sample_workbook(source)
+            expected = calculate_all(load_records(source), Config())
+            for ext in (".csv", ".parquet"):
+                path = os.path.join(tmp, "out" + ext)
+                export_records(expected, path)
+                reloaded = calculate_all(load_batch(path), Config())
+                self.assertEqual(len(reloaded), 2)
+                for a, b in zip(expected, reloaded):
+                    self.assertEqual(a.employee_id, b.employee_id)
+                    self.assertEqual(a.entry, b.entry)
+                    self.assertEqual(a.permits, b.permits)
+                    self.assertEqual(a.net_worked, b.net_worked)
+            with open(os.path.join(tmp, "out.csv"), encoding="utf-8") as f:
+                self.assertEqual(f.readline().strip().split(","), EXPORT_COLUMNS)
+            with self.assertRaises(ValueError):
+                load_records(os.path.join(tmp, "in.txt"))
+
+    def test_in_memory_round_trip(self):
+        """Every format loads from and exports to buffers, matching the file path results."""
+        import io
+        import os
+        import tempfile
+        from io_excel import load_records, export_records, load_batch
+
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, "in.xlsx")
+            _write_sample_workbook(source)
+            with open(source, "rb") as f:
+                data = f.read()
+            expected = calculate_all(load_records(source), Config())
+
+        self.assertEqual(
+            [r.entry for r in load_batch(memoryview(data), "xlsx")], [r.entry for r in expected]
+        )
+        for fmt in ("xlsx", "csv", "parquet"):
+            buffer = io.BytesIO()
+            export_records(expected, buffer, fmt)
+            self.assertFalse(buffer.closed)
+            buffer.seek(0)
+            reloaded = calculate_all(load_batch(buffer, "." + fmt), Config())
+            self.assertEqual([r.net_worked for r in reloaded], [r.net_worked for r in expected])
+            self.assertEqual([r.permits for r in reloaded], [r.permits for r in expected])
+        with self.assertRaises(ValueError):
+            load_records(io.BytesIO(data))
+
+    def test_multi_sheet_workbook(self):
+        """Every attendance sheet loads in order, tagged with its title."""
+        import io
+        from unittest import mock
+        from openpyxl import Workbook
+        import io_excel
+
+        wb = Workbook()
+        north = wb.active
+        north.title = "Norte"
+        north.append(["ID", "FECHA", "EMPLEADO", "ENTRADA", "SALIDA"])
+        north.append(["1", "15/01/2024", "Ana", "08:00", "17:00"])
+        north.append(["2", "15/01/2024", "Beto", "09:00", "18:30"])
+        wb.create_sheet("Notas").append(["Comentario"])
+        south = wb.create_sheet("Sur")
+        south.append(["ID", "FECHA", "EMPLEADO", "ENTRADA", "SALIDA", "HOJA"])
+        south.append(["3", "16/01/2024", "Caro", "07:00", "15:00", "Sur 2"])
+        south.append(["4", "16/01/2024", "Dani", "07:30", "16:00", None])
+        punches = wb.create_sheet("Reloj")
+        punches.append(TestPunches.HEADER)
+        for row in TestPunches()._rows():
+            punches.append(row)
+        buffer = io.BytesIO()
+        wb.save(buffer)
+        data = buffer.getvalue()
+
+        batch = io_excel.load_batch(data, "xlsx")
+        self.assertEqual(batch.text["sheet"],
+                         ["Norte", "Norte", "Sur 2", "Sur"] + ["Reloj"] * (len(batch) - 4))
+        self.assertEqual(batch.text["employee_id"][:4], ["1", "2", "3", "4"])
+        self.assertEqual(len(batch), 4 + len(io_excel.load_batch(
+            "\n".join(",".join(row) for row in [TestPunches.HEADER] + TestPunches()._rows())
+            .encode(), "csv")))
+        records = io_excel.load_records(io.BytesIO(data), "xlsx")
+        self.assertEqual([(r.sheet, r.entry) for r in records], [(r.sheet, r.entry) for r in batch])
+        self.assertEqual([r.sheet for r in io_excel.iter_file(data, "xlsx")], batch.text["sheet"])
+
+        with mock.patch.object(io_excel, "PARALLEL_SHEET_BYTES", 0):
+            parallel = io_excel.load_workbook_batch(data, workers=2)
+        self.assertEqual(parallel.to_bytes(), batch.to_bytes())
+
+        out = io.BytesIO()
+        io_excel.export_records(calculate_all(batch, Config()), out, "csv")
+        self.assertEqual(io_excel.load_batch(out.getvalue(), "csv").text["sheet"],
+                         batch.text["sheet"])
+
+    def test_iter_rows_reads_every_sheet(self):
+        """Excel rows come from every attendance sheet, whatever size the sheets declare."""
+        import io
+        import zipfile
+        from openpyxl import Workbook
+        from io_excel import iter_rows
+
+        wb = Workbook()
+        north = wb.active
+        north.title = "Norte"
+        north.append(["ID", "FECHA", "ENTRADA", "SALIDA"])
+        north.append(["1", "15/01/2024", "08:00", "17:00"])
+        north.append(["2", "15/01/2024", "09:00", "18:30"])
+        wb.create_sheet("Notas").append(["Comentario"])
+        south = wb.create_sheet("Sur")
+        south.append(["id", "fecha", "salida", "hoja", "empleado"])
+        south.append(["3", "16/01/2024", "15:00", "Sur 2", "Caro"])
+        south.append([None, None, None, None, None])
+        south.append(["4", "16/01/2024", "16:00", None, "Dani"])
+        buffer = io.BytesIO()
+        wb.save(buffer)
+
+        # A wrong <dimension> record must not cut rows off
+        tampered = io.BytesIO()
+        with zipfile.ZipFile(buffer) as src, zipfile.ZipFile(tampered, "w") as dst:
+            for item in src.infolist():
+                data = src.read(item.filename)
+                if item.filename == "xl/worksheets/sheet1.xml":
+                    data = data.replace(b'<dimension ref="A1:D3"', b'<dimension ref="A1:D2"')
+                dst.writestr(item, data)
+
+        rows = list(iter_rows(tampered.getvalue(), "xlsx"))
+        self.assertEqual(rows[0], ("ID", "FECHA", "ENTRADA", "SALIDA", "HOJA", "EMPLEADO"))
+        self.assertEqual(rows[1:], [
+            ("1", "15/01/2024", "08:00", "17:00", "Norte", None),
+            ("2", "15/01/2024", "09:00", "18:30", "Norte", None),
+            ("3", "16/01/2024", None, "15:00", "Sur 2", "Caro"),
+            ("4", "16/01/2024", None, "16:00", "Sur", "Dani"),
+        ])
+
+    def test_iter_excel_streams_records(self):
+        """Headers are normalized, blank rows skipped and records yielded lazily."""
+        import os
+        import tempfile
+        import types
+        from datetime import time
+        from openpyxl import Workbook
+        from io_excel import iter_excel
+
+        wb = Workbook()
+        ws = wb.active
+        ws.append([" id ", "Empleado", "entrada", "SALIDA", "PERMISO", "OTRA"])
+        ws.append([1042, "Ana", time(7, 30), "16:00", "10:00, 10:30", "x"])
+        ws.append([None, None, None, None, None, None])
+        ws.append(["7", "Luis", "08:15", None, None, None])
+        tmp_in = os.path.join(tempfile.gettempdir(), "test_stream.xlsx")
+        try:
+            wb.save(tmp_in)
+            stream = iter_excel(tmp_in)
+            self.assertIsInstance(stream, types.GeneratorType)
+            records = list(stream)
+            self.assertEqual(len(records), 2)
+            self.assertEqual(records[0].employee_id, "1042")
+            self.assertEqual(records[0].entry.hour, 7)
+            self.assertEqual(records[0].entry.minute, 30)
+            self.assertEqual(len(records[0].permits), 2)
+            self.assertEqual(records[1].employee_name, "Luis")
+            self.assertIsNone(records[1].exit)
+            self.assertEqual(records[1].date, "")
+        finally:
+            if os.path.exists(tmp_in):
+                os.remove(tmp_in)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,23 +1,54 @@
 """Utility functions for time parsing and formatting."""
 
-from datetime import datetime, timedelta
-from typing import List, Optional
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Optional, Sequence, Tuple
 import math
+import re
+
+import numpy as np
+
+import metrics
+
+# Reference instant for integer time stamps (the date strptime assigns to bare times)
+TIME_EPOCH = datetime(1900, 1, 1)
+# Sentinel stored in integer time columns when a punch is missing
+MISSING_TIME = -(2 ** 63)
+
+# Accepted text formats for time cells, in detection order
+TIME_FORMATS = ("%H:%M", "%H:%M:%S", "%I:%M %p", "%I:%M:%S %p")
+
+# Accepted text formats for the FECHA column (day first, as in the input files)
+DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%y")
+
+# Permit times are separated by commas; "-" joins the pairs written by export_excel
+_PERMIT_SEPARATORS = re.compile(r"[,-]")
+
+# Fixed-width layouts parsed with array arithmetic: (width, digit positions)
+_CLOCK_LAYOUTS = {
+    "%H:%M": (5, (0, 1, 3, 4)),
+    "%H:%M:%S": (8, (0, 1, 3, 4, 6, 7)),
+}
 
 
 def parse_time(value) -> Optional[datetime]:
-    """Parse a time value from various formats into a datetime object (date part is ignored)."""
+    """Parse a time value from various formats into a datetime object (date part is ignored).
+
+    Native values are rounded to the nearest second, the resolution of the
+    integer time columns (see to_seconds).
+    """
     if value is None:
         return None
     if isinstance(value, datetime):
-        return value
+        return _whole_second(value)
+    if isinstance(value, time):
+        return _whole_second(datetime.combine(TIME_EPOCH.date(), value))
     if isinstance(value, timedelta):
         base = datetime(1900, 1, 1)
-        return base + value
+        return _whole_second(base + value)
     s = str(value).strip()
     if not s or s.lower() == "nan":
         return None
-    for fmt in ("%H:%M", "%H:%M:%S", "%I:%M %p", "%I:%M:%S %p"):
+    for fmt in TIME_FORMATS:
         try:
             return datetime.strptime(s, fmt)
         except ValueError:
@@ -25,6 +56,85 @@ def parse_time(value) -> Optional[datetime]:
     return None
 
 
+def detect_time_format(values: Iterable) -> Optional[str]:
+    """Return the TIME_FORMATS entry matching the first parseable text value, if any."""
+    for value in values:
+        if not isinstance(value, str):
+            continue
+        s = value.strip()
+        if not s or s.lower() == "nan":
+            continue
+        for fmt in TIME_FORMATS:
+            try:
+                datetime.strptime(s, fmt)
+            except ValueError:
+                continue
+            return fmt
+    return None
+
+
+def _parse_clock_strings(text: List[str], fmt: str) -> List[Optional[datetime]]:
+    """Parse stripped strings with a single format; None where a string does not match."""
+    layout = _CLOCK_LAYOUTS.get(fmt)
+    if layout is None:
+        result = []
+        for s in text:
+            try:
+                result.append(datetime.strptime(s, fmt))
+            except ValueError:
+                result.append(None)
+        return result
+
+    # Zero-pad "8:00" to "08:00", then read the digits straight from the code points
+    width, digit_pos = layout
+    padded = np.char.zfill(np.asarray(text, dtype=str), width)
+    ok = np.char.str_len(padded) == width
+    codes = padded.astype(f"U{width}").view(np.uint32).reshape(len(text), width).astype(np.int64) - ord("0")
+    digits = codes[:, digit_pos]
+    colon_pos = [i for i in range(width) if i not in digit_pos]
+    ok &= ((digits >= 0) & (digits <= 9)).all(axis=1)
+    ok &= (codes[:, colon_pos] == ord(":") - ord("0")).all(axis=1)
+    fields = digits[:, 0::2] * 10 + digits[:, 1::2]
+    ok &= (fields[:, 0] < 24) & (fields[:, 1:] < 60).all(axis=1)
+    seconds = fields[:, 0] * 3600 + fields[:, 1] * 60
+    if fields.shape[1] == 3:
+        seconds += fields[:, 2]
+    stamps = (np.datetime64(TIME_EPOCH, "us") + seconds.astype("timedelta64[s]")).tolist()
+    return [dt if good else None for dt, good in zip(stamps, ok.tolist())]
+
+
+def parse_time_column(values: Sequence, fmt: Optional[str] = None) -> List[Optional[datetime]]:
+    """Parse a whole column of time cells; same results as parse_time on each cell.
+
+    Native datetime/time/timedelta cells are converted directly. Text cells are
+    parsed in one pass with ``fmt`` (detected from the column when omitted), and
+    only cells that do not match it fall back to parse_time.
+    """
+    with metrics.span("parse_time", rows=len(values)):
+        return _parse_time_column(values, fmt)
+
+
+def _parse_time_column(values: Sequence, fmt: Optional[str]) -> List[Optional[datetime]]:
+    result: List[Optional[datetime]] = [None] * len(values)
+    text_pos, text = [], []
+    for i, value in enumerate(values):
+        if value is None:
+            continue
+        if isinstance(value, str):
+            text_pos.append(i)
+            text.append(value.strip())
+        else:
+            result[i] = parse_time(value)
+    if not text:
+        return result
+    if fmt is None:
+        fmt = detect_time_format(text)
+    parsed = _parse_clock_strings(text, fmt) if fmt else [None] * len(text)
+    for i, s, dt in zip(text_pos, text, parsed):
+        result[i] = dt if dt is not None else parse_time(s)
+    return result
+
+
 def format_time(dt: Optional[datetime]) -> str:
     """Format a datetime as HH:MM string."""
     if dt is None:
@@ -32,12 +142,79 @@ def format_time(dt: Optional[datetime]) -> str:
     return dt.strftime("%H:%M")
 
 
+# "HH:MM" label of every minute of the day, indexed by minute
+_CLOCK_LABELS = np.array([f"{m // 60:02d}:{m % 60:02d}" for m in range(24 * 60)])
+
+
+def format_time_column(seconds: np.ndarray) -> np.ndarray:
+    """Vectorized format_time over times stored as seconds (see to_seconds)."""
+    seconds = np.asarray(seconds, dtype=np.int64)
+    missing = seconds == MISSING_TIME
+    labels = _CLOCK_LABELS[np.where(missing, 0, seconds) // 60 % (24 * 60)].astype(object)
+    labels[missing] = ""
+    return labels
+
+
+def parse_date(value) -> Optional[date]:
+    """Parse a FECHA cell ("dd/mm/yyyy", ISO dates or date objects); None when unparseable."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if value is None:
+        return None
+    s = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_date_column(values: Sequence) -> np.ndarray:
+    """parse_date over a column as a datetime64[D] array (NaT when unparseable).
+
+    Each distinct value is parsed once, since a column repeats few dates.
+    """
+    distinct = {}
+    codes = np.fromiter((distinct.setdefault(v, len(distinct)) for v in values),
+                        dtype=np.intp, count=len(values))
+    days = np.array([parse_date(v) for v in distinct], dtype="datetime64[D]").reshape(len(distinct))
+    return days[codes]
+
+
 def minutes_between(start: Optional[datetime], end: Optional[datetime]) -> float:
-    """Calculate minutes between two time values."""
+    """Calculate minutes between two time values, each taken to the nearest second.
+
+    Seconds are the resolution of the columnar and RecordBatch engines, so
+    every engine gives the same minutes for the same punches.
+    """
     if start is None or end is None:
         return 0.0
-    delta = end - start
-    return delta.total_seconds() / 60.0
+    return (to_seconds(end) - to_seconds(start)) / 60.0
+
+
+def to_seconds(dt: Optional[datetime]) -> int:
+    """Convert a datetime to seconds since TIME_EPOCH, to the nearest second (MISSING_TIME for None)."""
+    if dt is None:
+        return MISSING_TIME
+    delta = dt - TIME_EPOCH
+    return delta.days * 86400 + delta.seconds + (delta.microseconds >= 500000)
+
+
+def from_seconds(seconds: int) -> Optional[datetime]:
+    """Convert seconds since TIME_EPOCH back to a datetime (None for MISSING_TIME)."""
+    if seconds == MISSING_TIME:
+        return None
+    return TIME_EPOCH + timedelta(seconds=seconds)
+
+
+def _whole_second(dt: datetime) -> datetime:
+    """Round a datetime to the nearest second, as to_seconds does."""
+    if not dt.microsecond:
+        return dt
+    return dt.replace(microsecond=0) + timedelta(seconds=dt.microsecond >= 500000)
 
 
 def minutes_to_hours(minutes: float) -> float:
@@ -59,13 +236,39 @@ def apply_rounding(minutes: float, mode: str, rounding_minutes: int) -> float:
 
 
 def parse_permit_string(permit_str: str) -> List[datetime]:
-    """Parse a permit string like '14:30, 15:00, 18:30, 19:00' into list of datetime objects."""
+    """Parse a permit string like '14:30, 15:00, 18:30, 19:00' (or '14:30-15:00, 18:30-19:00')."""
     if not permit_str or str(permit_str).strip().lower() in ("", "nan"):
         return []
-    parts = str(permit_str).split(",")
+    parts = _PERMIT_SEPARATORS.split(str(permit_str))
     result = []
     for part in parts:
         t = parse_time(part.strip())
         if t is not None:
             result.append(t)
     return result
+
+
+def parse_permit_column(values: Sequence, fmt: Optional[str] = None) -> List[List[datetime]]:
+    """Column-wise parse_permit_string: all permit times of a column are parsed in one pass."""
+    return parse_permit_cells(values, fmt)[0]
+
+
+def parse_permit_cells(values: Sequence,
+                       fmt: Optional[str] = None) -> Tuple[List[List[datetime]], List[bool]]:
+    """parse_permit_column, plus whether each cell had a time token that did not parse."""
+    parts = []
+    for value in values:
+        if not value or str(value).strip().lower() in ("", "nan"):
+            parts.append([])
+        else:
+            parts.append([p.strip() for p in _PERMIT_SEPARATORS.split(str(value))])
+    flat = parse_time_column([p for row in parts for p in row], fmt)
+    result, unparsed, start = [], [False] * len(parts), 0
+    check = None in flat
+    for i, row in enumerate(parts):
+        times = flat[start:start + len(row)]
+        result.append([t for t in times if t is not None])
+        if check:
+            unparsed[i] = any(t is None and p for t, p in zip(times, row))
+        start += len(row)
+    return result, unparsed
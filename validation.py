@@ -0,0 +1,95 @@
+"""Data-quality checks on the punches of attendance records.
+
+Every record gets an issue code, a bitmask of the ISSUES it shows (0 when
+clean). All checks run as whole-array operations over the punch columns, so
+validating a RecordBatch reads its typed arrays in place and is cheap enough
+to run on every load. Unparseable cells can only be seen while reading the
+file, so the readers record them in ``invalid_cells`` and this module just
+reports them.
+"""
+
+from typing import Dict, List, Union
+
+import numpy as np
+
+import metrics
+from columnar import PunchColumns
+from models import AttendanceRecord, RecordBatch
+from utils import MISSING_TIME
+
+UNPARSED_CELL = 1
+OUT_OF_ORDER = 2
+MEAL_REVERSED = 4
+DINNER_REVERSED = 8
+INCOMPLETE_BREAK = 16
+ODD_PERMITS = 32
+MISSING_ENTRY_EXIT = 64
+
+# Issue bits and their descriptions, in report order
+ISSUES = {
+    UNPARSED_CELL: "Celda con hora no reconocida",
+    OUT_OF_ORDER: "Checadas fuera de orden",
+    MEAL_REVERSED: "Regreso de comida antes de la salida",
+    DINNER_REVERSED: "Regreso de cena antes de la salida",
+    INCOMPLETE_BREAK: "Comida o cena sin salida o regreso",
+    ODD_PERMITS: "Número impar de permisos",
+    MISSING_ENTRY_EXIT: "Falta la entrada o la salida",
+}
+
+# Breaks as (out, in) punch columns and the issue of a reversed pair
+_BREAKS = (("meal_out", "meal_in", MEAL_REVERSED), ("dinner_out", "dinner_in", DINNER_REVERSED))
+
+
+def issue_codes(columns: Dict[str, np.ndarray], permit_counts: np.ndarray,
+                invalid_cells: np.ndarray) -> np.ndarray:
+    """Issue code of each record from its punch columns (int64 seconds).
+
+    A punch is out of order when it is earlier than a punch of a previous
+    step of the day; a break whose return precedes its start is reported as
+    reversed instead. Records without any punch are not reported as incomplete.
+    """
+    permit_counts = np.asarray(permit_counts)
+    present = {name: col != MISSING_TIME for name, col in columns.items()}
+    codes = np.where(np.asarray(invalid_cells) != 0, UNPARSED_CELL, 0).astype(np.uint8)
+
+    # MISSING_TIME is the smallest int64, so it never wins a maximum
+    before = columns["entry"]
+    out_of_order = np.zeros(len(before), dtype=bool)
+    for out, back, reversed_bit in _BREAKS:
+        out_of_order |= present[out] & (columns[out] < before)
+        out_of_order |= present[back] & (columns[back] < before)
+        codes[present[out] & present[back] & (columns[back] < columns[out])] |= reversed_bit
+        codes[present[out] != present[back]] |= INCOMPLETE_BREAK
+        before = np.maximum.reduce([before, columns[out], columns[back]])
+    out_of_order |= present["exit"] & (columns["exit"] < before)
+    codes[out_of_order] |= OUT_OF_ORDER
+
+    codes[permit_counts % 2 == 1] |= ODD_PERMITS
+    punched = np.logical_or.reduce(list(present.values())) | (permit_counts > 0)
+    codes[punched & ~(present["entry"] & present["exit"])] |= MISSING_ENTRY_EXIT
+    return codes
+
+
+def validate(records: Union[List[AttendanceRecord], RecordBatch]) -> np.ndarray:
+    """Issue code of each record (uint8 array aligned with ``records``)."""
+    with metrics.span("validate", len(records)):
+        if isinstance(records, RecordBatch):
+            cols = PunchColumns.from_batch(records)
+            invalid = (np.frombuffer(records.invalid_cells, dtype=np.uint8) if len(records)
+                       else np.zeros(0, dtype=np.uint8))
+        else:
+            cols = PunchColumns.from_records(records)
+            invalid = np.fromiter((r.invalid_cells for r in records), dtype=np.uint8,
+                                  count=len(records))
+        return issue_codes(cols.columns, np.diff(cols.permit_offsets), invalid)
+
+
+def summarize(codes: np.ndarray) -> Dict[int, int]:
+    """Number of records showing each issue, for the issues found (in ISSUES order)."""
+    counts = {bit: int(np.count_nonzero(codes & bit)) for bit in ISSUES}
+    return {bit: n for bit, n in counts.items() if n}
+
+
+def describe(code: int) -> str:
+    """Descriptions of the issues in a code, separated by "; " ("" for 0)."""
+    return "; ".join(label for bit, label in ISSUES.items() if code & bit)
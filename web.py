@@ -1,17 +1,29 @@
 """Streamlit web interface for the URSOMEX attendance calculator."""
 
-import tempfile
+import io
+import json
 import os
 import pandas as pd
 import streamlit as st
 
+import metrics
 from config import Config
-from core import calculate_all
-from io_excel import load_excel, export_excel
-from utils import minutes_to_hours, format_time
+from columnar import PunchColumns, apply_results, compute
+from io_excel import EXPORT_MIME_TYPES, load_batch, export_records
+from models import WEEKLY_FIELDS, RecordBatch
+from cache import ParseCache, content_hash
+from store import AttendanceStore
+from tableview import COLUMNS, TableView
+from utils import minutes_to_hours
+from validation import ISSUES, summarize
 
 st.set_page_config(page_title="URSOMEX - Asistencias", layout="wide", page_icon="🏢")
 
+# Calculated views kept in memory (one per workbook + configuration pair)
+RESULT_CACHE_ENTRIES = 8
+# Row counts offered for each page of the data table
+PAGE_SIZES = (50, 100, 500, 1000)
+
 
 def build_config_from_sidebar() -> Config:
     """Build a Config object from sidebar widgets."""
@@ -34,6 +46,10 @@ def build_config_from_sidebar() -> Config:
     cfg.rounding_minutes = st.sidebar.number_input(
         "Minutos de redondeo", min_value=1, max_value=60, value=cfg.rounding_minutes
     )
+    cfg.weekly_double_overtime = st.sidebar.number_input(
+        "Extra dobles por semana (min)", min_value=0, max_value=10080,
+        value=cfg.weekly_double_overtime,
+    )
     return cfg
 
 
@@ -42,101 +58,263 @@ def format_hours(minutes: float) -> str:
     return f"{minutes_to_hours(minutes):.2f} h"
 
 
-def records_to_dataframe(records) -> pd.DataFrame:
-    """Convert a list of AttendanceRecord objects to a display DataFrame."""
-    rows = []
-    for rec in records:
-        rows.append(
-            {
-                "ID": rec.employee_id,
-                "Fecha": rec.date,
-                "Empleado": rec.employee_name,
-                "Entrada": format_time(rec.entry),
-                "Salida": format_time(rec.exit),
-                "Horas Laboradas": minutes_to_hours(rec.net_worked),
-                "Horas Extra": minutes_to_hours(rec.overtime),
-            }
+@st.cache_resource(max_entries=RESULT_CACHE_ENTRIES, show_spinner=False)
+def table_view(file_hash: str, _batch) -> TableView:
+    """Indexed columns of a workbook for the data table, built once per workbook."""
+    return TableView(_batch)
+
+
+def config_key(config: Config) -> str:
+    """Stable string form of a Config, used as part of the result cache key."""
+    return json.dumps(config.to_dict(), sort_keys=True)
+
+
+@st.cache_resource(max_entries=RESULT_CACHE_ENTRIES, show_spinner=False)
+def compute_view(file_hash: str, config_json: str, _batch, _previous=None) -> dict:
+    """Results, totals and chart data for one workbook and configuration.
+
+    Cached on ``file_hash`` and ``config_json`` only (the underscored arguments
+    are not hashed), so reruns that merely switch tabs or widgets skip all the
+    work. ``_previous`` is an earlier ``(config_json, results)`` pair for the
+    same workbook; on a miss only the stages affected by the config change are
+    recomputed from it; the weekly overtime tiers are always split again,
+    which is one cumulative sum. The returned objects are shared between
+    reruns and must not be modified.
+    """
+    config = Config.from_dict(json.loads(config_json))
+    view = table_view(file_hash, _batch)
+    previous, previous_config = None, None
+    if _previous is not None:
+        previous_config = Config.from_dict(json.loads(_previous[0]))
+        previous = _previous[1]
+    with metrics.span("calculate", rows=len(_batch)):
+        results = compute(PunchColumns.from_batch(_batch), config, previous, previous_config)
+        tiers = view.weeks.tiers(results["overtime"], config.weekly_double_overtime)
+        results.update(zip(WEEKLY_FIELDS, tiers))
+    with metrics.span("render", rows=len(_batch)):
+        chart_df = view.employee_totals(results)
+    return {
+        "results": results,
+        "chart_df": chart_df,
+        "total_worked": float(results["net_worked"].sum()),
+        "total_overtime": float(results["overtime"].sum()),
+        "total_double": float(results["overtime_double"].sum()),
+        "total_triple": float(results["overtime_triple"].sum()),
+    }
+
+
+def export_buffer(records, export_format: str, results=None) -> io.BytesIO:
+    """Export records into an in-memory buffer, rewound for reading.
+
+    With ``results`` (see compute_view), a copy of the batch carrying those
+    results is exported and ``records`` is left untouched.
+    """
+    if results is not None:
+        snapshot = RecordBatch()
+        snapshot.extend(records)
+        records = apply_results(snapshot, results)
+    buffer = io.BytesIO()
+    export_records(records, buffer, export_format)
+    buffer.seek(0)
+    return buffer
+
+
+def show_table(view: TableView, results) -> None:
+    """Filter, sort and page the records on the server; only the visible page is sent."""
+    col_employee, col_id, col_dates = st.columns(3)
+    employees = col_employee.multiselect("Empleado", options=view.employees.tolist())
+    ids = col_id.multiselect("ID", options=view.ids.tolist())
+    start = end = None
+    bounds = view.date_range()
+    if bounds is not None:
+        dates = col_dates.date_input("Rango de fechas", value=bounds,
+                                     min_value=bounds[0], max_value=bounds[1])
+        if isinstance(dates, (tuple, list)) and len(dates) == 2:
+            start, end = dates
+
+    col_sort, col_order, col_size = st.columns(3)
+    sort_column = col_sort.selectbox("Ordenar por", options=("(orden original)",) + COLUMNS)
+    descending = col_order.toggle("Descendente")
+    page_size = col_size.selectbox("Filas por página", options=PAGE_SIZES, index=1)
+    issues_only = st.checkbox("Solo registros con anomalías")
+
+    rows = view.filter(employees, ids, start, end, issues_only)
+    if sort_column in COLUMNS:
+        rows = view.sort(rows, sort_column, results, descending)
+    pages = max(1, -(-len(rows) // page_size))
+    page = st.number_input(f"Página (de {pages})", min_value=1, max_value=pages, value=1)
+
+    first = (page - 1) * page_size
+    st.caption(f"Mostrando {min(first + 1, len(rows))}–{min(first + page_size, len(rows))} "
+               f"de {len(rows)} registros")
+    st.dataframe(view.page(rows, results, page - 1, page_size), use_container_width=True)
+
+
+def show_anomalies(view: TableView) -> None:
+    """Summary of the data-quality issues found on load (nothing when the data is clean)."""
+    counts = summarize(view.issues)
+    if not counts:
+        return
+    flagged = int((view.issues != 0).sum())
+    st.warning(f"{flagged} registros con anomalías; revísalos en la tabla de datos "
+               "o en la hoja Anomalías del Excel exportado.")
+    st.dataframe(
+        pd.DataFrame({"Problema": [ISSUES[bit] for bit in counts],
+                      "Registros": list(counts.values())},
+                     index=pd.Index(list(counts), name="Código")),
+        use_container_width=True,
+    )
+
+
+def load_from_store() -> None:
+    """Query the persistent store and make the result the current records."""
+    with AttendanceStore() as store:
+        employee_ids = store.employee_ids()
+        bounds = store.date_range()
+    if bounds is None:
+        st.info("El almacén está vacío; guarda un archivo calculado desde la pestaña Exportar.")
+        return
+    col_id, col_dates = st.columns(2)
+    ids = col_id.multiselect("ID", options=employee_ids, key="store_ids")
+    dates = col_dates.date_input("Rango de fechas", value=bounds,
+                                 min_value=bounds[0], max_value=bounds[1], key="store_dates")
+    if not (isinstance(dates, (tuple, list)) and len(dates) == 2):
+        return
+    if not st.button("Consultar"):
+        return
+    with AttendanceStore() as store:
+        records = store.query(ids or None, *dates)
+    st.session_state.raw_records = records
+    st.session_state.uploaded_file_hash = content_hash(records.to_bytes())
+
+
+def save_to_store(records, config: Config) -> None:
+    """Upsert the current records into the persistent store."""
+    with AttendanceStore() as store:
+        counts = store.append(records, config)
+    st.success(f"Almacén actualizado: {counts['inserted']} nuevos, {counts['updated']} "
+               f"actualizados, {counts['unchanged']} sin cambios.")
+    if counts["skipped"]:
+        st.warning(f"{counts['skipped']} registros sin fecha válida no se guardaron.")
+
+
+def show_metrics(collector: metrics.Collector) -> None:
+    """Expandable panel with this run's per-stage metrics (only when enabled).
+
+    The JSON summary is offered as a download rather than written to the
+    metrics file, which every session would overwrite on each rerun.
+    """
+    if not metrics.is_enabled():
+        return
+    stages = collector.summary()
+    if not stages:
+        return
+    with st.expander("⏱️ Métricas de rendimiento"):
+        table = pd.DataFrame(stages).set_index("stage")
+        table["peak_memory_bytes"] = table["peak_memory_bytes"] / 2**20
+        table = table.rename(columns={
+            "calls": "Llamadas", "seconds": "Tiempo (s)", "rows": "Registros",
+            "rows_per_second": "Registros/s", "peak_memory_bytes": "Memoria pico (MiB)",
+        })
+        st.dataframe(table, use_container_width=True)
+        st.download_button(
+            label="⬇️ Descargar métricas (JSON)",
+            data=json.dumps({"stages": stages}, indent=2),
+            file_name="metricas.json",
+            mime="application/json",
         )
-    return pd.DataFrame(rows)
 
 
 def main():
     st.title("🏢 URSOMEX – Calculadora de Asistencias")
+    # Metrics cover a single script run (one rerun) of this session only
+    if "metrics_collector" not in st.session_state:
+        st.session_state.metrics_collector = metrics.Collector()
+    collector = st.session_state.metrics_collector
+    collector.reset()
+    with metrics.collecting(collector):
+        show_page()
+    show_metrics(collector)
+
 
+def show_page():
+    """Sidebar, data source and the result tabs of one script run."""
     config = build_config_from_sidebar()
 
-    uploaded_file = st.file_uploader(
-        "Cargar archivo Excel (.xlsx)", type=["xlsx"], key="file_uploader"
-    )
+    source = st.radio("Origen de los datos", ["Archivo", "Almacén"], horizontal=True)
+    uploaded_file = None
+    if source == "Almacén":
+        load_from_store()
+    else:
+        uploaded_file = st.file_uploader(
+            "Cargar archivo (.xlsx, .csv o .parquet)", type=["xlsx", "csv", "parquet"],
+            key="file_uploader",
+        )
 
     if uploaded_file is not None:
-        # Only reload from file when the uploaded file changes
+        # Only reload when the uploaded content changes (not just the name).
+        # The upload is already an in-memory buffer: hash and parse it in place.
+        with uploaded_file.getbuffer() as data:
+            file_hash = content_hash(data)
         if (
-            "uploaded_file_name" not in st.session_state
-            or st.session_state.uploaded_file_name != uploaded_file.name
+            st.session_state.get("uploaded_file_hash") != file_hash
             or "raw_records" not in st.session_state
         ):
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp:
-                tmp.write(uploaded_file.read())
-                tmp_path = tmp.name
-            try:
-                st.session_state.raw_records = load_excel(tmp_path)
-                st.session_state.uploaded_file_name = uploaded_file.name
-            finally:
-                os.unlink(tmp_path)
+            def parse_upload():
+                uploaded_file.seek(0)
+                return load_batch(uploaded_file, os.path.splitext(uploaded_file.name)[1])
+
+            st.session_state.raw_records = ParseCache().load(file_hash, parse_upload)
+            st.session_state.uploaded_file_hash = file_hash
 
     if "raw_records" in st.session_state and st.session_state.raw_records:
-        records = calculate_all(st.session_state.raw_records, config)
-        df = records_to_dataframe(records)
+        records = st.session_state.raw_records
+        file_hash = st.session_state.uploaded_file_hash
+        config_json = config_key(config)
+        last = st.session_state.get("last_view")
+        previous = last[1:] if last is not None and last[0] == file_hash else None
+        view = compute_view(file_hash, config_json, records, previous)
+        st.session_state.last_view = (file_hash, config_json, view["results"])
+        apply_results(records, view["results"])
 
         tab_dashboard, tab_table, tab_export = st.tabs(
             ["📊 Dashboard", "📋 Tabla de Datos", "⬇️ Exportar"]
         )
 
-        with tab_dashboard:
-            total_records = len(records)
-            total_worked = sum(r.net_worked for r in records)
-            total_overtime = sum(r.overtime for r in records)
+        with tab_dashboard, metrics.span("render"):
+            col1, col2, col3, col4, col5 = st.columns(5)
+            col1.metric("Total de Registros", len(records))
+            col2.metric("Horas Laboradas Totales", format_hours(view["total_worked"]))
+            col3.metric("Horas Extra Totales", format_hours(view["total_overtime"]))
+            col4.metric("Extra Dobles", format_hours(view["total_double"]))
+            col5.metric("Extra Triples", format_hours(view["total_triple"]))
 
-            col1, col2, col3 = st.columns(3)
-            col1.metric("Total de Registros", total_records)
-            col2.metric("Horas Laboradas Totales", format_hours(total_worked))
-            col3.metric("Horas Extra Totales", format_hours(total_overtime))
+            show_anomalies(table_view(file_hash, records))
 
             st.subheader("Horas Laboradas vs. Horas Extra por Empleado")
-            chart_df = (
-                df.groupby("Empleado")[["Horas Laboradas", "Horas Extra"]]
-                .sum()
-                .reset_index()
-                .set_index("Empleado")
-            )
-            st.bar_chart(chart_df)
+            st.bar_chart(view["chart_df"])
 
-        with tab_table:
+        with tab_table, metrics.span("render"):
             st.subheader("Registros Detallados")
-            st.dataframe(df, use_container_width=True)
+            show_table(table_view(file_hash, records), view["results"])
 
         with tab_export:
             st.subheader("Exportar Resultados")
-            if st.button("Generar archivo Excel"):
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp:
-                    tmp_path = tmp.name
-                try:
-                    export_excel(records, tmp_path)
-                    with open(tmp_path, "rb") as f:
-                        st.session_state.export_bytes = f.read()
-                finally:
-                    os.unlink(tmp_path)
-
-            if "export_bytes" in st.session_state:
-                st.download_button(
-                    label="⬇️ Descargar resultados.xlsx",
-                    data=st.session_state.export_bytes,
-                    file_name="resultados_asistencias.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                )
+            export_format = st.selectbox("Formato", options=list(EXPORT_MIME_TYPES))
+            # The file is only generated, in memory, when the button is clicked. That
+            # runs alongside the next rerun, which may apply other results to
+            # ``records``, so it exports this run's results on a copy.
+            results = view["results"]
+            st.download_button(
+                label=f"⬇️ Descargar resultados.{export_format}",
+                data=lambda: export_buffer(records, export_format, results),
+                file_name=f"resultados_asistencias.{export_format}",
+                mime=EXPORT_MIME_TYPES[export_format],
+            )
+            if st.button("💾 Guardar en el almacén"):
+                save_to_store(records, config)
     else:
-        st.info("Carga un archivo Excel (.xlsx) para comenzar.")
+        st.info("Carga un archivo Excel (.xlsx), CSV o Parquet para comenzar.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,204 @@
+"""Streaming reader for the worksheets of .xlsx files.
+
+openpyxl's read-only mode sizes every sheet when a workbook is opened, which
+means parsing the whole XML of sheets without a <dimension> record (files
+saved in write-only mode, including this tool's exports). XlsxReader only
+reads the workbook's sheet list, shared strings and number formats on open.
+Each sheet is parsed incrementally when its rows are asked for, so reading
+one header row or one sheet costs just that. Cell values are converted with
+openpyxl's helpers and match ``iter_rows(values_only=True)`` in data-only
+mode, read to the real end of each row and sheet.
+"""
+
+import io
+import posixpath
+import zipfile
+from typing import BinaryIO, Dict, Iterator, List, Optional, Union
+
+from openpyxl.cell.text import Text
+from openpyxl.reader.strings import read_string_table
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.cell import column_index_from_string
+from openpyxl.utils.datetime import MAC_EPOCH, WINDOWS_EPOCH, from_excel, from_ISO8601
+from openpyxl.xml.constants import PKG_REL_NS, REL_NS, SHEET_MAIN_NS
+from openpyxl.xml.functions import fromstring, iterparse
+
+_ROW = f"{{{SHEET_MAIN_NS}}}row"
+_CELL = f"{{{SHEET_MAIN_NS}}}c"
+_VALUE = f"{{{SHEET_MAIN_NS}}}v"
+_INLINE = f"{{{SHEET_MAIN_NS}}}is"
+_SHEET_DATA = f"{{{SHEET_MAIN_NS}}}sheetData"
+_RELATIONSHIP = f"{{{PKG_REL_NS}}}Relationship"
+_OFFICE_DOCUMENT = "/officeDocument"
+_WORKSHEET = "/worksheet"
+_DIGITS = "0123456789"
+
+
+def _part_path(base: str, target: str) -> str:
+    """Archive path of a relationship target, relative to the part at ``base``."""
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base), target))
+
+
+def _relationships(archive: zipfile.ZipFile, part: str) -> Dict[str, tuple]:
+    """Relationships of a part as {id: (type, archive path)}."""
+    rels = posixpath.join(posixpath.dirname(part), "_rels", posixpath.basename(part) + ".rels")
+    if rels not in archive.NameToInfo:
+        return {}
+    root = fromstring(archive.read(rels))
+    return {rel.get("Id"): (rel.get("Type", ""), _part_path(part, rel.get("Target", "")))
+            for rel in root.iter(_RELATIONSHIP)}
+
+
+def _cast_number(value: str):
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+class XlsxReader:
+    """Worksheets of an .xlsx file (path or binary buffer), read as rows of values.
+
+    Use as a context manager, or call close(). ``sheet_names`` lists the
+    worksheets in workbook order and ``active`` is the one selected when the
+    file was saved.
+    """
+
+    def __init__(self, source: Union[str, BinaryIO, bytes]):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        self._archive = zipfile.ZipFile(source)
+        try:
+            self._read_workbook()
+        except Exception:
+            self._archive.close()
+            raise
+
+    def _read_workbook(self) -> None:
+        archive = self._archive
+        workbook = next((path for kind, path in _relationships(archive, "").values()
+                         if kind.endswith(_OFFICE_DOCUMENT)), "xl/workbook.xml")
+        rels = _relationships(archive, workbook)
+        root = fromstring(archive.read(workbook))
+
+        properties = root.find(f"{{{SHEET_MAIN_NS}}}workbookPr")
+        date1904 = properties is not None and properties.get("date1904") in ("1", "true")
+        self._epoch = MAC_EPOCH if date1904 else WINDOWS_EPOCH
+
+        self._sheets: Dict[str, str] = {}
+        all_sheets = []
+        for sheet in root.iter(f"{{{SHEET_MAIN_NS}}}sheet"):
+            kind, path = rels.get(sheet.get(f"{{{REL_NS}}}id"), ("", ""))
+            all_sheets.append(sheet.get("name"))
+            if kind.endswith(_WORKSHEET) and path in archive.NameToInfo:
+                self._sheets[sheet.get("name")] = path
+        self.sheet_names: List[str] = list(self._sheets)
+
+        view = root.find(f"{{{SHEET_MAIN_NS}}}bookViews/{{{SHEET_MAIN_NS}}}workbookView")
+        active = int(view.get("activeTab", 0)) if view is not None else 0
+        name = all_sheets[active] if active < len(all_sheets) else None
+        self.active: Optional[str] = (name if name in self._sheets
+                                      else next(iter(self.sheet_names), None))
+
+        self._strings: Optional[List[str]] = None
+        self._strings_path = None
+        self._date_styles: Dict[int, bool] = {}
+        for kind, path in rels.values():
+            if kind.endswith("/sharedStrings"):
+                self._strings_path = path
+            elif kind.endswith("/styles") and path in archive.NameToInfo:
+                self._read_styles(path)
+
+    def _read_styles(self, path: str) -> None:
+        """Index the cell styles with date formats: {style: formats a duration}."""
+        root = fromstring(self._archive.read(path))
+        custom = {int(fmt.get("numFmtId")): fmt.get("formatCode", "")
+                  for fmt in root.iter(f"{{{SHEET_MAIN_NS}}}numFmt")}
+        xfs = root.find(f"{{{SHEET_MAIN_NS}}}cellXfs")
+        for index, xf in enumerate(xfs if xfs is not None else ()):
+            number_format = int(xf.get("numFmtId", 0))
+            code = custom.get(number_format, BUILTIN_FORMATS.get(number_format, "General"))
+            if is_date_format(code):
+                self._date_styles[index] = is_timedelta_format(code)
+
+    def _shared_strings(self) -> List[str]:
+        if self._strings is None:
+            self._strings = []
+            if self._strings_path in self._archive.NameToInfo:
+                with self._archive.open(self._strings_path) as f:
+                    self._strings = read_string_table(f)
+        return self._strings
+
+    def _value(self, cell):
+        kind = cell.get("t", "n")
+        if kind == "inlineStr":
+            text = cell.find(_INLINE)
+            return Text.from_tree(text).content if text is not None else None
+        value = cell.findtext(_VALUE) or None
+        if value is None:
+            return None
+        if kind == "n":
+            value = _cast_number(value)
+            duration = self._date_styles.get(int(cell.get("s", 0)))
+            if duration is None:
+                return value
+            try:
+                return from_excel(value, self._epoch, timedelta=duration)
+            except (OverflowError, ValueError):
+                return "#VALUE!"
+        if kind == "s":
+            return self._shared_strings()[int(value)]
+        if kind == "b":
+            return bool(int(value))
+        if kind == "d":
+            return from_ISO8601(value)
+        return value
+
+    def iter_rows(self, name: str, max_row: Optional[int] = None) -> Iterator[tuple]:
+        """Rows of a worksheet as tuples of values, from the first row.
+
+        Each row runs up to its last stored cell; rows missing between stored
+        ones come out as empty tuples. Only the XML needed for the rows taken
+        is parsed.
+        """
+        with self._archive.open(self._sheets[name]) as f:
+            expected = 1
+            sheet_data = None
+            for event, element in iterparse(f, events=("start", "end")):
+                if event == "start":
+                    if element.tag == _SHEET_DATA:
+                        sheet_data = element
+                    continue
+                if element.tag != _ROW:
+                    continue
+                number = int(element.get("r", expected))
+                for _ in range(expected, number if max_row is None else min(number, max_row + 1)):
+                    yield ()
+                if max_row is not None and number > max_row:
+                    return
+                cells: Dict[int, object] = {}
+                column = 0
+                for cell in element.iter(_CELL):
+                    ref = cell.get("r")
+                    column = column_index_from_string(ref.rstrip(_DIGITS)) if ref else column + 1
+                    cells[column] = self._value(cell)
+                row = [None] * max(cells, default=0)
+                for column, value in cells.items():
+                    row[column - 1] = value
+                yield tuple(row)
+                expected = number + 1
+                # Drop the parsed rows, so memory stays bounded on any sheet size
+                if sheet_data is not None:
+                    sheet_data.clear()
+                if max_row is not None and expected > max_row:
+                    return
+
+    def close(self) -> None:
+        self._archive.close()
+
+    def __enter__(self) -> "XlsxReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()